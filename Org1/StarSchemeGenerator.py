@@ -3,6 +3,7 @@
 # - Generate Fact Table: Sale with foreign keys to dimension tables
 # - Update Fact Table with new sales records
 # - Update Dimension Tables
+# - Generate large Fact Tables for load testing (sale_bulk_gen)
 
 import json
 import pandas as pd
@@ -10,6 +11,8 @@ import os
 import numpy as np
 from datetime import datetime
 
+from Org1.column_store import write_table, append_table, sync_from_csv, update_meta, load_meta, SALE_PR_STORE, SALE_PR_C_STORE
+
 with open("Shared/DFM_Sale.json", "r") as f:
     dfm_json = json.load(f)
 START_DATE = dfm_json["START_DATE"]
@@ -19,6 +22,16 @@ os.makedirs("Org1/PR_DB/DimTab", exist_ok=True)
 
 SALE_COUNTER = 0
 
+# Bulk generator (load testing)
+BULK_CHUNK_ROWS = 1_000_000 # rows generated and written at a time: memory does not grow with the table size
+BULK_VERSION_STEP_MS = 24 * 60 * 60 * 1000 # TS distance between two data versions (1 day)
+# Distribution of every dimension: "uniform", or ("zipf", a) where the k-th ID has probability proportional to 1 / k^a
+BULK_SKEW = {
+    "Product_Id": ("zipf", 1.1),
+    "Material_Id": "uniform",
+    "Date_Id": "uniform"
+}
+
 def product_Gen(output_dir="Org1/PR_DB/DimTab"):
     # Load product info from DFM_Sale.json
     product_names = dfm_json["Product Name"]  # Dict: {Product_Name: Product_Id}
@@ -112,12 +125,14 @@ def sale_Gen():
     })
 
     sales.to_csv("Org1/PR_DB/Sale_PR.csv", index=False)
+    write_table(sales, SALE_PR_STORE)
 
     print("\nFile generated using StarSchemeGenerator and saved as 'Sale_PR.csv' in Org1/PR_DB folder.")
 
 # Update Sale_PR.csv with new sales records (rows)
 def sale_update():
     selected_file = "Org1/PR_DB/Sale_PR.csv"
+    sync_from_csv(SALE_PR_STORE) # the store must hold the rows already in the CSV before appending
 
     global SALE_COUNTER
     SALE_COUNTER += 1
@@ -151,9 +166,65 @@ def sale_update():
 
     # Append new rows directly to the selected file
     new_sales.to_csv(selected_file, mode='a', header=False, index=False)
+    append_table(new_sales, SALE_PR_STORE)
 
     print(f"\n'{selected_file}' was updated with new rows.")
 
+# Sample n IDs following the skew of the dimension (see BULK_SKEW)
+def sample_ids(rng, ids, n, skew):
+    ids = np.asarray(ids)
+    if skew == "uniform":
+        return rng.choice(ids, n)
+    kind, a = skew
+    if kind != "zipf":
+        raise ValueError(f"Unknown skew '{kind}'")
+    weights = 1.0 / np.arange(1, len(ids) + 1) ** a
+    return rng.choice(ids, n, p=weights / weights.sum())
+
+# Generate a large Sale_PR fact table: num_rows rows split in num_versions data versions (TS), in append order
+# Rows are generated and written in chunks of chunk_rows (CSV export and column store). With convert=True
+# every chunk is also converted and written to Sale_PR_C, so no step needs the whole table in memory.
+# Usage: python3 -m Org1.StarSchemeGenerator bulk <num_rows> <num_versions>
+def sale_bulk_gen(num_rows, num_versions=1, skew=BULK_SKEW, chunk_rows=BULK_CHUNK_ROWS, seed=1, convert=True):
+    from Shared.Dim_ID_Converter import convert_rows # Dim_ID_Converter imports this module
+
+    products = pd.read_csv("Org1/PR_DB/DimTab/Products.csv")
+    materials = pd.read_csv("Org1/PR_DB/DimTab/Material.csv")
+    dates = pd.read_csv("Org1/PR_DB/DimTab/Date.csv")
+    rng = np.random.default_rng(seed)
+
+    # Last row (exclusive) of every version and its TS
+    base, extra = divmod(num_rows, num_versions)
+    version_ends = np.cumsum([base + 1] * extra + [base] * (num_versions - extra))
+    first_ts = int(datetime(2025, 1, 1).timestamp() * 1000)
+    version_ts = first_ts + np.arange(num_versions, dtype=np.int64) * BULK_VERSION_STEP_MS
+
+    for start in range(0, num_rows, chunk_rows):
+        n = min(chunk_rows, num_rows - start)
+        rows = np.arange(start, start + n)
+        sales = pd.DataFrame({
+            "Product_Id": sample_ids(rng, products["Product_Id"], n, skew.get("Product_Id", "uniform")),
+            "Material_Id": sample_ids(rng, materials["Material_Id"], n, skew.get("Material_Id", "uniform")),
+            "Date_Id": sample_ids(rng, dates["Date_Id"], n, skew.get("Date_Id", "uniform")),
+            "Total_Emissions": rng.uniform(1, 100, n).round(2),
+            "TS": version_ts[np.searchsorted(version_ends, rows, side='right')]
+        })
+
+        first_chunk = start == 0
+        sales.to_csv("Org1/PR_DB/Sale_PR.csv", mode='w' if first_chunk else 'a', header=first_chunk, index=False)
+        (write_table if first_chunk else append_table)(sales, SALE_PR_STORE)
+        if convert:
+            converted = convert_rows(sales)
+            converted.to_csv("Org1/PR_DB/Sale_PR_C.csv", mode='w' if first_chunk else 'a', header=first_chunk, index=False)
+            (write_table if first_chunk else append_table)(converted, SALE_PR_C_STORE)
+        print(f"Bulk generator: {start + n}/{num_rows} rows written")
+
+    if convert:
+        # Sale_PR_C is up to date with Sale_PR (see CSV_converter)
+        source_meta = load_meta(SALE_PR_STORE)
+        update_meta(SALE_PR_C_STORE, {"converted_from": {"store_id": source_meta["store_id"], "rows": source_meta["rows"]}})
+    print(f"\nFile generated using the bulk generator: {num_rows} rows, {num_versions} versions, saved as 'Sale_PR.csv' in Org1/PR_DB folder.")
+
 # Update Products dimension table and DFM_Sale.json with new products and categories
 def update_products():
     products_file = "Org1/PR_DB/DimTab/Products.csv"
@@ -212,4 +283,14 @@ def main():
     
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "bulk":
+        if len(sys.argv) != 4:
+            print("Usage: python3 -m Org1.StarSchemeGenerator bulk <num_rows> <num_versions>")
+            sys.exit(1)
+        product_Gen()
+        material_Gen()
+        date_Gen()
+        sale_bulk_gen(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,67 @@
+# Batched queries: prove several OLAP queries in parallel on a process pool
+# Each query (an operations dict as produced by OrgB/select_operations.py) runs the whole
+# op_execute_query pipeline (tensor, ONNX export, witness generation and ezkl.prove) in its own worker process,
+# with its own output and proof folders, and the results are streamed back as soon as each proof completes.
+# The proof files of the n-th query (test.pf, test.vk, settings.json) are shared with OrgB in Shared/proof/query_<n>.
+# Circuits with the same shape are shared between the workers through the circuit cache.
+import os
+import glob
+import shutil
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Org1.execute_query import op_execute_query
+from Org1.ezkl_workflow.generate_proof import PROOF_DIR
+from Org1.column_store import SALE_PR_C_STORE, sync_from_csv
+from Org1.models.olap_cube import sync_encoded_table, get_category_mappings
+
+BATCH_DIR = os.path.join('Org1', 'output', 'batch')
+
+# ezkl already uses several threads for a single proof and each proof needs a few GB of memory:
+# keep the pool small unless the machine has plenty of both
+DEFAULT_MAX_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+
+# Folder of the proof files of a query of the batch, shared with OrgB
+def batch_proof_dir(job_idx):
+    return os.path.join(PROOF_DIR, f"query_{job_idx}")
+
+# Proof folders of the last batch, in query order
+def batch_proof_dirs():
+    return sorted(glob.glob(os.path.join(PROOF_DIR, "query_*")), key=lambda path: int(path.rsplit("_", 1)[1]))
+
+# Worker: execute one query of the batch and prove it
+def run_query_job(job_idx, operations, columns_to_remove_idx, timestamp):
+    job_output_dir = os.path.join(BATCH_DIR, f"query_{job_idx}")
+    proof_dir = batch_proof_dir(job_idx)
+    os.makedirs(proof_dir, exist_ok=True)
+
+    final_tensor, poseidon_hash = asyncio.run(op_execute_query(operations, columns_to_remove_idx, timestamp,
+                                                               output_dir=job_output_dir, proof_dir=proof_dir))
+    return job_idx, final_tensor, poseidon_hash, proof_dir
+
+# Generator: queries = list of (operations, columns_to_remove_idx)
+# Yield (job_idx, final_tensor, poseidon_hash, proof_dir, error) in completion order,
+# job_idx is the position of the query in the list, error is None if the query was proven
+def execute_query_batch(queries, timestamp, max_workers=DEFAULT_MAX_WORKERS):
+    # Bring the column store, the encoded table and the category mappings up to date once, before the workers start:
+    # the workers then only read them (no concurrent rebuilds)
+    sync_from_csv(SALE_PR_C_STORE)
+    get_category_mappings()
+    sync_encoded_table(SALE_PR_C_STORE)
+    # The proof folders of a previous batch would be taken for queries of this one
+    for proof_dir in batch_proof_dirs():
+        shutil.rmtree(proof_dir)
+
+    # "spawn": ezkl starts native threads, forking a process that uses them is not safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        futures = {executor.submit(run_query_job, idx, operations, columns_to_remove_idx, timestamp): idx
+                   for idx, (operations, columns_to_remove_idx) in enumerate(queries)}
+
+        for future in as_completed(futures):
+            try:
+                job_idx, final_tensor, poseidon_hash, proof_dir = future.result()
+                yield job_idx, final_tensor, poseidon_hash, proof_dir, None
+            except Exception as e:
+                yield futures[future], None, None, None, e
@@ -0,0 +1,165 @@
+# End-to-end benchmark of the query -> proof -> verify pipeline
+# For every point of the grid (fact table rows x query type x logrows) it measures:
+# - wall time of every stage: data version hash (c_pos_hash), query preparation (cube, input.json), ONNX export,
+#   the ezkl stages of generate_proof (gen_settings, get_srs, calibrate, compile, setup, witness, prove),
+#   result decoding (show_result) and verification (ezkl.verify)
+#   (stages are measured by Shared/instrumentation.py, collected with a listener)
+# - peak RSS of the process running the query
+# - size of the proof, keys, compiled circuit and settings (and the circuit num_rows)
+# and writes everything to a JSON file in BENCHMARK_DIR.
+#
+# Every row count runs in its own temporary workspace (copy of the dimension tables, Shared and the contract addresses,
+# with a generated fact table), so the real Org1/PR_DB, caches and proofs are not touched.
+# Every query runs in a fresh process: the peak RSS is the one of that query only.
+#
+# Usage: python3 -m Org1.benchmark [rows,...] [logrows,...] [query,...]
+#   e.g. python3 -m Org1.benchmark 100,500 auto,18 slice,rollup
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from Shared.instrumentation import file_size
+
+BENCHMARK_DIR = os.path.join('Org1', 'output', 'benchmark')
+BENCH_ROWS = [100, 500]
+BENCH_LOGROWS = [None] # None: automatic logrows (sized on the circuit)
+BENCH_REPEAT = 1 # runs of every grid point (runs after the first one hit the circuit cache)
+
+# Query types: (operations, columns_to_remove_idx), see OrgB get_query_dimensions
+BENCH_QUERIES = {
+    "slice": ({"Dicing": [{3: [2022]}]}, []),
+    "dicing": ({"Dicing": [{3: [2022, 2023], 2: [1, 2]}]}, []),
+    "rollup": ({"Rollup": [["Date", "Month"]]}, [4, 5]),
+    "dicing_rollup": ({"Dicing": [{3: [2022, 2023]}], "Rollup": [["Date", "Month"]]}, [4, 5])
+}
+
+# Instrumented stages run inside op_execute_query (the rest of its time is reported as "prepare")
+QUERY_STAGES = ["export", "gen_settings", "get_srs", "calibrate", "compile", "setup", "witness", "prove"]
+
+# Copy what the pipeline reads (relative paths) into a new workspace folder
+def create_workspace():
+    workspace = tempfile.mkdtemp(prefix="cbi-zkp-bench-")
+    shutil.copytree(os.path.join('Org1', 'PR_DB', 'DimTab'), os.path.join(workspace, 'Org1', 'PR_DB', 'DimTab'))
+    os.makedirs(os.path.join(workspace, 'Shared'))
+    for name in ["DFM_Sale.json", "map.json"]:
+        shutil.copyfile(os.path.join('Shared', name), os.path.join(workspace, 'Shared', name))
+    os.makedirs(os.path.join(workspace, 'Blockchain'))
+    shutil.copyfile(os.path.join('Blockchain', 'contract_addresses.json'), os.path.join(workspace, 'Blockchain', 'contract_addresses.json'))
+    return workspace
+
+# Generate the fact table of the workspace (runs in a worker process)
+def generate_data(workspace, rows):
+    os.chdir(workspace)
+    from Org1.StarSchemeGenerator import sale_bulk_gen
+    from Org1.column_store import latest_ts, SALE_PR_C_STORE
+    sale_bulk_gen(rows, 1)
+    return latest_ts(SALE_PR_C_STORE)
+
+# Run one query of the grid in the workspace and measure it (runs in a fresh worker process)
+def run_query(workspace, query_name, logrows, timestamp):
+    os.chdir(workspace)
+    import ezkl
+    from Org1.execute_query import op_execute_query, output_dir
+    from Org1.ezkl_workflow import artifact_cache
+    from Org1.ezkl_workflow.generate_proof import PROOF_DIR, RUN_ARGS
+    from Org1.hash_utils import c_pos_hash
+    from OrgB.hash_utils import show_result
+    from Shared.instrumentation import add_listener, stage
+
+    operations, columns_to_remove_idx = BENCH_QUERIES[query_name]
+    timings = {}
+    def collect(event):
+        timings[event["stage"]] = timings.get(event["stage"], 0.0) + event["duration_s"]
+    add_listener(collect)
+
+    data_hash = c_pos_hash(timestamp)
+
+    start = time.perf_counter()
+    final_tensor, poseidon_hash = asyncio.run(op_execute_query(operations, columns_to_remove_idx, timestamp, logrows=logrows))
+    query_time = time.perf_counter() - start
+    timings["prepare"] = query_time - sum(timings.get(name, 0.0) for name in QUERY_STAGES)
+
+    with stage("show_result"):
+        show_result(final_tensor, columns_to_remove_idx, 2, result_name="Sale_PUB_bench.csv")
+
+    proof_path = os.path.join(PROOF_DIR, 'test.pf')
+    settings_path = os.path.join(PROOF_DIR, 'settings.json')
+    vk_path = os.path.join(PROOF_DIR, 'test.vk')
+    with stage("verify", proof_bytes=os.path.getsize(proof_path)):
+        verified = ezkl.verify(proof_path, settings_path, vk_path)
+
+    with open(settings_path, "r") as f:
+        settings = json.load(f)
+    cached = artifact_cache.lookup(artifact_cache.get_cache_key(os.path.join(output_dir, 'model.onnx'), logrows, RUN_ARGS))
+
+    return {
+        "timings_s": timings,
+        "query_total_s": query_time,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "sizes_bytes": {
+            "proof": file_size(proof_path),
+            "vk": file_size(vk_path),
+            "pk": file_size(cached["test.pk"]) if cached else None,
+            "compiled_circuit": file_size(os.path.join(output_dir, 'circuit.compiled')),
+            "settings": file_size(settings_path)
+        },
+        "num_rows": settings.get("num_rows"),
+        "settings_logrows": settings["run_args"]["logrows"],
+        "result_rows": int(final_tensor.shape[0]),
+        "verified": bool(verified),
+        "hash_match": data_hash == poseidon_hash
+    }
+
+# Run the whole grid, return the report
+def run_benchmark(rows_list=BENCH_ROWS, logrows_list=BENCH_LOGROWS, queries=list(BENCH_QUERIES), repeat=BENCH_REPEAT):
+    report = {"started": datetime.now().isoformat(), "cpu_count": os.cpu_count(), "results": []}
+    context = multiprocessing.get_context("spawn")
+
+    for rows in rows_list:
+        workspace = create_workspace()
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                timestamp = executor.submit(generate_data, workspace, rows).result()
+
+            for query_name in queries:
+                for logrows in logrows_list:
+                    for run in range(repeat):
+                        print(f"Benchmark: rows={rows} query={query_name} logrows={logrows} run={run}")
+                        result = {"rows": rows, "query": query_name, "logrows": logrows, "run": run}
+                        try:
+                            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                                result.update(executor.submit(run_query, workspace, query_name, logrows, timestamp).result())
+                        except Exception as e:
+                            result["error"] = str(e)
+                            print(f"Benchmark run failed: {e}")
+                        report["results"].append(result)
+        finally:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    report["finished"] = datetime.now().isoformat()
+    return report
+
+def save_report(report, benchmark_dir=BENCHMARK_DIR):
+    os.makedirs(benchmark_dir, exist_ok=True)
+    report_path = os.path.join(benchmark_dir, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark report saved as '{report_path}'")
+    return report_path
+
+if __name__ == "__main__":
+    rows_list = [int(r) for r in sys.argv[1].split(",")] if len(sys.argv) > 1 else BENCH_ROWS
+    logrows_list = [None if l == "auto" else int(l) for l in sys.argv[2].split(",")] if len(sys.argv) > 2 else BENCH_LOGROWS
+    queries = sys.argv[3].split(",") if len(sys.argv) > 3 else list(BENCH_QUERIES)
+    for query_name in queries:
+        if query_name not in BENCH_QUERIES:
+            print(f"Unknown query '{query_name}', available: {', '.join(BENCH_QUERIES)}")
+            sys.exit(1)
+    save_report(run_benchmark(rows_list, logrows_list, queries))
@@ -0,0 +1,208 @@
+# Columnar binary storage of the fact tables (Sale_PR and Sale_PR_C)
+# A table is a folder with one raw binary file per column (read with np.memmap, so only the rows used are read)
+# and a meta.json with the row count and the column types. Text columns (Product Name, Category, Material)
+# are dictionary encoded: the file stores int32 codes, the dictionary is in meta.json.
+# Rows are only appended: the data is written first and meta.json (row count) last, so a reader never sees a partial append.
+# meta.json also holds the TS index: [[TS, end row], ...] for every TS in append order, so the rows of a data version
+# (TS <= timestamp) are found with one lookup and only those rows are read.
+# The CSV files are kept as an export: if a CSV is newer than its store (e.g. edited by hand), the store is rebuilt from it.
+import os
+import json
+import time
+import bisect
+import numpy as np
+import pandas as pd
+
+SALE_PR_STORE = os.path.join('Org1', 'PR_DB', 'Sale_PR')
+SALE_PR_C_STORE = os.path.join('Org1', 'PR_DB', 'Sale_PR_C')
+STORE_CSV = {
+    SALE_PR_STORE: os.path.join('Org1', 'PR_DB', 'Sale_PR.csv'),
+    SALE_PR_C_STORE: os.path.join('Org1', 'PR_DB', 'Sale_PR_C.csv')
+}
+META_FILE = 'meta.json'
+CODE_DTYPE = 'int32' # dictionary codes of text columns
+
+def meta_path(store_dir):
+    return os.path.join(store_dir, META_FILE)
+
+def store_exists(store_dir):
+    return os.path.exists(meta_path(store_dir))
+
+def load_meta(store_dir):
+    with open(meta_path(store_dir), "r") as f:
+        return json.load(f)
+
+def save_meta(store_dir, meta):
+    tmp_path = f"{meta_path(store_dir)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path(store_dir))
+
+# Add fields to meta.json (e.g. the conversion offset of Sale_PR_C, see CSV_converter)
+def update_meta(store_dir, fields):
+    meta = load_meta(store_dir)
+    meta.update(fields)
+    save_meta(store_dir, meta)
+
+def column_meta(meta, name):
+    return next(column for column in meta["columns"] if column["name"] == name)
+
+def column_file(store_dir, column):
+    return os.path.join(store_dir, column["file"])
+
+# Encode a DataFrame column for the store (new text values are added to the column dictionary)
+def encode_column(values, column):
+    if "dictionary" in column:
+        index = {value: code for code, value in enumerate(column["dictionary"])}
+        for value in pd.unique(values):
+            if value not in index:
+                index[value] = len(column["dictionary"])
+                column["dictionary"].append(value)
+        return np.asarray(pd.Series(values).map(index), dtype=CODE_DTYPE)
+    return np.asarray(values, dtype=column["dtype"])
+
+def new_column(name, values):
+    column = {"name": name, "file": name.replace(" ", "_") + ".bin"}
+    if not pd.api.types.is_numeric_dtype(values): # text column (object or str dtype)
+        column["dtype"] = CODE_DTYPE
+        column["dictionary"] = []
+    else:
+        column["dtype"] = str(values.dtype)
+    return column
+
+# Write a DataFrame as a new store (replaces the existing one)
+def write_table(df, store_dir):
+    os.makedirs(store_dir, exist_ok=True)
+    if store_exists(store_dir):
+        os.remove(meta_path(store_dir))
+
+    columns = [new_column(name, df[name]) for name in df.columns]
+    for column, name in zip(columns, df.columns):
+        encode_column(df[name].values, column).tofile(column_file(store_dir, column))
+
+    # store_id changes on every rewrite, so derived files (e.g. the encoded fact tensor) know they must be rebuilt
+    meta = {"rows": 0, "columns": columns, "ts_sorted": is_ts_sorted(df), "store_id": time.time_ns(), "ts_index": []}
+    update_ts_index(meta, df)
+    meta["rows"] = len(df)
+    save_meta(store_dir, meta)
+    print(f"Column store '{store_dir}' written ({len(df)} rows)")
+
+# Append the rows of a DataFrame (same columns as the store)
+def append_table(df, store_dir):
+    if not store_exists(store_dir):
+        write_table(df, store_dir)
+        return
+    meta = load_meta(store_dir)
+    names = [column["name"] for column in meta["columns"]]
+    if list(df.columns) != names:
+        raise ValueError(f"Columns {list(df.columns)} do not match the store columns {names}")
+
+    if meta["rows"] and len(df) and "TS" in names:
+        last_ts = column_array(store_dir, column_meta(meta, "TS"), meta["rows"])[-1]
+        if df["TS"].iloc[0] < last_ts:
+            meta["ts_sorted"] = False
+    meta["ts_sorted"] = meta["ts_sorted"] and is_ts_sorted(df)
+
+    for column in meta["columns"]:
+        data = encode_column(df[column["name"]].values, column)
+        path = column_file(store_dir, column)
+        with open(path, "r+b") as f: # drop bytes of an interrupted append (after meta["rows"])
+            f.truncate(meta["rows"] * np.dtype(column["dtype"]).itemsize)
+        with open(path, "ab") as f:
+            data.tofile(f)
+
+    update_ts_index(meta, df)
+    meta["rows"] += len(df)
+    save_meta(store_dir, meta)
+
+# Add the TS of the appended rows to the TS index (meta["rows"] is the row count before the append)
+def update_ts_index(meta, df):
+    if "TS" not in df.columns or not meta["ts_sorted"]:
+        meta["ts_index"] = [] # not valid when rows are not in TS order
+        return
+    ts_index = meta.setdefault("ts_index", [])
+    ts_values = df["TS"].to_numpy()
+    if len(ts_values) == 0:
+        return
+    starts = np.flatnonzero(np.diff(ts_values)) + 1 # first row of every TS but the first one
+    for ts, end in zip(ts_values[np.append(0, starts)], np.append(starts, len(ts_values))):
+        end_row = meta["rows"] + int(end)
+        if ts_index and ts_index[-1][0] == ts:
+            ts_index[-1][1] = end_row # same TS as the last appended batch
+        else:
+            ts_index.append([int(ts), end_row])
+
+def is_ts_sorted(df):
+    return "TS" not in df.columns or bool(df["TS"].is_monotonic_increasing)
+
+# Memory-mapped raw array of a column (codes for text columns)
+def column_array(store_dir, column, rows):
+    if rows == 0:
+        return np.empty(0, dtype=column["dtype"])
+    return np.memmap(column_file(store_dir, column), dtype=column["dtype"], mode='r', shape=(rows,))
+
+# Number of rows with TS <= max_ts, None if the rows are not in TS order
+def ts_row_count(store_dir, meta, max_ts):
+    if not meta["ts_sorted"]:
+        return None
+    ts_index = meta.get("ts_index")
+    if ts_index is None: # store written before the TS index existed
+        ts = column_array(store_dir, column_meta(meta, "TS"), meta["rows"])
+        return int(np.searchsorted(ts, max_ts, side='right'))
+    i = bisect.bisect_right([ts for ts, _ in ts_index], max_ts)
+    return ts_index[i - 1][1] if i else 0
+
+# TS of the last appended rows (the latest data version)
+def latest_ts(store_dir):
+    sync_from_csv(store_dir)
+    meta = load_meta(store_dir)
+    if not any(column["name"] == "TS" for column in meta["columns"]):
+        raise ValueError(f"Column 'TS' not found in '{store_dir}'.")
+    if meta.get("ts_index"):
+        return meta["ts_index"][-1][0]
+    return int(read_table(store_dir, columns=["TS"])["TS"].max())
+
+# Read a store as a DataFrame (same columns and values as reading the CSV)
+# columns: subset of columns to read, max_ts: only the rows with TS <= max_ts, start_row: skip the first rows
+def read_table(store_dir, columns=None, max_ts=None, start_row=0):
+    meta = load_meta(store_dir)
+    end_row = meta["rows"]
+    mask = None
+    if max_ts is not None:
+        count = ts_row_count(store_dir, meta, max_ts)
+        if count is None: # not sorted: filter
+            mask = column_array(store_dir, column_meta(meta, "TS"), end_row)[start_row:] <= max_ts
+        else:
+            end_row = count
+    start_row = min(start_row, end_row)
+
+    data = {}
+    for column in meta["columns"]:
+        if columns is not None and column["name"] not in columns:
+            continue
+        values = column_array(store_dir, column, meta["rows"])[start_row:end_row]
+        if mask is not None:
+            values = values[mask]
+        if "dictionary" in column:
+            values = np.asarray(column["dictionary"], dtype=object)[values]
+        data[column["name"]] = np.array(values)
+    return pd.DataFrame(data)
+
+# Build the store from its CSV export if the store is missing or older than the CSV
+def sync_from_csv(store_dir):
+    csv_path = STORE_CSV[store_dir]
+    if store_exists(store_dir) and (not os.path.exists(csv_path) or os.path.getmtime(csv_path) <= os.path.getmtime(meta_path(store_dir))):
+        return
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Neither '{store_dir}' nor '{csv_path}' found")
+    print(f"Importing '{csv_path}' into the column store")
+    write_table(pd.read_csv(csv_path), store_dir)
+
+# Read a fact table (used instead of pd.read_csv on the hot path)
+def load_table(store_dir, columns=None, max_ts=None, start_row=0):
+    sync_from_csv(store_dir)
+    return read_table(store_dir, columns=columns, max_ts=max_ts, start_row=start_row)
+
+def table_rows(store_dir):
+    sync_from_csv(store_dir)
+    return load_meta(store_dir)["rows"]
@@ -1,19 +1,37 @@
 import os
-import json
-import pandas as pd
 import torch
 import torch.nn as nn
 import onnx
-import numpy as np
-from Org1.models.olap_cube import OLAPCube
+from Org1.models.olap_cube import OLAPCube, PADDED_CAPACITY, remove_padding
 from Org1.operations.slice_model import SliceModel
 from Org1.operations.dicing_model import DicingModel
 from Org1.operations.rollup_model import RollUpModel
-from Org1.ezkl_workflow.generate_proof import generate_proof
+from Org1.operations.compact_model import CompactModel, compact_rows
+from Org1.operations.group_by_model import rollup_group_by
+from Org1.operations.membership import merge_conditions, column_domains
+from Org1.ezkl_workflow.generate_proof import generate_proof, PROOF_DIR
+from Org1.ezkl_workflow.data_files import write_input_data
+from Org1.ezkl_workflow.calibration_memo import array_ranges
+from Shared.instrumentation import stage
+from Org1.hash_utils import COMMITMENT_MODE, split_batches, merkle_blocks, merkle_proof
 
 output_dir = os.path.join('Org1', 'output')
 os.makedirs(output_dir, exist_ok=True)
 
+# Compact output: queries with Dicing return only the selected rows (bucketed to a power of two, see CompactModel)
+# instead of one row per fact with zeros. Smaller public output and witness, but the compaction adds
+# (output rows x input rows) multiplications to the circuit.
+COMPACT_OUTPUT = False
+
+# Group-by in the circuit: Rollup queries sum the measures per group inside the model (see GroupByModel), so the proven
+# output is the aggregated cube instead of one row per fact summed afterwards by OrgB. Used only when there are fewer
+# groups than rows, the circuit grows with (rows x groups).
+ROLLUP_GROUP_BY = False
+
+# Parity check: the operations are also applied one by one (Python-side) and compared with the output of the exported model.
+# Off by default: the query output is the one computed while tracing the model for the ONNX export (one pass on the data).
+CHECK_PARITY = False
+
 # Compose all OLAP operations into a single nn.Module
 # define a new PyTorch neural network module that combines multiple OLAP operations
 class ComposedOLAPModel(nn.Module):
@@ -27,15 +45,58 @@ class ComposedOLAPModel(nn.Module):
             x = op(x) # apply each operation sequentially to the input tensor x
         return x
 
-def decode_operations(operations, columns_to_remove_idx):
+# Hash chain mode: the data version is given to the circuit as one input per appended batch (one per TS),
+# so that the circuit exposes one Poseidon hash per batch. The batches are concatenated back before the OLAP operations.
+# The same model is used in Merkle mode, with one input per proven block.
+class BatchedOLAPModel(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, *batches):
+        return self.model(torch.cat(batches, dim=0))
+
+# Query planner: build the cheapest equivalent list of operations
+# - all the Dicing conditions are merged into one DicingModel (one mask)
+# - the rolled-up columns not used by the Dicing conditions are removed first, so the mask is applied to fewer columns
+# - the Dicing conditions are remapped to the remaining columns, the rolled-up columns used by them are removed last
+# The output has the same columns (and values) as Dicing followed by RollUpModel(columns_to_remove_idx)
+# domains: values of the dimension columns checked on the data (column_domains(tensor_data)), used by the Dicing mask
+# to skip or complement the large sets; None checks every set as it is
+def decode_operations(operations, columns_to_remove_idx, domains=None):
+    conditions = merge_conditions(operations.get("Dicing", []))
+    removed = sorted(columns_to_remove_idx) if "Rollup" in operations else []
+    if not conditions:
+        return [RollUpModel(removed)] if "Rollup" in operations else []
+
+    early = [col for col in removed if col not in conditions]
+    # index of a column after the early projection
+    remap = lambda col: col - sum(1 for c in early if c < col)
+    domains = domains or {}
+
     decoded_ops = []
-    if "Dicing" in operations:
-        for dicing_args in operations["Dicing"]:
-            decoded_ops.append(DicingModel(dicing_args))
-    if "Rollup" in operations:
-        decoded_ops.append(RollUpModel(columns_to_remove_idx))
+    if early:
+        decoded_ops.append(RollUpModel(early))
+    decoded_ops.append(DicingModel({remap(col): values for col, values in conditions.items()},
+                                   domains={remap(col): values for col, values in domains.items() if col not in early}))
+    late = [remap(col) for col in removed if col in conditions]
+    if late:
+        decoded_ops.append(RollUpModel(late))
     return decoded_ops
 
+# Merkle mode: indexes of the blocks with at least one row selected by the Dicing operations
+# (only these blocks are given to the circuit)
+def touched_blocks(blocks, decoded_operations):
+    dicing_positions = [i for i, op in enumerate(decoded_operations) if isinstance(op, DicingModel)]
+    filter_ops = decoded_operations[:dicing_positions[-1] + 1] if dicing_positions else [] # the planner may project columns before the Dicing
+    touched = []
+    for i, block in enumerate(blocks):
+        for op in filter_ops:
+            block = op(block)
+        if (block[:, -1] != 0).any(): # validity column
+            touched.append(i)
+    return touched or [0] # the circuit needs at least one input
+
 def apply_olap_operations(cube, tensor_data, operations):
     result_tensor = tensor_data
     for operation in operations:
@@ -44,16 +105,18 @@ def apply_olap_operations(cube, tensor_data, operations):
     return result_tensor
 
 # Execute the query and generate the proof
-async def op_execute_query(operations, columns_to_remove_idx, timestamp):
-    file_path = os.path.join('Org1', 'PR_DB', 'Sale_PR_C.csv')
-    df = pd.read_csv(file_path)
-
-    # Use TS column to filter and then drop it (it gives problem with the ezkl circuit calibration)
-    df = df[df["TS"] <= timestamp] # select rows with TS <= timestamp
-    df = df.drop(columns=["TS"])
-
-    df.columns = df.columns.str.strip() # Remove leading and trailing whitespace from column names
-    df = df.dropna() # Drop rows with NaN values
+# warm_pool is given by the prover daemon (Org1/prover_daemon.py) to reuse SRS and proving keys kept in memory
+# output_dir and proof_dir can be changed so that several queries can be proven at the same time (see batch_query.py)
+# force_recalibrate=True ignores the memoized calibration and cached circuit (see generate_proof)
+# logrows=None sizes the circuit on its calibrated number of rows, an int forces the circuit size
+async def op_execute_query(operations, columns_to_remove_idx, timestamp, warm_pool=None, output_dir=output_dir, proof_dir=PROOF_DIR,
+                           force_recalibrate=False, logrows=None):
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Select the data version (rows with TS <= timestamp) from the encoded fact table
+    # The TS column is not part of the tensor (it gives problem with the ezkl circuit calibration)
+    cube = OLAPCube.from_store(max_ts=timestamp)
+    ts_values = cube.ts_values # batches of the hash chain
 
     """
     # Save the DataFrame to a CSV file in the 'test' folder before circuit processing
@@ -65,16 +128,42 @@ async def op_execute_query(operations, columns_to_remove_idx, timestamp):
     
     #print(f"Initial DataFrame: \n {df}")
 
-    # Initialize the OLAP cube and transform the data into a tensor
-    cube = OLAPCube(df)
     # save the mappings (categorical values - indexes) to a JSON file in Shared folder
     #cube.save_category_mappings(os.path.join("Shared", "cat_map.json")) 
-    tensor_data = cube.to_tensor()
-
-    decoded_operations = decode_operations(operations, columns_to_remove_idx)
-
-    # Apply the operations to the tensor data (Python-side)
-    final_tensor = apply_olap_operations(cube, tensor_data, decoded_operations)
+    # In fixed-capacity mode the tensor is padded to its row bucket, so the circuit is reused across data versions
+    # (only with the flat commitment: chain batches and Merkle blocks must be hashed as published)
+    padded = PADDED_CAPACITY and COMMITMENT_MODE == "flat"
+    tensor_data = cube.to_tensor(padded=padded)
+
+    # Dimension columns whose values are all in the domains of DFM_Sale.json (only these can be skipped or complemented)
+    domains = column_domains(tensor_data)
+    decoded_operations = decode_operations(operations, columns_to_remove_idx, domains)
+
+    # Circuit inputs: the whole data version, one tensor per batch (hash chain) or the blocks touched by the query (Merkle)
+    if COMMITMENT_MODE == "chain":
+        input_tensors = split_batches(tensor_data, ts_values)
+    elif COMMITMENT_MODE == "merkle":
+        blocks = merkle_blocks(tensor_data)
+        block_indexes = touched_blocks(blocks, decoded_operations)
+        input_tensors = [blocks[i] for i in block_indexes]
+        print(f"Merkle mode: proving {len(block_indexes)} of {len(blocks)} blocks")
+    else:
+        input_tensors = [tensor_data]
+    query_tensor = torch.cat(input_tensors, dim=0)
+
+    if ROLLUP_GROUP_BY and "Rollup" in operations:
+        group_op = rollup_group_by(columns_to_remove_idx, operations.get("Dicing", []), query_tensor.size(1) - len(columns_to_remove_idx), domains)
+        if group_op and len(group_op.groups) < len(query_tensor):
+            decoded_operations.append(group_op)
+            print(f"Group-by in the circuit: {len(group_op.groups)} groups")
+
+    if COMPACT_OUTPUT and "Dicing" in operations:
+        # The size of the compacted output depends on the selected rows
+        with torch.inference_mode():
+            selected_rows = int((ComposedOLAPModel(decoded_operations)(query_tensor) != 0).any(dim=1).sum())
+        compact_op = CompactModel(compact_rows(selected_rows, len(query_tensor)))
+        decoded_operations.append(compact_op)
+        print(f"Compact output: {selected_rows} selected rows in {compact_op.max_rows} output rows")
 
     """
     # Export the model in ONNX format
@@ -88,35 +177,51 @@ async def op_execute_query(operations, columns_to_remove_idx, timestamp):
     composed_model.to(torch.device("cpu"))
     composed_model.eval()
 
-    # Apply the composed model to the tensor data
-    final_tensor_onnx = composed_model(tensor_data)
-
-    # TEST
-    # Compare Python-side and ONNX-side results
-    if final_tensor.shape == final_tensor_onnx.shape:
-        diff = (final_tensor - final_tensor_onnx).abs().max().item()
-        print(f"Max absolute difference between Python and ONNX outputs: {diff}")
-    else:
-        print(f"Shape mismatch: Python {final_tensor.shape}, ONNX {final_tensor_onnx.shape}")
-
     # Export the composed model in ONNX format
     model_onnx_path = os.path.join(output_dir, 'model.onnx')
-    torch.onnx.export(composed_model, tensor_data, model_onnx_path,
-                      export_params=True, opset_version=11, do_constant_folding=True,
-                      input_names=['input'], output_names=['output'])
+    if COMMITMENT_MODE == "flat":
+        export_model = composed_model
+        input_names = ['input']
+    else:
+        export_model = BatchedOLAPModel(composed_model)
+        input_names = [f'input_{i}' for i in range(len(input_tensors))]
+    # The tracing runs the model on the query input: its output is kept as the query result
+    traced = {}
+    hook = composed_model.register_forward_hook(lambda module, inputs, output: traced.update(output=output))
+    with stage("export", input_rows=len(query_tensor)):
+        torch.onnx.export(export_model, tuple(input_tensors), model_onnx_path,
+                          export_params=True, opset_version=11, do_constant_folding=True,
+                          input_names=input_names, output_names=['output'], dynamo=False) # TorchScript exporter, the hook needs its traced run (dynamo is the default from torch 2.9)
+    hook.remove()
+    final_tensor = traced["output"].detach()
+
+    if CHECK_PARITY:
+        # Compare Python-side and ONNX-side results
+        with torch.inference_mode():
+            python_tensor = apply_olap_operations(cube, query_tensor, decoded_operations)
+        if python_tensor.shape == final_tensor.shape:
+            diff = (python_tensor - final_tensor).abs().max().item()
+            print(f"Max absolute difference between Python and ONNX outputs: {diff}")
+        else:
+            print(f"Shape mismatch: Python {python_tensor.shape}, ONNX {final_tensor.shape}")
 
     onnx_model = onnx.load(model_onnx_path)
     onnx.checker.check_model(onnx_model)
 
-    data = dict(
-        input_shapes=[tensor_data.shape],
-        input_data=[(tensor_data).detach().numpy().reshape([-1]).tolist()],
-        output_data=[final_tensor_onnx.detach().numpy().reshape([-1]).tolist()]
-    )
+    # input.json (input shapes, input data, output data) is written in chunks (see data_files.py)
+    # The value ranges checked by the circuit cache and the calibration memo are taken from the tensors, not read back
     input_json_path = os.path.join(output_dir, 'input.json')
-    with open(input_json_path, 'w') as f:
-        json.dump(data, f)
+    write_input_data(input_json_path, input_tensors, final_tensor)
+    value_ranges = array_ranges([t.detach().numpy() for t in input_tensors], final_tensor.detach().numpy())
+
+    poseidon_hash = await generate_proof(output_dir, model_onnx_path, input_json_path, logrows=logrows, warm_pool=warm_pool, proof_dir=proof_dir,
+                                         force_recalibrate=force_recalibrate, value_ranges=value_ranges)
+
+    if COMMITMENT_MODE == "merkle":
+        # The witness hashes are the leaves of the proven blocks: add their inclusion paths
+        poseidon_hash = merkle_proof(timestamp, block_indexes, poseidon_hash, tensor_data)
 
-    poseidon_hash = await generate_proof(output_dir, model_onnx_path, input_json_path, logrows=18)
+    if padded or COMMITMENT_MODE == "merkle":
+        final_tensor = remove_padding(final_tensor)
 
     return final_tensor, poseidon_hash
\ No newline at end of file
@@ -0,0 +1,166 @@
+# Content-addressed cache of the circuit artifacts produced by generate_proof:
+# settings.json, circuit.compiled, test.pk and test.vk, with the value ranges the settings were calibrated on (ranges.json)
+# An entry is keyed on the ONNX graph, the input shape, logrows (None = automatic) and the run args, so a query with
+# the same shape (same Dicing/Rollup structure, same row count) reuses the compiled circuit and keys
+# instead of running gen_settings, calibrate_settings, compile_circuit and setup again.
+# The key does not depend on the data: generate_proof reuses an entry only if the input and output values of the query
+# are inside its ranges (see calibration_memo.ranges_compatible), the same check of the calibration memo.
+# The cache is bounded in size: when it grows over CACHE_MAX_BYTES the least recently used entries are evicted
+# Entries in use are pinned: the prover hard-links the proving key of the entry next to its circuit (checkout) and
+# removes the link when the proof is done (release). The link count of test.pk is the number of provers using the
+# entry: evict skips these entries, and removing or replacing an entry never removes a key that is being used.
+# Hard links need the cache and the output folders on the same file system (both are in Org1/output by default).
+import os
+import json
+import shutil
+import hashlib
+import onnx
+
+CACHE_DIR = os.path.join('Org1', 'output', 'circuit_cache')
+CACHE_MAX_BYTES = 10 * 1024 ** 3 # test.pk alone is ~3 GB with logrows=18
+
+ARTIFACTS = ["settings.json", "circuit.compiled", "test.pk", "test.vk"]
+RANGES_FILE = "ranges.json"
+ENTRY_FILES = ARTIFACTS + [RANGES_FILE]
+
+# Hash of the ONNX graph (nodes, constants and input/output shapes)
+# Only the graph is hashed, so metadata such as the producer version does not change the key
+def graph_sha256(model_onnx_path):
+    model = onnx.load(model_onnx_path)
+    return hashlib.sha256(model.graph.SerializeToString()).hexdigest()
+
+# Shapes of the model inputs, read from the ONNX graph (torch.onnx.export writes static shapes)
+def get_input_shapes(model_onnx_path):
+    model = onnx.load(model_onnx_path)
+    return [[d.dim_value for d in inp.type.tensor_type.shape.dim] for inp in model.graph.input]
+
+def get_cache_key(model_onnx_path, logrows, run_args):
+    key_data = {
+        "graph": graph_sha256(model_onnx_path),
+        "input_shapes": get_input_shapes(model_onnx_path),
+        "logrows": logrows,
+        "run_args": run_args
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+def entry_size(entry_dir):
+    return sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+
+# Return {file name: path in the cache} (artifacts and ranges.json) if the entry exists and is complete, else None
+# A hit marks the entry as recently used (the mtime of the entry folder is the LRU clock)
+def lookup(cache_key, cache_dir=CACHE_DIR):
+    entry_dir = os.path.join(cache_dir, cache_key)
+    paths = {name: os.path.join(entry_dir, name) for name in ENTRY_FILES}
+    if not all(os.path.exists(p) for p in paths.values()):
+        return None
+    os.utime(entry_dir)
+    return paths
+
+# Value ranges of the calibration of a cache entry (paths returned by lookup)
+def load_ranges(cached):
+    with open(cached[RANGES_FILE], "r") as f:
+        return json.load(f)
+
+# Remove an entry: it is renamed first, so the other provers see either the whole entry or no entry
+def remove_entry(entry_dir):
+    trash_dir = os.path.join(os.path.dirname(entry_dir), f".tmp-{os.path.basename(entry_dir)}-{os.getpid()}-removed")
+    try:
+        os.rename(entry_dir, trash_dir)
+    except OSError:
+        return # already removed
+    shutil.rmtree(trash_dir, ignore_errors=True)
+
+# Copy the artifacts of an entry (paths returned by lookup) to artifact_paths = {artifact name: path},
+# the proving key is hard-linked (it pins the entry until release)
+# Return False if the entry was removed or replaced in the meantime (artifact_paths are then not usable)
+def checkout(cached, artifact_paths):
+    pk_path = artifact_paths["test.pk"]
+    try:
+        release(pk_path)
+        os.link(cached["test.pk"], pk_path)
+        for name in ARTIFACTS:
+            if name != "test.pk":
+                shutil.copyfile(cached[name], artifact_paths[name])
+        # an entry is replaced by renaming a new folder: the other artifacts belong to the linked key if it is still there
+        if os.path.samefile(cached["test.pk"], pk_path):
+            return True
+    except FileNotFoundError:
+        pass
+    release(pk_path)
+    return False
+
+# Remove the link to the proving key of an entry (the proof is done)
+def release(pk_path):
+    if os.path.lexists(pk_path):
+        os.remove(pk_path)
+
+def in_use(entry_dir):
+    try:
+        return os.stat(os.path.join(entry_dir, "test.pk")).st_nlink > 1
+    except FileNotFoundError:
+        return False
+
+# Store the artifacts of a freshly set up circuit, artifact_paths = {artifact name: current path}
+# ranges: input and output value ranges the settings were calibrated on (see calibration_memo.value_ranges)
+# The proving key is hard-linked (not copied) into the cache because of its size: the prover's own path is the pin of the
+# entry, it must be given to release when the proof is done
+# The entry is written in a temporary folder and renamed, so concurrent provers never see a partial entry
+# replace=True overwrites an existing entry (forced recalibration, or values outside the ranges of the entry);
+# an incomplete entry (interrupted removal, missing file) is always replaced
+# If another prover stored the same entry in the meantime, its entry is kept and checked out to artifact_paths,
+# so that the settings, compiled circuit and keys used by the caller always belong together
+# Return the paths of the artifacts inside the cache
+def store(cache_key, artifact_paths, ranges, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, replace=False):
+    entry_dir = os.path.join(cache_dir, cache_key)
+    tmp_dir = os.path.join(cache_dir, f".tmp-{cache_key}-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True) # left by an interrupted store
+    os.makedirs(tmp_dir)
+
+    for name in ARTIFACTS:
+        if name == "test.pk":
+            os.link(artifact_paths[name], os.path.join(tmp_dir, name))
+        else:
+            shutil.copyfile(artifact_paths[name], os.path.join(tmp_dir, name))
+    with open(os.path.join(tmp_dir, RANGES_FILE), "w") as f:
+        json.dump(ranges, f)
+
+    if replace or (os.path.isdir(entry_dir) and lookup(cache_key, cache_dir=cache_dir) is None):
+        remove_entry(entry_dir)
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        cached = lookup(cache_key, cache_dir=cache_dir)
+        if cached is not None and checkout(cached, artifact_paths):
+            # Another prover stored the same entry in the meantime: keep theirs, with all of its artifacts
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            # The entry of the other prover is being removed: replace it with ours
+            remove_entry(entry_dir)
+            os.rename(tmp_dir, entry_dir)
+            if not checkout(lookup(cache_key, cache_dir=cache_dir), artifact_paths):
+                raise RuntimeError(f"Circuit cache entry {cache_key[:12]} removed while it was stored")
+
+    evict(max_bytes, cache_dir=cache_dir, keep=cache_key)
+    return lookup(cache_key, cache_dir=cache_dir)
+
+# Remove least recently used entries until the cache fits in max_bytes
+# The "keep" entry and the entries in use by a prover are never removed
+def evict(max_bytes=CACHE_MAX_BYTES, cache_dir=CACHE_DIR, keep=None):
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, name)
+        if name.startswith(".tmp-") or not os.path.isdir(entry_dir):
+            continue
+        entries.append((os.path.getmtime(entry_dir), name, entry_size(entry_dir)))
+
+    total = sum(size for _, _, size in entries)
+    for _, name, size in sorted(entries): # oldest first
+        if total <= max_bytes:
+            break
+        if name == keep or in_use(os.path.join(cache_dir, name)):
+            continue
+        remove_entry(os.path.join(cache_dir, name))
+        total -= size
+        print(f"Circuit cache: evicted {name[:12]} ({size / 1024 ** 2:.1f} MB)")
@@ -0,0 +1,101 @@
+# Memoization of ezkl.calibrate_settings
+# Calibrated settings are stored per (ONNX graph, run args, calibration target) together with a summary of the
+# input and output values (min and max of every input column and of the output). A later query with the same structure
+# whose values fall inside the memoized ranges reuses the calibrated settings and skips gen_settings and calibrate_settings.
+# The output range is needed because it can grow with the data for the same input ranges (e.g. the group-by sums of
+# GroupByModel). The other intermediate values of the OLAP operations are bounded by the input and output ranges
+# (masked or projected input values, boolean masks) or by the number of rows, which is part of the graph
+# (e.g. the positions of CompactModel).
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+from Org1.ezkl_workflow.artifact_cache import graph_sha256
+from Org1.ezkl_workflow.data_files import read_input_data
+
+MEMO_DIR = os.path.join('Org1', 'output', 'calibration_memo')
+MEMO_INDEX = os.path.join(MEMO_DIR, 'index.json')
+
+def get_memo_key(model_onnx_path, run_args, target):
+    key_data = {"graph": graph_sha256(model_onnx_path), "run_args": run_args, "target": target}
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+# Summary of the values: [min, max] of every column of every input, followed by the [min, max] of the output (one column)
+# inputs: NumPy arrays of the input tensors, output: NumPy array of the output tensor (the values written in input.json)
+def array_ranges(inputs, output):
+    ranges = []
+    for values in inputs:
+        values = values.astype(np.float64)
+        if values.size == 0:
+            ranges.append([])
+            continue
+        values = values if values.ndim == 2 else values.reshape(-1, 1)
+        ranges.append([[float(lo), float(hi)] for lo, hi in zip(values.min(axis=0), values.max(axis=0))])
+    output = output.astype(np.float64).reshape([-1])
+    return ranges + [[[float(output.min()), float(output.max())]] if output.size else []]
+
+# Value ranges of an input file (when the tensors are not in memory, e.g. generate_proof run on its own)
+def value_ranges(input_json_path):
+    return array_ranges(*read_input_data(input_json_path))
+
+# True if every column range of "ranges" is inside the corresponding memoized range
+def ranges_compatible(ranges, memo_ranges):
+    if len(ranges) != len(memo_ranges):
+        return False
+    for cols, memo_cols in zip(ranges, memo_ranges):
+        if len(cols) != len(memo_cols):
+            return False
+        for (lo, hi), (memo_lo, memo_hi) in zip(cols, memo_cols):
+            if lo < memo_lo or hi > memo_hi:
+                return False
+    return True
+
+def load_index():
+    if not os.path.exists(MEMO_INDEX):
+        return {}
+    with open(MEMO_INDEX, "r") as f:
+        return json.load(f)
+
+# Return (path of memoized calibrated settings, value ranges they were calibrated on) compatible with this model
+# and input, else None
+# ranges: value ranges of the input (see array_ranges), read from input_json_path if None
+def lookup_entry(model_onnx_path, input_json_path, run_args, target, ranges=None):
+    entries = load_index().get(get_memo_key(model_onnx_path, run_args, target), [])
+    if not entries:
+        return None
+    if ranges is None:
+        ranges = value_ranges(input_json_path)
+    for entry in entries:
+        settings_path = os.path.join(MEMO_DIR, entry["settings"])
+        if ranges_compatible(ranges, entry["ranges"]) and os.path.exists(settings_path):
+            return settings_path, entry["ranges"]
+    return None
+
+# Return the path of memoized calibrated settings compatible with this model and input, else None
+def lookup(model_onnx_path, input_json_path, run_args, target, ranges=None):
+    entry = lookup_entry(model_onnx_path, input_json_path, run_args, target, ranges)
+    return entry[0] if entry else None
+
+# Memoize the calibrated settings for this model and its input and output value ranges, return the ranges
+def store(model_onnx_path, input_json_path, run_args, target, settings_filename, ranges=None):
+    os.makedirs(MEMO_DIR, exist_ok=True)
+    memo_key = get_memo_key(model_onnx_path, run_args, target)
+    if ranges is None:
+        ranges = value_ranges(input_json_path)
+
+    settings_name = f"{memo_key[:16]}-{hashlib.sha256(json.dumps(ranges).encode()).hexdigest()[:16]}.json"
+    shutil.copyfile(settings_filename, os.path.join(MEMO_DIR, settings_name))
+
+    index = load_index()
+    # Entries with the same ranges are replaced (e.g. forced recalibration)
+    entries = [e for e in index.get(memo_key, []) if e["ranges"] != ranges]
+    entries.append({"ranges": ranges, "settings": settings_name})
+    index[memo_key] = entries
+
+    tmp_index = f"{MEMO_INDEX}.{os.getpid()}.tmp"
+    with open(tmp_index, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_index, MEMO_INDEX)
+    return ranges
@@ -0,0 +1,75 @@
+# Input and witness files of the circuit without building the whole JSON in memory
+# - input.json (read by ezkl, which only accepts JSON): written in chunks from the NumPy arrays of the tensors,
+#   instead of converting every tensor into a Python list and dumping it at once.
+#   The Python side uses the tensors it already has in memory (e.g. the value ranges of the calibration memo):
+#   input.json is parsed again only when the tensors are not available (read_input_data).
+# - witness.json (written by ezkl): the top-level fields needed after the proof (e.g. processed_inputs) are read from
+#   the end of the file, without parsing the inputs, outputs and pretty_elements that come before them.
+import os
+import json
+import numpy as np
+
+CHUNK_VALUES = 65536 # values converted to text at a time
+WITNESS_TAIL_BYTES = 65536 # first block read from the end of witness.json (doubled until the fields are found)
+
+def write_values(f, values):
+    values = values.reshape([-1])
+    f.write("[")
+    for start in range(0, values.size, CHUNK_VALUES):
+        if start:
+            f.write(", ")
+        f.write(json.dumps(values[start:start + CHUNK_VALUES].tolist())[1:-1])
+    f.write("]")
+
+def write_list(f, arrays):
+    f.write("[")
+    for i, values in enumerate(arrays):
+        if i:
+            f.write(", ")
+        write_values(f, values)
+    f.write("]")
+
+# Write the input file of ezkl (input_shapes, input_data, output_data)
+# inputs: list of input tensors, output: output tensor of the model
+def write_input_data(input_json_path, inputs, output):
+    inputs = [t.detach().numpy() for t in inputs]
+    output = output.detach().numpy()
+    with open(input_json_path, "w") as f:
+        f.write('{"input_shapes": ' + json.dumps([list(a.shape) for a in inputs]) + ', "input_data": ')
+        write_list(f, inputs)
+        f.write(', "output_data": ')
+        write_list(f, [output])
+        f.write("}")
+
+# Read an input file: (input tensors as NumPy arrays, flattened output values)
+def read_input_data(input_json_path):
+    with open(input_json_path, "r") as f:
+        data = json.load(f)
+    inputs = [np.asarray(values, dtype=np.float64).reshape(shape) for shape, values in zip(data["input_shapes"], data["input_data"])]
+    return inputs, np.asarray(data["output_data"][0], dtype=np.float64).reshape([-1])
+
+# Read top-level fields of witness.json, return {field: value}
+# The fields after the large ones (processed_inputs, processed_params, ...) are found by reading only the end of the file;
+# the last occurrence of a key is the top-level one (pretty_elements, which uses the same key names, comes before).
+def read_witness_fields(witness_path, fields):
+    decoder = json.JSONDecoder()
+    size = os.path.getsize(witness_path)
+    block = WITNESS_TAIL_BYTES
+    with open(witness_path, "rb") as f:
+        while True:
+            f.seek(max(size - block, 0))
+            tail = f.read().decode("utf-8", errors="ignore")
+            values = {}
+            for field in fields:
+                key = tail.rfind(f'"{field}":')
+                if key < 0:
+                    break
+                start = key + len(field) + 3
+                while tail[start].isspace():
+                    start += 1
+                values[field] = decoder.raw_decode(tail, start)[0]
+            if len(values) == len(fields):
+                return values
+            if block >= size:
+                raise KeyError(f"Fields {[f for f in fields if f not in values]} not found in {witness_path}")
+            block *= 2
@@ -1,111 +1,116 @@
 import os
-os.environ["RUST_LOG"] = "trace" # !RUST_LOG=trace
+from Shared.instrumentation import configure_ezkl_logging, stage, file_size
+configure_ezkl_logging() # RUST_LOG (default CBI_ZKP_EZKL_LOG="warn", set RUST_LOG=trace to debug ezkl)
 import json
+import math
 import asyncio
 import sys
+import shutil
 import ezkl
 import numpy as np
 
+from Org1.ezkl_workflow import artifact_cache
+from Org1.ezkl_workflow import calibration_memo
+from Org1.ezkl_workflow.data_files import read_witness_fields
+
 #print("EZKL module path:", ezkl.__file__)
 #print("EZKL dir:", dir(ezkl))
 
-async def generate_proof(output_dir, model_onnx_path, input_json_path, logrows):
-    # input_json_path for a file with: input shape, input data, output data
-
-    # Generazione delle impostazioni usando ezkl
-    settings_filename = os.path.join('Shared', 'proof', 'settings.json')
-    os.makedirs(os.path.dirname(settings_filename), exist_ok=True)
-    compiled_filename = os.path.join(output_dir, 'circuit.compiled')
+# Run args of the circuit, kept as a plain dict so they can be part of the circuit cache key
+RUN_ARGS = {"input_visibility": "hashed/public"}
 
+# Target of ezkl.calibrate_settings ("resources" or "accuracy")
+CALIBRATION_TARGET = "resources"
 
-    run_args = ezkl.PyRunArgs()
-    run_args.input_visibility = "hashed/public"
+# Folder of the files shared with OrgB (settings.json, test.vk, test.pf)
+PROOF_DIR = os.path.join('Shared', 'proof')
 
-    
-    # ezkl.gen_settings() -> Generate a settings file analyzing the ONNX model, to create the zero-knowledge proof circuit
-    # The file contains all the necessary configuration parameters (like input/output shapes, precision, and circuit options)
-    res = ezkl.gen_settings(model_onnx_path, settings_filename, py_run_args=run_args)
-    assert res == True # file successfully generated
-    print(f"EZKL Generate settings: {res}")
-        
-    """
-    # Update settings to use Hashed input visibility
-    # Hash the input(s) with the Poseidon hash function inside the zero-knowledge circuit
-    # ezkl hash the input usign Poseidon hash function, 
-    #   and the hash will be included as a public value in the proof and witness.json
-    with open(settings_filename, "r") as f:
-        settings = json.load(f)
-    settings["run_args"]["input_visibility"] = "Hashed"
-    with open(settings_filename, "w") as f:
-        json.dump(settings, f, indent=4)
+# Automatic logrows (logrows=None): smallest power of two that fits the circuit rows plus the rows reserved for blinding
+# (same margin used by ezkl: 5 blinding factors + 3 padding rows)
+BLINDING_ROWS = 8
+MIN_LOGROWS = 10
+MAX_LOGROWS = 26 # largest SRS published for ezkl
 
-    with open(settings_filename, "r") as f:
-        print("DEBUG settings.json:\n", f.read())
-    """
-    
+# logrows: size of the circuit (2^logrows rows), None to derive it from the calibrated settings (see fit_logrows)
+# warm_pool: optional WarmPool (see warm_pool.py) used by the prover daemon to read SRS and proving keys from memory
+# proof_dir: where settings.json, test.vk and test.pf are written (batched queries use one folder per query)
+# force_recalibrate: ignore the circuit cache and the calibration memo, calibrate again and refresh both
+# value_ranges: value ranges of the input and output tensors (calibration_memo.array_ranges), read from input_json_path if None
+async def generate_proof(output_dir, model_onnx_path, input_json_path, logrows, use_cache=True, warm_pool=None, proof_dir=PROOF_DIR,
+                         force_recalibrate=False, value_ranges=None):
+    # input_json_path for a file with: input shape, input data, output data
 
-    # SRS (Structured Reference System) is a set of cryptographic parameters used in zk-SNARKs to generate and verify proofs
-    # cd ~/.ezkl/srs/
-    # ezkl.get_srs() -> library to generate or download the SRS file needed for zero-knowledge proofs
-    #   logrows: Security parameter that determines the size of the SRS (the number of rows is 2^logrows)
-    try:
-        print(f"Attempting to get SRS with logrows={logrows}")
-        res = await ezkl.get_srs(settings_filename, logrows=logrows)
-        assert res == True
-        print(f"EZKL Get SRS: {res}")
-    except Exception as e:
-        print(f"Error during SRS generation: {e}")
-        raise
+    # Generazione delle impostazioni usando ezkl
+    settings_filename = os.path.join(proof_dir, 'settings.json')
+    os.makedirs(os.path.dirname(settings_filename), exist_ok=True)
+    compiled_filename = os.path.join(output_dir, 'circuit.compiled')
+    pk_path = os.path.join(output_dir, 'test.pk') # Proving Key (to generate the proof)
+    vk_path = os.path.join(proof_dir, 'test.vk') # Verifying Key (to verify the proof)
 
-    # ezkl.calibrate_settings() -> analyze the input data and model to adjust parameters (like scaling, precision, and ranges) in your settings.json 
-    #   to ensure the circuit will work correctly and efficiently for your specific data
-    # "resources" argument specifies the directory where ezkl will store calibration resources and temporary files generated during the calibration process
-    res = await ezkl.calibrate_settings(input_json_path, model_onnx_path, settings_filename, "resources")
-    assert res == True
-    print(f"EZKL Calibrate settings: {res}")
+    # Reuse settings, compiled circuit and keys of a query with the same shape if they are in the cache
+    # and the values of this query are inside the ranges they were calibrated on
+    cached = None
+    stale = False
+    if use_cache:
+        cache_key = artifact_cache.get_cache_key(model_onnx_path, logrows, RUN_ARGS)
+        if not force_recalibrate:
+            cached = artifact_cache.lookup(cache_key)
+        if cached and not fits_calibration(cached, input_json_path, value_ranges):
+            print(f"Circuit cache entry {cache_key[:12]} calibrated on other value ranges: setting up the circuit again")
+            cached = None
+            stale = True
 
-    # This function compiles your ONNX model and the calibrated settings into a zero-knowledge proof circuit
-    # This step is essential before running setup, witness, or proof generation
-    res = ezkl.compile_circuit(model_onnx_path, compiled_filename, settings_filename)
-    assert res == True
-    print(f"EZKL Compile circuit: {res}")
+    # With the cache, pk_path is a hard link to the proving key of the entry: it keeps the entry from being evicted
+    # (or its key from being removed) until the proof is done
+    artifact_paths = {"settings.json": settings_filename, "circuit.compiled": compiled_filename, "test.pk": pk_path, "test.vk": vk_path}
+    if cached and not artifact_cache.checkout(cached, artifact_paths):
+        print(f"Circuit cache entry {cache_key[:12]} removed in the meantime: setting up the circuit again")
+        cached = None
 
-    # Verifica dell'esistenza dei file necessari
-    assert os.path.exists(settings_filename)
-    assert os.path.exists(input_json_path)
-    assert os.path.exists(model_onnx_path)
+    if cached:
+        print(f"Circuit cache hit ({cache_key[:12]}): skipping settings, calibration, compilation and setup")
+        await get_srs(settings_filename, settings_logrows(settings_filename))
+    else:
+        # A link left by an interrupted proof must not be overwritten by ezkl.setup (it is the key of a cache entry)
+        artifact_cache.release(pk_path)
+        ranges = await setup_circuit(model_onnx_path, input_json_path, settings_filename, compiled_filename, vk_path, pk_path, logrows,
+                                     force_recalibrate=force_recalibrate, value_ranges=value_ranges)
+        if use_cache:
+            cached = artifact_cache.store(cache_key, artifact_paths, ranges, replace=force_recalibrate or stale)
 
-    # Setup della prova con ezkl
-    pk_path = os.path.join(output_dir, 'test.pk') # Proving Key (to generate the proof)
-    vk_path = os.path.join('Shared', 'proof', 'test.vk') # Verifying Key (to verify the proof)
-    # ezkl.setup() -> This function generates the proving and verifying keys needed for the zero-knowledge proof
-    res = ezkl.setup(compiled_filename, vk_path, pk_path)
-    assert res == True
-    print(f"EZKL Setup: {res}")
+    srs_path = None
+    prove_pk_path = pk_path
+    if warm_pool:
+        srs_path = warm_pool.srs_path(settings_filename)
+        if cached:
+            prove_pk_path = warm_pool.proving_key(pk_path)
 
     witness_path = os.path.join(output_dir, "witness.json")
+    proof_path = os.path.join(proof_dir, 'test.pf')
     try:
         # Witness generation needed to create the proof
         # Witness is a JSON file that contains the input data and intermediate values computed by the circuit
-        res = await ezkl.gen_witness(input_json_path, compiled_filename, witness_path)
-        if res:
-            print("EZKL Witness Generation successful")
-    except Exception as e:
-        print(f"An error occurred: {e}")
+        with stage("witness", input_bytes=file_size(input_json_path), circuit_bytes=file_size(compiled_filename)):
+            witness = ezkl.gen_witness(input_json_path, compiled_filename, witness_path)
+        if not witness:
+            raise RuntimeError("EZKL Witness Generation failed")
+        print("EZKL Witness Generation successful") # gen_witness also returns the witness, witness.json does not need to be read back
 
-    proof_path = os.path.join('Shared', 'proof', 'test.pf')
-    try:
-        # Proof generation
-        # "single" indicates that we are generating a single proof for the circuit
-        res = ezkl.prove(witness_path, compiled_filename, pk_path, proof_path, "single")
-        if res:
-            print("EZKL Proof Generation successful")
-    except Exception as e:
-        print(f"An error occurred: {e}")
+        # Proof generation (a proof left by a previous query must not be taken for this one)
+        if os.path.exists(proof_path):
+            os.remove(proof_path)
+        with stage("prove", witness_bytes=file_size(witness_path), pk_bytes=file_size(prove_pk_path)) as event:
+            res = ezkl.prove(witness_path, compiled_filename, prove_pk_path, proof_path, srs_path=srs_path)
+            event["proof_bytes"] = file_size(proof_path)
+        if not res or not os.path.exists(proof_path):
+            raise RuntimeError("EZKL Proof Generation failed")
+        print("EZKL Proof Generation successful")
+    finally:
+        if cached:
+            artifact_cache.release(pk_path) # unpin the cache entry
 
-    witness_path = os.path.join(output_dir, "witness.json")
-    with open(witness_path, "r") as f:
-        witness = json.load(f)
+    if not isinstance(witness, dict) or "processed_inputs" not in witness:
+        witness = read_witness_fields(witness_path, ["processed_inputs"])
     poseidon_hash = witness["processed_inputs"]["poseidon_hash"]
     print("Poseidon hash of input:", poseidon_hash)
 
@@ -132,16 +137,151 @@ async def generate_proof(output_dir, model_onnx_path, input_json_path, logrows):
             json.dump({"poseidon_hash": poseidon_hash}, f, indent=4)
     """
 
+# True if the input and output values of input_json_path are inside the ranges a cache entry was calibrated on
+# (same check of the calibration memo: e.g. the group-by sums grow with the data for the same circuit)
+def fits_calibration(cached, input_json_path, value_ranges=None):
+    if value_ranges is None:
+        value_ranges = calibration_memo.value_ranges(input_json_path)
+    return calibration_memo.ranges_compatible(value_ranges, artifact_cache.load_ranges(cached))
+
+# Generate settings, calibrate and compile the circuit, then generate the proving and verifying keys
+# Calibrated settings are memoized: a model with the same graph and compatible input value ranges skips the calibration
+# Return the input and output value ranges the settings were calibrated on
+async def setup_circuit(model_onnx_path, input_json_path, settings_filename, compiled_filename, vk_path, pk_path, logrows,
+                        force_recalibrate=False, value_ranges=None):
+    memo_entry = None
+    if not force_recalibrate:
+        memo_entry = calibration_memo.lookup_entry(model_onnx_path, input_json_path, RUN_ARGS, CALIBRATION_TARGET, value_ranges)
+
+    if memo_entry:
+        print("Calibration memo hit: skipping settings generation and calibration")
+        memo_settings, ranges = memo_entry
+        shutil.copyfile(memo_settings, settings_filename)
+    else:
+        await calibrate_circuit_settings(model_onnx_path, input_json_path, settings_filename)
+        ranges = calibration_memo.store(model_onnx_path, input_json_path, RUN_ARGS, CALIBRATION_TARGET, settings_filename, value_ranges)
+
+    # Size the circuit on the calibrated settings and fetch the SRS of exactly that size
+    logrows = fit_logrows(settings_filename, logrows)
+    await get_srs(settings_filename, logrows)
+
+    # This function compiles your ONNX model and the calibrated settings into a zero-knowledge proof circuit
+    # This step is essential before running setup, witness, or proof generation
+    with stage("compile", model_bytes=file_size(model_onnx_path)):
+        res = ezkl.compile_circuit(model_onnx_path, compiled_filename, settings_filename)
+    assert res == True
+    print(f"EZKL Compile circuit: {res}")
+
+    # Verifica dell'esistenza dei file necessari
+    assert os.path.exists(settings_filename)
+    assert os.path.exists(input_json_path)
+    assert os.path.exists(model_onnx_path)
+
+    # Setup della prova con ezkl
+    # ezkl.setup() -> This function generates the proving and verifying keys needed for the zero-knowledge proof
+    with stage("setup", circuit_bytes=file_size(compiled_filename)) as event:
+        res = ezkl.setup(compiled_filename, vk_path, pk_path)
+        event["pk_bytes"] = file_size(pk_path)
+        event["vk_bytes"] = file_size(vk_path)
+    assert res == True
+    print(f"EZKL Setup: {res}")
+    return ranges
+
+# Generate the settings of the circuit and calibrate them on the input data
+async def calibrate_circuit_settings(model_onnx_path, input_json_path, settings_filename):
+    run_args = ezkl.PyRunArgs()
+    for name, value in RUN_ARGS.items():
+        setattr(run_args, name, value)
+
+    # ezkl.gen_settings() -> Generate a settings file analyzing the ONNX model, to create the zero-knowledge proof circuit
+    # The file contains all the necessary configuration parameters (like input/output shapes, precision, and circuit options)
+    with stage("gen_settings", model_bytes=file_size(model_onnx_path)):
+        res = ezkl.gen_settings(model_onnx_path, settings_filename, py_run_args=run_args)
+    assert res == True # file successfully generated
+    print(f"EZKL Generate settings: {res}")
+        
+    """
+    # Update settings to use Hashed input visibility
+    # Hash the input(s) with the Poseidon hash function inside the zero-knowledge circuit
+    # ezkl hash the input usign Poseidon hash function, 
+    #   and the hash will be included as a public value in the proof and witness.json
+    with open(settings_filename, "r") as f:
+        settings = json.load(f)
+    settings["run_args"]["input_visibility"] = "Hashed"
+    with open(settings_filename, "w") as f:
+        json.dump(settings, f, indent=4)
+
+    with open(settings_filename, "r") as f:
+        print("DEBUG settings.json:\n", f.read())
+    """
+    
+
+    # ezkl.calibrate_settings() -> analyze the input data and model to adjust parameters (like scaling, precision, and ranges) in your settings.json 
+    #   to ensure the circuit will work correctly and efficiently for your specific data
+    # "resources" target (CALIBRATION_TARGET) optimizes the circuit size, "accuracy" optimizes the numerical precision
+    with stage("calibrate", input_bytes=file_size(input_json_path), target=CALIBRATION_TARGET):
+        res = ezkl.calibrate_settings(input_json_path, model_onnx_path, settings_filename, CALIBRATION_TARGET)
+    assert res == True
+    print(f"EZKL Calibrate settings: {res}")
+
+# Smallest logrows whose 2^logrows rows fit the calibrated circuit: its rows (num_rows), the range check and lookup
+# tables and the dynamic lookup/shuffle columns, plus the blinding rows
+def required_logrows(settings):
+    rows = [settings["num_rows"], settings.get("total_dynamic_col_size", 0), settings.get("total_shuffle_col_size", 0)]
+    rows += [hi - lo + 1 for lo, hi in settings.get("required_range_checks", [])]
+    if settings.get("required_lookups"):
+        lo, hi = settings["run_args"]["lookup_range"]
+        rows.append(hi - lo + 1)
+    return max(MIN_LOGROWS, math.ceil(math.log2(max(rows) + BLINDING_ROWS)))
+
+def settings_logrows(settings_filename):
+    with open(settings_filename, "r") as f:
+        return json.load(f)["run_args"]["logrows"]
+
+# Write the logrows of the circuit in settings.json and return it
+# logrows=None uses the required logrows, an explicit logrows smaller than the required one is an error
+def fit_logrows(settings_filename, logrows=None):
+    with open(settings_filename, "r") as f:
+        settings = json.load(f)
+    required = required_logrows(settings)
+    if logrows is None:
+        logrows = required
+    elif logrows < required:
+        raise ValueError(f"logrows={logrows} is too small for the circuit ({settings['num_rows']} rows), at least {required} is needed")
+    if logrows > MAX_LOGROWS:
+        raise ValueError(f"The circuit needs logrows={logrows}, more than the largest SRS (logrows={MAX_LOGROWS})")
+
+    settings["run_args"]["logrows"] = logrows
+    with open(settings_filename, "w") as f:
+        json.dump(settings, f)
+    print(f"Circuit rows: {settings['num_rows']}, logrows: {logrows} (required {required})")
+    return logrows
+
+# SRS (Structured Reference System) is a set of cryptographic parameters used in zk-SNARKs to generate and verify proofs
+# cd ~/.ezkl/srs/
+# ezkl.get_srs() -> library to generate or download the SRS file needed for zero-knowledge proofs
+#   logrows: Security parameter that determines the size of the SRS (the number of rows is 2^logrows)
+async def get_srs(settings_filename, logrows):
+    try:
+        print(f"Attempting to get SRS with logrows={logrows}")
+        with stage("get_srs", logrows=logrows):
+            res = await ezkl.get_srs(settings_filename, logrows=logrows)
+        assert res == True
+        print(f"EZKL Get SRS: {res}")
+    except Exception as e:
+        print(f"Error during SRS generation: {e}")
+        raise
+
 
     
 if __name__ == "__main__":
     import sys
     if len(sys.argv) != 5:
-        print("Usage: python generate_proof.py <output_dir> <model_onnx_path> <input_json_path> <logrows>")
+        print("Usage: python generate_proof.py <output_dir> <model_onnx_path> <input_json_path> <logrows|auto>")
         sys.exit(1)
 
     output_dir = sys.argv[1]
     model_onnx_path = sys.argv[2]
     input_json_path = sys.argv[3]
-    logrows = int(sys.argv[4])
+    logrows = None if sys.argv[4] == "auto" else int(sys.argv[4])
     asyncio.run(generate_proof(output_dir, model_onnx_path, input_json_path, logrows))
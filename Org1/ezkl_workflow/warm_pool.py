@@ -0,0 +1,76 @@
+# Warm pool of SRS files and proving keys, used by the long-running prover daemon (Org1/prover_daemon.py)
+# The ezkl Python API only takes file paths, so "memory-resident" here means the files are copied once
+# into a tmpfs folder (/dev/shm): every later proof reads them from RAM instead of the disk.
+# SRS files are kept for every logrows used so far, proving keys are kept for the most recently used circuits
+# (bounded by WARM_POOL_MAX_BYTES, least recently used keys are dropped first)
+import os
+import json
+import shutil
+import hashlib
+from collections import OrderedDict
+
+WARM_DIR = os.path.join('/dev/shm', 'cbi-zkp') if os.path.isdir('/dev/shm') else None
+WARM_POOL_MAX_BYTES = 8 * 1024 ** 3
+SRS_DIR = os.path.join(os.environ.get("EZKL_REPO_PATH", os.path.join(os.path.expanduser('~'), '.ezkl')), 'srs') # where ezkl.get_srs stores the SRS files
+
+class WarmPool:
+    def __init__(self, warm_dir=WARM_DIR, max_bytes=WARM_POOL_MAX_BYTES):
+        self.warm_dir = warm_dir
+        self.max_bytes = max_bytes
+        self.srs_files = {} # logrows -> path in the pool
+        self.proving_keys = OrderedDict() # identity of the original pk file -> path in the pool (LRU order)
+        if self.warm_dir:
+            os.makedirs(os.path.join(self.warm_dir, 'srs'), exist_ok=True)
+            os.makedirs(os.path.join(self.warm_dir, 'pk'), exist_ok=True)
+
+    # Return the pooled SRS for the logrows written in settings.json (the SRS must already be fetched with ezkl.get_srs)
+    def srs_path(self, settings_filename):
+        with open(settings_filename, "r") as f:
+            logrows = json.load(f)["run_args"]["logrows"]
+        source = os.path.join(SRS_DIR, f"kzg{logrows}.srs")
+
+        if logrows not in self.srs_files:
+            if not self.warm_dir or not os.path.exists(source):
+                return None # let ezkl use its default SRS path
+            target = os.path.join(self.warm_dir, 'srs', f"kzg{logrows}.srs")
+            shutil.copyfile(source, target)
+            self.srs_files[logrows] = target
+            print(f"Warm pool: loaded SRS logrows={logrows}")
+        return self.srs_files[logrows]
+
+    # Return the pooled copy of a proving key, loading it (and evicting old keys) if needed
+    # A key is identified by its file (device, inode, size, mtime), not by its path: a cache entry set up again
+    # (artifact_cache.store with replace=True) writes a new key at the same path
+    def proving_key(self, pk_path):
+        if not self.warm_dir:
+            return pk_path
+
+        stat = os.stat(pk_path)
+        key_id = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if key_id in self.proving_keys:
+            self.proving_keys.move_to_end(key_id)
+            return self.proving_keys[key_id]
+
+        size = stat.st_size
+        if size > self.max_bytes:
+            return pk_path # too big for the pool
+        while self.proving_keys and self.pooled_bytes() + size > self.max_bytes:
+            _, old_path = self.proving_keys.popitem(last=False)
+            os.remove(old_path)
+            print(f"Warm pool: dropped proving key {old_path}")
+
+        target = os.path.join(self.warm_dir, 'pk', hashlib.sha256(repr(key_id).encode()).hexdigest()[:16] + ".pk")
+        shutil.copyfile(pk_path, target)
+        self.proving_keys[key_id] = target
+        print(f"Warm pool: loaded proving key {pk_path} ({size / 1024 ** 2:.1f} MB)")
+        return target
+
+    def pooled_bytes(self):
+        return sum(os.path.getsize(p) for p in self.proving_keys.values())
+
+    # Remove every pooled file (called when the daemon stops, tmpfs memory is not released otherwise)
+    def clear(self):
+        if self.warm_dir:
+            shutil.rmtree(self.warm_dir, ignore_errors=True)
+        self.srs_files = {}
+        self.proving_keys = OrderedDict()
@@ -3,10 +3,12 @@ import json
 import logging
 import ezkl
 from web3 import Web3
-import pandas as pd
 import numpy as np
+import torch
 
-from Org1.models.olap_cube import OLAPCube
+from Org1.models.olap_cube import OLAPCube, PADDED_CAPACITY
+from Org1.column_store import table_rows, load_meta, SALE_PR_C_STORE
+from Shared.instrumentation import stage
 #from pymerkle import MerkleTree
 
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +20,21 @@ with open(CONFIG_PATH, 'r') as f:
 
 CONTRACT_ADDRESS = contract_addresses.get("HashStorage")
 
+# Commitment published on HashStorage for each data version:
+# "flat"  -> Poseidon hash of the whole data version (c_pos_hash)
+# "chain" -> incremental hash chain over the appended batches (one batch per TS): publishing a new version
+#            only hashes the new batch. Query circuits then take one input per batch, their per-batch hashes
+#            are folded into the chain head by compare_hash on OrgB.
+# "merkle" -> root of a Merkle tree over fixed-size row blocks (MERKLE_BLOCK_ROWS rows + validity column,
+#             last block zero-padded). Query circuits then take only the blocks touched by the Dicing filters,
+#             and OrgB checks the inclusion path of every proven block against the published root.
+# Org1 and OrgB must use the same mode
+COMMITMENT_MODE = "flat"
+HASH_CHAIN_PATH = os.path.join('Org1', 'PR_DB', 'hash_chain.json')
+ZERO_FELT = "00" * 32
+MERKLE_BLOCK_ROWS = 32
+MERKLE_DIR = os.path.join('Org1', 'PR_DB', 'merkle') # one tree per published TS
+
 # ABI (Application Binary Interface) is a JSON description of the contract's functions and events
 # It allows us to interact with the contract using web3.py
 CONTRACT_ABI_SET_HASH = json.loads('''
@@ -56,59 +73,258 @@ def setup_web3():
 def get_contract(web3, address, abi):
     return web3.eth.contract(address=address, abi=abi)
 
-# Compute the Poseidon hash of the dataset considering only the rows before the given timestamp
-def c_pos_hash(timestamp):
-    file_path = os.path.join('Org1', 'PR_DB', "Sale_PR_C.csv")
-    df = pd.read_csv(file_path)
+# Same scale as in ezkl settings.json (input_scale)
+SCALE = 13
+# BN254 scalar field modulus: negative values are encoded as FIELD_MODULUS - |value|
+FIELD_MODULUS = 21888242871839275222246405745257275088548364400416034343698204186575808495617
+FELT_CHECK_SAMPLES = 256 # values of every hashed table checked against ezkl.float_to_felt
 
-    # Use TS column to filter and then drop it (it gives problem with the ezkl circuit calibration)
-    df = df[df["TS"] <= timestamp] # select rows with TS <= timestamp
-    df = df.drop(columns=["TS"])
+# Vectorized equivalent of [ezkl.float_to_felt(float(x), scale) for x in values]
+# ezkl quantizes round(x * 2**scale) (half away from zero) and writes the field element as
+# 32 little-endian bytes in hex. Here the quantization is done with NumPy on the whole array and the
+# field elements are built as 4 uint64 limbs, so the only Python loop left is the final split of the hex string.
+def floats_to_felts(values, scale=SCALE):
+    values = np.asarray(values, dtype=np.float64).reshape(-1)
+    scaled = values * float(2 ** scale)
+    if not np.all(np.isfinite(scaled)) or np.any(np.abs(scaled) >= 2.0 ** 63):
+        raise ValueError(f"Failed to quantize values: out of range for scale {scale}")
 
-    df.columns = df.columns.str.strip() # Remove leading and trailing whitespace from column names
-    df = df.dropna() # Drop rows with NaN values
+    magnitude = np.abs(scaled)
+    floor = np.floor(magnitude)
+    quantized = (floor + (magnitude - floor >= 0.5)).astype(np.uint64) # round half away from zero
+    negative = (scaled < 0) & (quantized > 0) # a negative value rounded to zero is the field element 0
 
-    """
-    # Save the DataFrame to a CSV file in the 'test' folder 
-    test_dir = os.path.join('test')
-    os.makedirs(test_dir, exist_ok=True)
-    before_circuit_path = os.path.join(test_dir, 'HashCalculation.csv')
-    df.to_csv(before_circuit_path, index=False)
-    """
+    # Little-endian 64-bit limbs: |q| for positive values, FIELD_MODULUS - |q| for negative ones
+    limbs = np.zeros((values.size, 4), dtype='<u8')
+    limbs[:, 0] = quantized
+    if np.any(negative):
+        modulus_limbs = [(FIELD_MODULUS >> (64 * i)) & (2 ** 64 - 1) for i in range(4)]
+        borrow = np.zeros(values.size, dtype=np.uint64)
+        subtrahend = np.where(negative, quantized, 0).astype(np.uint64)
+        for i in range(4):
+            limb = np.uint64(modulus_limbs[i])
+            with np.errstate(over='ignore'):
+                diff = limb - subtrahend - borrow
+            borrow = ((subtrahend > limb) | ((subtrahend == limb) & (borrow > 0))).astype(np.uint64)
+            limbs[negative, i] = diff[negative]
+            subtrahend = np.zeros(values.size, dtype=np.uint64)
 
-    cube = OLAPCube(df)
-    tensor_data = cube.to_tensor()
+    hex_string = limbs.tobytes().hex()
+    return [hex_string[i:i + 64] for i in range(0, len(hex_string), 64)]
 
-    # input_floats = [1.23, 4.56]
+# Compare the vectorized conversion of a sample of the values (first, last and evenly spaced) with ezkl.float_to_felt
+# Called once per hashed table (c_pos_hash, hash chain update, Merkle tree), not per block or batch
+def check_felt_conversion(values, scale=SCALE, samples=FELT_CHECK_SAMPLES):
+    values = np.asarray(values, dtype=np.float64).reshape(-1)
+    if values.size == 0:
+        return
+    sample = values[np.unique(np.linspace(0, values.size - 1, num=min(samples, values.size)).astype(int))]
+    for value, felt in zip(sample, floats_to_felts(sample, scale)):
+        expected = ezkl.float_to_felt(float(value), scale)
+        if felt != expected:
+            raise ValueError(f"Field element mismatch for value {value}: {felt} != {expected} (ezkl)")
 
-    # same scale as in ezkl settings.json
-    scale = 13           # 2 ** 6 input_scale max
-    
-    # Flatten the tensor and clean invalid values
+# Flattened values of a tensor as hashed by ezkl (invalid values cleaned)
+def tensor_values(tensor_data):
     flat_tensor = tensor_data.detach().numpy().reshape(-1)
-    flat_tensor = np.nan_to_num(flat_tensor, nan=0.0, posinf=0.0, neginf=0.0)
+    return np.nan_to_num(flat_tensor, nan=0.0, posinf=0.0, neginf=0.0)
+
+# Encoded tensor of the data version at timestamp (rows with TS <= timestamp), same layout as the circuit input
+# The rows are a view of the memory-mapped encoded fact table (OLAPCube.from_store)
+def version_tensor(timestamp, padded=PADDED_CAPACITY):
+    return OLAPCube.from_store(max_ts=timestamp).to_tensor(padded=padded)
 
+# Poseidon hash of a tensor, as computed by ezkl for a hashed circuit input
+def tensor_pos_hash(tensor_data, scale=SCALE):
     # Convert floats to field elements (as strings)
-    field_elements = []
-    for x in flat_tensor:
-        try:
-            field_elements.append(ezkl.float_to_felt(float(x), scale))
-        except Exception as e:
-            print(f"Failed to quantize value: {x} ({e})")
-            raise
+    return felts_pos_hash(floats_to_felts(tensor_values(tensor_data), scale), scale)
 
+def felts_pos_hash(field_elements, scale=SCALE):
+    field_elements = list(field_elements)
     # ezkl expects only 2 elements, pad if needed:
     while len(field_elements) < 2:
         field_elements.append(ezkl.float_to_felt(0.0, scale))
 
-    poseidon_hash = ezkl.poseidon_hash(field_elements)
+    return ezkl.poseidon_hash(field_elements)
+
+# Compute the Poseidon hash of the dataset considering only the rows before the given timestamp
+def c_pos_hash(timestamp):
+    with stage("hash", timestamp=timestamp) as event:
+        tensor_data = version_tensor(timestamp)
+        event["input_rows"] = len(tensor_data)
+        check_felt_conversion(tensor_values(tensor_data))
+        poseidon_hash = tensor_pos_hash(tensor_data)
     print("ezkl Poseidon hash:", poseidon_hash)
     return poseidon_hash
+
+## HASH CHAIN (COMMITMENT_MODE = "chain")
+# chain_0 = Poseidon(0, batch_hash_0), chain_i = Poseidon(chain_{i-1}, batch_hash_i)
+
+def chain_step(chain_hash, batch_hash):
+    return ezkl.poseidon_hash([chain_hash, batch_hash])[0]
+
+# Chain head of a list of batch hashes (in TS order)
+def chain_digest(batch_hashes):
+    chain_hash = ZERO_FELT
+    for batch_hash in batch_hashes:
+        chain_hash = chain_step(chain_hash, batch_hash)
+    return chain_hash
+
+# Split an encoded data version in one tensor per batch (rows with the same TS, in append order)
+def split_batches(tensor_data, ts_values):
+    ts_values = np.asarray(ts_values)
+    boundaries = np.flatnonzero(ts_values[1:] != ts_values[:-1]) + 1
+    sizes = np.diff(np.concatenate([[0], boundaries, [len(ts_values)]])).tolist()
+    return list(torch.split(tensor_data, sizes)) if len(ts_values) else []
+
+# store_id: id of the column store the chain was built on (changes when the fact table is rewritten, see column_store)
+def load_hash_chain():
+    if not os.path.exists(HASH_CHAIN_PATH):
+        return {"store_id": None, "rows": 0, "batches": []}
+    with open(HASH_CHAIN_PATH, "r") as f:
+        return json.load(f)
+
+def save_hash_chain(chain):
+    tmp_path = f"{HASH_CHAIN_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(chain, f, indent=2)
+    os.replace(tmp_path, HASH_CHAIN_PATH)
+
+# Add the batches appended since the last update to the hash chain, hashing only the new rows
+# Return the chain head of the data version at timestamp (last batch with TS <= timestamp)
+def update_hash_chain(timestamp):
+    chain = load_hash_chain()
+    rows = table_rows(SALE_PR_C_STORE)
+    store_id = load_meta(SALE_PR_C_STORE).get("store_id")
+
+    if chain.get("store_id") != store_id or rows < chain["rows"]:
+        # The table was rewritten (or the chain was built on another table): rebuild the chain from the first row
+        if chain["batches"]:
+            print("Fact table rewritten since the last hashed batch: rebuilding the hash chain.")
+        chain = {"store_id": store_id, "rows": 0, "batches": []}
+    cube = OLAPCube.from_store(start_row=chain["rows"]) # only the rows appended after the last update
+
+    if chain["batches"] and len(cube.ts_values) and cube.ts_values[0] <= chain["batches"][-1]["TS"]:
+        # Rows appended with an older TS: rebuild the chain from the first row
+        print("Fact table changed before the last hashed batch: rebuilding the hash chain.")
+        chain = {"store_id": store_id, "rows": 0, "batches": []}
+        cube = OLAPCube.from_store()
+
+    if rows > chain["rows"]:
+        ts_values = cube.ts_values
+        chain_hash = chain["batches"][-1]["chain_hash"] if chain["batches"] else ZERO_FELT
+        check_felt_conversion(tensor_values(cube.to_tensor()))
+        batches = split_batches(cube.to_tensor(), ts_values)
+        first_rows = np.cumsum([0] + [len(b) for b in batches])[:len(batches)]
+        for ts, batch_tensor in zip(ts_values[first_rows], batches):
+            batch_hash = tensor_pos_hash(batch_tensor)[0]
+            chain_hash = chain_step(chain_hash, batch_hash)
+            chain["batches"].append({"TS": int(ts), "rows": len(batch_tensor), "batch_hash": batch_hash, "chain_hash": chain_hash})
+            print(f"Hash chain: batch TS {ts} ({len(batch_tensor)} rows) hashed")
+
+        chain["rows"] = rows
+        save_hash_chain(chain)
+
+    chain_hash = ZERO_FELT
+    for batch in chain["batches"]:
+        if batch["TS"] <= timestamp:
+            chain_hash = batch["chain_hash"]
+    return chain_hash
     
+## MERKLE TREE OVER ROW BLOCKS (COMMITMENT_MODE = "merkle")
+# leaf_i = Poseidon hash of block i (as hashed by ezkl for a circuit input), node = Poseidon(left, right)
+# The leaves are padded with ZERO_FELT up to a power of two
+
+# Split an encoded data version in blocks of block_rows rows with a validity column (1 = real row, 0 = padding)
+def merkle_blocks(tensor_data, block_rows=MERKLE_BLOCK_ROWS):
+    n_rows, n_cols = tensor_data.shape
+    n_blocks = max(1, -(-n_rows // block_rows))
+    padded = torch.zeros(n_blocks * block_rows, n_cols + 1, dtype=torch.float32)
+    padded[:n_rows, :n_cols] = tensor_data
+    padded[:n_rows, n_cols] = 1
+    return list(torch.split(padded, block_rows))
+
+# Return the tree levels, from the leaves (levels[0]) to the root (levels[-1][0])
+def build_merkle_tree(blocks):
+    level = [tensor_pos_hash(block)[0] for block in blocks]
+    size = 1
+    while size < len(level):
+        size *= 2
+    level = level + [ZERO_FELT] * (size - len(level))
+
+    levels = [level]
+    while len(level) > 1:
+        level = [chain_step(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+        levels.append(level)
+    return levels
+
+# Sibling hashes from leaf "index" to the root
+def merkle_path(levels, index):
+    path = []
+    for level in levels[:-1]:
+        path.append(level[index ^ 1])
+        index //= 2
+    return path
+
+# Recompute the root from a leaf and its path
+def merkle_root_from_path(leaf_hash, index, path):
+    node = leaf_hash
+    for sibling in path:
+        node = chain_step(node, sibling) if index % 2 == 0 else chain_step(sibling, node)
+        index //= 2
+    return node
+
+def merkle_tree_path(timestamp):
+    return os.path.join(MERKLE_DIR, f"{timestamp}.json")
+
+# Merkle tree of the data version at timestamp (built and saved the first time, built again if the fact table was rewritten)
+def get_merkle_tree(timestamp, tensor_data=None):
+    tree_path = merkle_tree_path(timestamp)
+    table_rows(SALE_PR_C_STORE) # imports the CSV export if it is newer
+    store_id = load_meta(SALE_PR_C_STORE).get("store_id")
+    if os.path.exists(tree_path):
+        with open(tree_path, "r") as f:
+            tree = json.load(f)
+        if tree["block_rows"] == MERKLE_BLOCK_ROWS and tree.get("store_id") == store_id:
+            return tree["levels"]
+
+    if tensor_data is None:
+        tensor_data = version_tensor(timestamp, padded=False)
+    check_felt_conversion(tensor_values(tensor_data))
+    levels = build_merkle_tree(merkle_blocks(tensor_data))
+
+    os.makedirs(MERKLE_DIR, exist_ok=True)
+    tmp_path = f"{tree_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"block_rows": MERKLE_BLOCK_ROWS, "store_id": store_id, "levels": levels}, f)
+    os.replace(tmp_path, tree_path)
+    print(f"Merkle tree (TS {timestamp}): {len(levels[0])} leaves, root {levels[-1][0]}")
+    return levels
+
+# Inclusion proof of the proven blocks: the witness hashes of the circuit inputs are the leaves
+def merkle_proof(timestamp, block_indexes, leaf_hashes, tensor_data=None):
+    levels = get_merkle_tree(timestamp, tensor_data)
+    return {
+        "leaf_hashes": leaf_hashes,
+        "leaf_indexes": block_indexes,
+        "paths": [merkle_path(levels, i) for i in block_indexes]
+    }
+
+# Root proven by a merkle_proof, None if the leaves do not belong to the same tree
+def verify_merkle_proof(proof):
+    roots = {merkle_root_from_path(leaf, index, path)
+             for leaf, index, path in zip(proof["leaf_hashes"], proof["leaf_indexes"], proof["paths"])}
+    return roots.pop() if len(roots) == 1 else None
+
 # Publish the hash on the blockchain
 async def publish_hash(timestamp):
     # Calculate the Poseidon hash of the dataset considering the rows before the timestamp
-    poseidon_hash = c_pos_hash(timestamp)
+    if COMMITMENT_MODE == "chain":
+        poseidon_hash = update_hash_chain(timestamp)
+    elif COMMITMENT_MODE == "merkle":
+        poseidon_hash = get_merkle_tree(timestamp)[-1][0]
+    else:
+        poseidon_hash = c_pos_hash(timestamp)
 
     # Fix: extract string if it's a list
     if isinstance(poseidon_hash, list):
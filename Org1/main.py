@@ -2,13 +2,13 @@ import asyncio
 import os
 import json
 import sys
-import pandas as pd
 
 from Org1.StarSchemeGenerator import main as generate_star_scheme
 from Org1.StarSchemeGenerator import sale_update as sale_update
 from Shared.Dim_ID_Converter import CSV_converter
 from Org1.hash_utils import publish_hash
 from Org1.StarSchemeGenerator import update_products
+from Org1.column_store import latest_ts, SALE_PR_C_STORE, store_exists
 
 
 output_dir = os.path.join('Org1', 'output')
@@ -31,15 +31,12 @@ if not data_fact_model_address:
 async def CLI_publish_hash():
     file_path = os.path.join('Org1', 'PR_DB', "Sale_PR_C.csv")
 
-    if not os.path.exists(file_path):
+    if not os.path.exists(file_path) and not store_exists(SALE_PR_C_STORE):
         print('\nSale_PR_C.csv not found in the Org1/PR_DB folder.')
         return
     
-    # Get the TS as the max value in the TS column
-    df = pd.read_csv(file_path)
-    if "TS" not in df.columns:
-        raise ValueError("Column 'TS' not found in the CSV file.")
-    timestamp = int(df["TS"].max())
+    # Get the TS of the latest data version (TS index of the column store)
+    timestamp = latest_ts(SALE_PR_C_STORE)
 
     # Ask the user to which organization to share the file with
     org_choice = input("Enter the organization number to share the file with (2 or 3): ")
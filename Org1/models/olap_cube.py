@@ -1,24 +1,224 @@
+import os
+import fcntl
 import torch
 from sklearn.preprocessing import LabelEncoder # to convert categorical string data into numeric labels
 import json
+import hashlib
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
 
 from Shared.Dim_ID_Converter import create_mappings_json
+from Org1.column_store import SALE_PR_C_STORE, load_meta, read_table, table_rows, column_array, column_meta, ts_row_count
+
+# Fixed-capacity mode: the fact tensor is padded with zero rows up to a power-of-two number of rows (bucket)
+# and a validity column (1 = real row, 0 = padding) is appended as last column.
+# Every data version in the same bucket has the same input shape, so one compiled circuit and proving key serve all of them.
+# c_pos_hash and op_execute_query both read this flag: change it only before publishing hashes, 
+# otherwise the published hashes will not match the hash computed inside the circuit
+PADDED_CAPACITY = False
+MIN_CAPACITY = 64 # smallest bucket (rows)
+
+# Return the smallest power-of-two bucket (>= min_capacity) that fits n_rows
+def bucket_capacity(n_rows, min_capacity=MIN_CAPACITY):
+    capacity = min_capacity
+    while capacity < n_rows:
+        capacity *= 2
+    return capacity
+
+# Fixed-capacity tensor: zero rows up to the bucket size and the validity column
+def pad_tensor(tensor):
+    n_rows, n_cols = tensor.shape
+    padded_tensor = torch.zeros(bucket_capacity(n_rows), n_cols + 1, dtype=torch.float32)
+    padded_tensor[:n_rows, :n_cols] = tensor
+    padded_tensor[:n_rows, n_cols] = 1 # validity column
+    return padded_tensor
+
+# Remove the padding rows and the validity column from a (padded) query result
+# Rows filtered out by Slice/Dicing have validity 0 as well, so they are dropped too
+def remove_padding(tensor):
+    return tensor[tensor[:, -1] != 0][:, :-1]
+
+# Category mappings (categorical value -> integer code) from Shared/DFM_Sale.json, cached in-process
+# and reloaded only when DFM_Sale.json changes (e.g. update_products). Shared/map.json is only written when the mappings change.
+DFM_PATH = os.path.join("Shared", "DFM_Sale.json")
+MAP_JSON_PATH = os.path.join("Shared", "map.json")
+MAPPINGS_CACHE = {}
+
+# Write Shared/map.json if its content differs from the mappings
+# (temporary file + rename: a concurrent reader never sees a half-written file)
+def save_map_json(category_mappings):
+    if os.path.exists(MAP_JSON_PATH):
+        with open(MAP_JSON_PATH, "r") as f:
+            if json.load(f) == category_mappings:
+                return
+    tmp_path = f"{MAP_JSON_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(category_mappings, f, indent=2)
+    os.replace(tmp_path, MAP_JSON_PATH)
+
+# Return the cached {"mappings": ..., "lookup": {column: (pd.Index of values, np.array of codes)}, "sha256": ...}
+def get_category_mappings():
+    mtime = os.path.getmtime(DFM_PATH)
+    if MAPPINGS_CACHE.get("mtime") != mtime:
+        category_mappings = create_mappings_json()
+        save_map_json(category_mappings)
+        MAPPINGS_CACHE.update(
+            mtime=mtime,
+            mappings=category_mappings,
+            lookup={col: (pd.Index(list(mapping.keys())), np.array(list(mapping.values())))
+                    for col, mapping in category_mappings.items()},
+            sha256=hashlib.sha256(json.dumps(category_mappings, sort_keys=True).encode()).hexdigest()
+        )
+    return MAPPINGS_CACHE
+
+# Encode a categorical column in bulk (values not in the mapping are kept as they are)
+def encode_column(values, lookup):
+    keys, codes = lookup
+    idx = keys.get_indexer(values.astype(str))
+    if (idx >= 0).all():
+        return codes[idx]
+    return np.where(idx >= 0, codes[idx], values.to_numpy(dtype=object))
+
+# Encoded fact table: the integer-coded Sale_PR_C table (all columns but TS) persisted as a float32 array
+# (rows x columns, row-major) next to the column store. It is encoded once, extended when rows are appended,
+# and memory-mapped by OLAPCube.from_store, so a query does not decode the table nor copy it into a new tensor.
+# Concurrent processes (e.g. batch_query workers) are serialized with a lock file: the updates hold it exclusively,
+# the readers shared while they read the meta and map the data. A rebuild is written to a temporary file and renamed,
+# an append only writes after the rows of the meta; the meta is always written last.
+ENCODED_DATA = 'encoded.f32'
+ENCODED_META = 'encoded.json'
+ENCODED_LOCK = 'encoded.lock'
+
+def load_encoded_meta(store_dir):
+    path = os.path.join(store_dir, ENCODED_META)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_encoded_meta(store_dir, encoded_meta):
+    tmp_path = os.path.join(store_dir, f"{ENCODED_META}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(encoded_meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(store_dir, ENCODED_META))
+
+@contextmanager
+def encoded_table_lock(store_dir, shared=False):
+    with open(os.path.join(store_dir, ENCODED_LOCK), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# True if the encoded table must be encoded again from the first row
+def encoded_table_stale(encoded_meta, store_meta, mappings, rows):
+    return (encoded_meta is None or encoded_meta["store_id"] != store_meta.get("store_id") or encoded_meta["mappings"] != mappings
+            or encoded_meta["rows"] > rows)
+
+# Bring the encoded table up to date with the column store and return its meta
+# Only the rows appended since the last call are encoded; everything is re-encoded if the store was rewritten
+# or the category mappings changed
+def sync_encoded_table(store_dir=SALE_PR_C_STORE):
+    rows = table_rows(store_dir) # also imports the CSV export if it is newer
+    store_meta = load_meta(store_dir)
+    mappings = get_category_mappings()["sha256"]
+    encoded_meta = load_encoded_meta(store_dir)
+    if not encoded_table_stale(encoded_meta, store_meta, mappings, rows) and encoded_meta["rows"] == rows:
+        return encoded_meta
+
+    with encoded_table_lock(store_dir):
+        encoded_meta = load_encoded_meta(store_dir) # another process may have updated it while we waited for the lock
+        rebuild = encoded_table_stale(encoded_meta, store_meta, mappings, rows)
+        if rebuild:
+            encoded_meta = {"store_id": store_meta.get("store_id"), "mappings": mappings, "rows": 0, "nan_rows": False}
+        if encoded_meta["rows"] == rows:
+            return encoded_meta
+
+        df = read_table(store_dir, start_row=encoded_meta["rows"])
+        df = df.drop(columns=["TS"])
+        df.columns = df.columns.str.strip()
+        encoded = OLAPCube(df).to_tensor().numpy()
+
+        data_path = os.path.join(store_dir, ENCODED_DATA)
+        if rebuild:
+            tmp_path = f"{data_path}.{os.getpid()}.tmp"
+            encoded.tofile(tmp_path)
+            os.replace(tmp_path, data_path)
+        else:
+            with open(data_path, "r+b") as f: # drop rows of an interrupted update
+                f.truncate(encoded_meta["rows"] * len(df.columns) * 4)
+            with open(data_path, "ab") as f:
+                encoded.tofile(f)
+
+        encoded_meta["columns"] = list(df.columns)
+        encoded_meta["nan_rows"] = encoded_meta["nan_rows"] or bool(np.isnan(encoded).any())
+        encoded_meta["rows"] = rows
+        save_encoded_meta(store_dir, encoded_meta)
+    print(f"Encoded fact table updated ({len(df)} new rows)")
+    return encoded_meta
 
 class OLAPCube:
     def __init__(self, df): # The constructor receives as input a >..
         self.df = df                                #  ..< pandas DataFrame (df) 
-        self.category_mappings = create_mappings_json()
-        # Save the mapping to Shared/map.json
-        with open("Shared/map.json", "w") as f:
-            json.dump(self.category_mappings, f, indent=2)
+        self.tensor = None # set by from_store
+        category_mappings = get_category_mappings() # also keeps Shared/map.json up to date
+        self.category_mappings = category_mappings["mappings"]
         # Map categorical columns to integer codes
-        for col, mapping in self.category_mappings.items():
+        for col, lookup in category_mappings["lookup"].items():
             if col in self.df.columns:
-                self.df[col] = self.df[col].map(lambda x: mapping.get(str(x), x))
+                self.df[col] = encode_column(self.df[col], lookup)
 
     # This method is used to convert the values of the DataFrame to a torch tensor of type float32
-    def to_tensor(self):    
-        return torch.tensor(self.df.values, dtype=torch.float32)
+    # padded=True returns the fixed-capacity tensor (zero rows up to the bucket size + validity column)
+    def to_tensor(self, padded=False):    
+        if self.tensor is not None:
+            tensor = self.tensor
+        else:
+            tensor = torch.tensor(self.df.values, dtype=torch.float32)
+        return pad_tensor(tensor) if padded else tensor
+
+    # Cube over the encoded fact table: rows with TS <= max_ts (all if None), starting from start_row
+    # The tensor is a zero-copy view of the memory-mapped file (copy-on-write, the file is never modified)
+    # The TS of every row is kept in ts_values (numpy array)
+    @classmethod
+    def from_store(cls, max_ts=None, start_row=0, store_dir=SALE_PR_C_STORE):
+        sync_encoded_table(store_dir)
+        with encoded_table_lock(store_dir, shared=True): # meta and data of the same version
+            encoded_meta = load_encoded_meta(store_dir)
+            rows, n_cols = encoded_meta["rows"], len(encoded_meta.get("columns", []))
+            if rows:
+                encoded_data = np.memmap(os.path.join(store_dir, ENCODED_DATA), dtype=np.float32, mode='c', shape=(rows, n_cols))
+        store_meta = load_meta(store_dir)
+        ts = column_array(store_dir, column_meta(store_meta, "TS"), rows)
+
+        end_row = rows
+        if max_ts is not None:
+            count = ts_row_count(store_dir, store_meta, max_ts)
+            end_row = count if count is not None else rows
+        start_row = min(start_row, end_row)
+
+        data = encoded_data if rows else np.zeros((0, n_cols), dtype=np.float32)
+        data, ts_values = data[start_row:end_row], ts[start_row:end_row]
+
+        # Row filters (copies): TS not appended in order, rows with missing values (dropna)
+        keep = None
+        if max_ts is not None and count is None:
+            keep = ts_values <= max_ts
+        if encoded_meta["nan_rows"]:
+            not_nan = ~np.isnan(data).any(axis=1)
+            keep = not_nan if keep is None else keep & not_nan
+        if keep is not None:
+            data, ts_values = data[keep], ts_values[keep]
+
+        cube = cls.__new__(cls)
+        cube.df = None
+        cube.category_mappings = get_category_mappings()["mappings"]
+        cube.tensor = torch.from_numpy(data)
+        cube.ts_values = np.asarray(ts_values)
+        cube.columns = encoded_meta.get("columns", [])
+        return cube
 
     # This method applies a specified operation (model) to the tensor data
     def execute_model(self, model, tensor_data):
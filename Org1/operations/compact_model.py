@@ -0,0 +1,31 @@
+# Compaction: move the selected rows (not all zeros) to the top of a tensor with a fixed number of rows
+# Dicing and Slice make zero the rows that do not match (the tensor keeps the shape of the fact table),
+# so the output of the circuit would have one row per fact. CompactModel returns only max_rows rows:
+# the k-th output row is the k-th selected input row, the rows after the last selected one are zero.
+# In this way the public output of the proof and the witness are bounded by max_rows instead of the table size.
+# max_rows is part of the circuit: it must be >= the number of selected rows (the rows after max_rows are dropped)
+import torch
+from ..models.olap_operations import OLAPOperation
+
+class CompactModel(OLAPOperation):
+    def __init__(self, max_rows):
+        super(CompactModel, self).__init__()
+        self.max_rows = max_rows
+
+    def forward(self, x):
+        selected = x.abs().sum(dim=1) > 0
+        # position of every selected row in the output (1, 2, 3, ...)
+        position = torch.cumsum(selected.to(x.dtype), dim=0)
+        slots = torch.arange(1, self.max_rows + 1, dtype=x.dtype)
+        # one_hot[k, i] = True if the input row i goes to the output row k
+        # (the "& selected" is needed also for ezkl: a comparison used directly as a mask gets the wrong scale in the circuit)
+        one_hot = (position.unsqueeze(0) == slots.unsqueeze(1)) & selected.unsqueeze(0)
+        return (x.unsqueeze(0) * one_hot.unsqueeze(2)).sum(dim=1)
+
+# Rows of the compacted output for a number of selected rows: next power of two (at least min_rows, at most the input rows)
+# so that queries with a similar number of selected rows share the same circuit
+def compact_rows(selected_rows, input_rows, min_rows=16):
+    rows = min_rows
+    while rows < selected_rows:
+        rows *= 2
+    return min(rows, input_rows)
@@ -3,25 +3,21 @@
 # Example conditions: {2: [0, 2]} means select rows where column index 2 has value 0 or 2
 # {2: 3, 4: [0, 2]} allowed
 # {2:0, 2:2} not allowed
+# The mask is computed with one set-membership check per column (see membership.py)
 from ..models.olap_operations import OLAPOperation
-import torch
-from torch import nn
+from .membership import membership_mask
 
 class DicingModel(OLAPOperation):
-    def __init__(self, conditions):
+    # domains: values of the columns, to skip or complement the large sets; only valid if the data has no value
+    # outside them (the query planner gives column_domains(tensor_data)). None: every set is checked as it is
+    def __init__(self, conditions, domains=None):
         super(DicingModel, self).__init__()
         self.conditions = conditions # ex. conditions = {2: [0, 2], 4: 3}
+        self.domains = domains
 
     def forward(self, x):
-        mask = torch.ones(x.size(0), dtype=torch.bool)
-        for column, value in self.conditions.items():
-            # check if the value is a list (for multiple values in the same column)
-            if isinstance(value, list): 
-                temp_mask = torch.zeros(x.size(0), dtype=torch.bool)
-                for val in value:
-                    temp_mask = temp_mask | (x[:, column] == val) # | is OR operation
-                mask = mask & temp_mask
-            else:
-                mask = mask & (x[:, column] == value)
+        mask = membership_mask(x, self.conditions, self.domains)
+        if mask is None: # every row matches
+            return x
         return x * mask.unsqueeze(1)
     
\ No newline at end of file
@@ -0,0 +1,97 @@
+# Group-by: sum the measures of the rows with the same values of the kept dimensions, inside the model
+# RollUpModel only removes the columns of the rolled-up dimensions: the output still has one row per fact and the sums
+# are computed after the proof (OrgB group_rows). GroupByModel returns one row per group instead, so the proven output
+# is the aggregated cube. The groups are all the combinations of the values of the kept dimensions (known from
+# DFM_Sale.json, restricted by the Dicing conditions): every output row has the values of its group and the sums of
+# its rows, the empty groups are all zeros.
+# The rows are assigned to the groups with a (rows x groups) one-hot matrix, so the circuit grows with rows x groups.
+import json
+import itertools
+import torch
+from ..models.olap_operations import OLAPOperation
+from .membership import DFM_PATH, dimension_values
+
+class GroupByModel(OLAPOperation):
+    # groups: one list per group with the value of every column (0 for the measure and extra columns)
+    # dimension_columns: columns with the values of the group
+    # key_columns: dimension columns compared to find the group of a row (the other dimensions of the group depend on them)
+    # measure_columns: columns summed per group
+    # extra columns (e.g. the validity column of a padded tensor) are 1 for the non-empty groups
+    def __init__(self, groups, dimension_columns, key_columns, measure_columns):
+        super(GroupByModel, self).__init__()
+        self.groups = groups
+        self.dimension_columns = dimension_columns
+        self.key_columns = key_columns
+        self.measure_columns = measure_columns
+
+    def forward(self, x):
+        group_values = torch.tensor(self.groups, dtype=x.dtype) # groups x columns
+        member = torch.ones(x.size(0), len(self.groups), dtype=torch.bool)
+        for column in self.key_columns:
+            member = member & (x[:, column].unsqueeze(1) == group_values[:, column].unsqueeze(0)) # rows x groups
+        non_empty = torch.clamp(member.to(x.dtype).sum(dim=0), max=1).unsqueeze(1)
+        sums = (x[:, self.measure_columns].unsqueeze(1) * member.unsqueeze(2)).sum(dim=0) # groups x measures
+
+        columns = []
+        for column in range(x.size(1)):
+            if column in self.measure_columns:
+                columns.append(sums[:, self.measure_columns.index(column)].unsqueeze(1))
+            elif column in self.dimension_columns:
+                columns.append(group_values[:, column].unsqueeze(1) * non_empty)
+            else:
+                columns.append(non_empty)
+        return torch.cat(columns, dim=1)
+
+# Category of every product code (from Category_range)
+def product_categories(dfm):
+    categories = {}
+    for category, (first, last) in dfm["Category_range"].items():
+        for product in range(first, last + 1):
+            categories[product] = dfm["Category"][category]
+    return categories
+
+# Build the GroupByModel of a Rollup, applied to the output of RollUpModel(columns_to_remove_idx)
+# dicing: list of Dicing conditions of the query ({column index: value or [values]}), used to drop the groups that are always empty
+# num_columns: columns of the RollUpModel output (more than the kept dimensions and measures if the tensor is padded)
+# domains: dimension columns whose values are all in DFM_Sale.json (see column_domains): the rows with a value outside
+# the groups would be lost, so None is returned if a kept dimension is not in domains
+def rollup_group_by(columns_to_remove_idx, dicing, num_columns, domains=None):
+    with open(DFM_PATH, "r") as f:
+        dfm = json.load(f)
+    col_indexes = dfm["col_indexes"]
+    kept = [name for name, idx in sorted(col_indexes.items(), key=lambda item: item[1]) if idx not in columns_to_remove_idx]
+
+    values = {}
+    for name in kept:
+        if name in dfm["attributes"]:
+            continue
+        if domains is not None and col_indexes[name] not in domains:
+            return None
+        allowed = dimension_values(dfm, name)
+        for conditions in dicing:
+            for column, value in conditions.items():
+                if int(column) == col_indexes[name]:
+                    value = value if isinstance(value, list) else [value]
+                    allowed = [v for v in allowed if v in value]
+        values[name] = allowed
+
+    # The product determines the category: the category is not part of the key if the product is kept
+    derived = ["Category"] if "Product Name" in values and "Category" in values else []
+    key_names = [name for name in values if name not in derived]
+    categories = product_categories(dfm)
+
+    groups = []
+    for key in itertools.product(*[values[name] for name in key_names]):
+        group_dims = dict(zip(key_names, key))
+        if derived:
+            group_dims["Category"] = categories[group_dims["Product Name"]]
+            if group_dims["Category"] not in values["Category"]:
+                continue
+        groups.append([group_dims.get(name, 0) for name in kept] + [0] * (num_columns - len(kept)))
+    if not groups:
+        return None
+
+    dimension_columns = [kept.index(name) for name in values]
+    key_columns = [kept.index(name) for name in key_names]
+    measure_columns = [kept.index(name) for name in kept if name in dfm["attributes"]]
+    return GroupByModel(groups, dimension_columns, key_columns, measure_columns)
@@ -0,0 +1,82 @@
+# Membership mask of the Slice and Dicing operations: a row is kept if the value of every filtered column is in its set
+# Every column is checked with one comparison against its whole set (see is_in) and the columns are combined with
+# logical operations (Not, And); the mask is converted to a number once, when it is applied.
+# When the values of a column are known to be in the domain of its dimension (DFM_Sale.json, checked on the data
+# by column_domains(tensor_data)):
+# - a set that contains all the values of the dimension is not checked at all
+# - a set with more than half of the values is checked on its complement (value not in the excluded values)
+# in this way a column costs at most half of its cardinality comparisons per row.
+# Columns without a checked domain (e.g. a Year after END_DATE in the data) are always checked on their set.
+import os
+import json
+import torch
+
+DFM_PATH = os.path.join("Shared", "DFM_Sale.json")
+
+# Values of a dimension (codes of the categorical dimensions, years between START_DATE and END_DATE)
+def dimension_values(dfm, dimension):
+    if dimension == "Year":
+        return list(range(int(dfm["START_DATE"][:4]), int(dfm["END_DATE"][:4]) + 1))
+    if dimension == "Month":
+        return list(range(1, 13))
+    if dimension == "Day":
+        return list(range(1, 32))
+    return sorted(dfm[dimension].values())
+
+# Values of every dimension column: {column index: [values]}
+# tensor_data: only the columns whose values in the tensor are all in the domain are returned
+# (the all-zero rows are not checked: padding rows, they stay zero whatever the mask)
+def column_domains(tensor_data=None):
+    with open(DFM_PATH, "r") as f:
+        dfm = json.load(f)
+    domains = {idx: dimension_values(dfm, name) for name, idx in dfm["dim_indexes"].items()}
+    if tensor_data is None:
+        return domains
+    rows = tensor_data[(tensor_data != 0).any(dim=1)]
+    return {idx: values for idx, values in domains.items()
+            if idx < rows.size(1) and bool(torch.isin(rows[:, idx], torch.tensor(values, dtype=rows.dtype)).all())}
+
+# Merge the conditions of several Slice/Dicing operations into one (the sets of the same column are intersected),
+# so composed filters share a single mask
+def merge_conditions(conditions_list):
+    merged = {}
+    for conditions in conditions_list:
+        for column, values in conditions.items():
+            values = values if isinstance(values, list) else [values]
+            column = int(column)
+            merged[column] = [v for v in merged[column] if v in values] if column in merged else list(values)
+    return merged
+
+# Boolean mask of the rows whose value is in "values": one broadcast Equal (rows x values), counted per row
+# The comparison is converted to a number before the reduction and compared again: a boolean reduction (any) or a
+# comparison used as a number directly gets the wrong scale in the ezkl circuit.
+# A chain of one Equal per value joined by Or has the same circuit rows but more ONNX nodes (43 against 34 on a
+# 3-column Dicing of 200 rows), so the broadcast form is kept.
+def is_in(column_values, values):
+    matches = column_values.unsqueeze(1) == torch.tensor(values, dtype=column_values.dtype).unsqueeze(0)
+    return matches.to(column_values.dtype).sum(dim=1) > 0
+
+# conditions: {column index: value or [values]}
+# domains: values of the columns checked on the data (see column_domains), None to check every set as it is
+# Return None if no column has to be checked (every set contains all the values of its dimension)
+def membership_mask(x, conditions, domains=None):
+    domains = domains or {}
+    checked = False
+    mask = torch.ones(x.size(0), dtype=torch.bool)
+    for column, values in conditions.items():
+        values = values if isinstance(values, list) else [values]
+        column = int(column)
+        if column in domains:
+            values = [v for v in domains[column] if v in values]
+            excluded = [v for v in domains[column] if v not in values]
+            if not excluded:
+                continue
+            if not values:
+                return torch.zeros(x.size(0), dtype=torch.bool)
+            checked = True
+            if len(excluded) < len(values):
+                mask = mask & ~is_in(x[:, column], excluded)
+                continue
+        checked = True
+        mask = mask & is_in(x[:, column], values)
+    return mask if checked else None
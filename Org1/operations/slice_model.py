@@ -2,21 +2,22 @@
 # Example: SlicingModel({14: 1,   21: 12,   27: 0})
 # -> filter to have only the rows where column 14 is ==1, column 21 is ==12 and column 27 is ==0
 
-import torch
 from ..models.olap_operations import OLAPOperation
-from torch import nn
+from .membership import membership_mask
 
 class SliceModel(OLAPOperation):
-    def __init__(self, filter_conditions):
+    # domains: see DicingModel
+    def __init__(self, filter_conditions, domains=None):
         super(SliceModel, self).__init__()
         self.filter_conditions = filter_conditions
+        self.domains = domains
 
     def forward(self, x):
-        # create a mask of ones with the same size as the rows of x (x.size(0))
-        mask = torch.ones(x.size(0), dtype=torch.bool)
-        for column, value in self.filter_conditions.items():
-            mask = mask & (x[:, column] == value) # x[:, column] -> select all rows of the "column"
-            # mask = tensor[T, F, T, ...] 
+        # mask of the rows where every column has its value (same membership mask of DicingModel, with one value per column)
+        mask = membership_mask(x, self.filter_conditions, self.domains)
+        if mask is None:
+            return x
+        # mask = tensor[T, F, T, ...] 
         return x * mask.unsqueeze(1) 
         # mask.unsqueeze(1) = tensor([[T],    in this way doing *x we make zero all the rows that do not match the conditions
         #                             [F],
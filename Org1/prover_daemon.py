@@ -0,0 +1,144 @@
+# Long-running prover service for Org1
+# It keeps ezkl/torch loaded, the SRS files and the recently used proving keys memory-resident (WarmPool),
+# and executes the proof jobs sent by OrgB on a local socket, so the key loading cost is paid once and not per query.
+# The jobs run in one long-lived worker process (which holds the warm pool), one at a time since they share
+# Org1/output and Shared/proof: the event loop of the daemon only handles the connections, so it keeps answering
+# the health checks while a proof runs (otherwise OrgB would prove in-process on the same files).
+#
+# Start it with:  python3 -m Org1.prover_daemon
+# Protocol: one JSON object per line over TCP on 127.0.0.1:PROVER_PORT
+#   request  {"operations": {...}, "columns_to_remove_idx": [...], "timestamp": 123}
+#   response {"status": "ok", "result": [[...]], "shape": [rows, cols], "poseidon_hash": [...], "proof_path": ..., "vk_path": ..., "settings_path": ...}
+#         or {"status": "error", "error": "..."}
+#   health check: request {"ping": true}, response {"status": "ok", "pong": true}
+#   a connection closed without a request (empty line) is closed silently
+import asyncio
+import json
+import os
+import socket
+import multiprocessing
+import torch
+from concurrent.futures import ProcessPoolExecutor
+
+from Org1.execute_query import op_execute_query
+from Org1.ezkl_workflow.generate_proof import PROOF_DIR
+from Org1.ezkl_workflow.warm_pool import WarmPool, WARM_DIR
+
+PROVER_HOST = "127.0.0.1"
+PROVER_PORT = 8765
+
+# JSON object keys are strings: convert the Dicing column indexes back to int
+def decode_job(job):
+    operations = dict(job["operations"])
+    if "Dicing" in operations:
+        operations["Dicing"] = [{int(col): values for col, values in dicing.items()} for dicing in operations["Dicing"]]
+    return operations, job["columns_to_remove_idx"], int(job["timestamp"])
+
+# Warm pool of the worker process
+worker_pool = None
+
+def init_worker(warm_dir):
+    global worker_pool
+    worker_pool = WarmPool(warm_dir)
+
+# Worker: execute and prove one query, return (final_tensor, poseidon_hash)
+def run_proof_job(operations, columns_to_remove_idx, timestamp):
+    return asyncio.run(op_execute_query(operations, columns_to_remove_idx, timestamp, warm_pool=worker_pool))
+
+def clear_worker_pool():
+    worker_pool.clear()
+
+class ProverDaemon:
+    # job: function executed in the worker for every request (run_proof_job)
+    # warm_dir: folder of the warm pool of the worker (see warm_pool.py)
+    def __init__(self, host=PROVER_HOST, port=PROVER_PORT, job=run_proof_job, warm_dir=WARM_DIR):
+        self.host = host
+        self.port = port
+        self.job = job
+        # One worker: jobs share Org1/output and Shared/proof, so they are proven one at a time
+        # "spawn": ezkl starts native threads, forking a process that uses them is not safe
+        self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker, initargs=(warm_dir,))
+
+    async def handle_client(self, reader, writer):
+        line = await reader.readline()
+        if not line.strip(): # disconnected without a request
+            writer.close()
+            await writer.wait_closed()
+            return
+        try:
+            job = json.loads(line)
+            if job.get("ping"):
+                await self.send_response(writer, {"status": "ok", "pong": True})
+                return
+            operations, columns_to_remove_idx, timestamp = decode_job(job)
+            final_tensor, poseidon_hash = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.job, operations, columns_to_remove_idx, timestamp)
+            response = {
+                "status": "ok",
+                "result": final_tensor.detach().numpy().tolist(),
+                "shape": list(final_tensor.shape),
+                "poseidon_hash": poseidon_hash,
+                "proof_path": os.path.join(PROOF_DIR, 'test.pf'),
+                "vk_path": os.path.join(PROOF_DIR, 'test.vk'),
+                "settings_path": os.path.join(PROOF_DIR, 'settings.json')
+            }
+        except Exception as e:
+            print(f"Proof job failed: {e}")
+            response = {"status": "error", "error": str(e)}
+
+        await self.send_response(writer, response)
+
+    async def send_response(self, writer, response):
+        try:
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            print("Prover daemon: client disconnected before the response")
+
+    async def serve(self):
+        # 2**31 bytes line limit: a query result can be large
+        server = await asyncio.start_server(self.handle_client, self.host, self.port, limit=2 ** 31 - 1)
+        print(f"Prover daemon listening on {self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.submit(clear_worker_pool).result()
+            self.executor.shutdown()
+
+# Client side (used by OrgB)
+
+# True if a prover daemon is listening (and answers a ping)
+def is_daemon_running(host=PROVER_HOST, port=PROVER_PORT):
+    try:
+        with socket.create_connection((host, port), timeout=1) as sock:
+            sock.sendall((json.dumps({"ping": True}) + "\n").encode())
+            with sock.makefile("r") as f:
+                return json.loads(f.readline()).get("pong", False)
+    except (OSError, ValueError):
+        return False
+
+# Send a proof job to the daemon, return (final_tensor, poseidon_hash) like op_execute_query
+async def request_proof(operations, columns_to_remove_idx, timestamp, host=PROVER_HOST, port=PROVER_PORT):
+    reader, writer = await asyncio.open_connection(host, port, limit=2 ** 31 - 1)
+    job = {"operations": operations, "columns_to_remove_idx": columns_to_remove_idx, "timestamp": timestamp}
+    writer.write((json.dumps(job) + "\n").encode())
+    await writer.drain()
+
+    response = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+
+    if response["status"] != "ok":
+        raise RuntimeError(f"Prover daemon error: {response['error']}")
+    print(f"Proof generated by the prover daemon: {response['proof_path']}")
+    final_tensor = torch.tensor(response["result"], dtype=torch.float32).reshape(response["shape"])
+    return final_tensor, response["poseidon_hash"]
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(ProverDaemon().serve())
+    except KeyboardInterrupt:
+        print("Prover daemon stopped.")
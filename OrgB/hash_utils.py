@@ -5,6 +5,9 @@ import os
 import pandas as pd
 import torch
 
+from Org1.hash_utils import COMMITMENT_MODE, chain_digest, verify_merkle_proof
+from Shared.instrumentation import stage
+
 logging.basicConfig(level=logging.INFO)
 
 # Load contract addresses from configuration file
@@ -92,31 +95,41 @@ def verify_query_allowed(query_dimensions, contract_address):
 
 # Verify the computed poseidon_hash with the one stored on the blockchain
 def compare_hash(timestamp, poseidon_hash):
-    web3 = setup_web3()
-    contract = get_contract(web3, CONTRACT_ADDRESS, CONTRACT_ABI_GET_HASH)
-
-    stored_hash = contract.functions.getHash(timestamp).call()
-
-    # If poseidon_hash is a list, get the first element
-    if isinstance(poseidon_hash, list):
-        poseidon_hash = poseidon_hash[0]
-    if not poseidon_hash.startswith("0x"):
-        poseidon_hash = "0x" + poseidon_hash
+    with stage("hash_compare", timestamp=timestamp):
+        web3 = setup_web3()
+        contract = get_contract(web3, CONTRACT_ADDRESS, CONTRACT_ABI_GET_HASH)
+
+        stored_hash = contract.functions.getHash(timestamp).call()
+
+        # Hash chain mode: the circuit exposes one hash per batch, fold them into the chain head
+        if COMMITMENT_MODE == "chain":
+            poseidon_hash = chain_digest(poseidon_hash)
+        # Merkle mode: the circuit exposes the hashes of the proven blocks, check their inclusion paths and compare the root
+        elif COMMITMENT_MODE == "merkle":
+            poseidon_hash = verify_merkle_proof(poseidon_hash)
+            if poseidon_hash is None:
+                print("Hash verification failed: The proven blocks do not belong to the same Merkle tree.")
+                return
+        # If poseidon_hash is a list, get the first element
+        if isinstance(poseidon_hash, list):
+            poseidon_hash = poseidon_hash[0]
+        if not poseidon_hash.startswith("0x"):
+            poseidon_hash = "0x" + poseidon_hash
     
     
-    if poseidon_hash.startswith("0x"):
-        poseidon_hash_bytes = bytes.fromhex(poseidon_hash[2:])
-    else:
-        poseidon_hash_bytes = bytes.fromhex(poseidon_hash)
+        if poseidon_hash.startswith("0x"):
+            poseidon_hash_bytes = bytes.fromhex(poseidon_hash[2:])
+        else:
+            poseidon_hash_bytes = bytes.fromhex(poseidon_hash)
 
-    if stored_hash == poseidon_hash_bytes:
-        print("Hash verification successful: The computed hash matches the stored hash on the blockchain.")
-        print(f"Computed hash: {poseidon_hash}")
+        if stored_hash == poseidon_hash_bytes:
+            print("Hash verification successful: The computed hash matches the stored hash on the blockchain.")
+            print(f"Computed hash: {poseidon_hash}")
 
-    else:
-        print("Hash verification failed: The computed hash does not match the stored hash on the blockchain.")
-        print(f"Computed hash: {poseidon_hash}")
-        print(f"Stored hash: {stored_hash.hex()}")
+        else:
+            print("Hash verification failed: The computed hash does not match the stored hash on the blockchain.")
+            print(f"Computed hash: {poseidon_hash}")
+            print(f"Stored hash: {stored_hash.hex()}")
 
 def get_query_dimensions(operations):
     columns_to_rollup_idx = []
@@ -170,7 +183,8 @@ def get_idx_rollup(hierarchy_to_rollup, dimensions_to_rollup):
     return indices_to_remove
 
 # Print and save the result of the query (final tensor after OLAP operations) in human-readable format in the proper folder (Org2 or Org3)
-def show_result(final_tensor, columns_to_remove_idx, org_n):
+# result_name overrides the output file name (used by batched queries, one file per query)
+def show_result(final_tensor, columns_to_remove_idx, org_n, result_name=None):
     # Remove from final_tensor rows that are all zeros
     non_zero_rows = ~torch.all(final_tensor == 0, dim=1)
     final_tensor = final_tensor[non_zero_rows] # after filtering
@@ -238,6 +252,9 @@ def show_result(final_tensor, columns_to_remove_idx, org_n):
     if selected_file.endswith("Sale_PR_C.csv"):
         selected_file = selected_file.replace("Sale_PR_C.csv", "Sale_PUB.csv")
 
+    if result_name:
+        selected_file = result_name
+
     output_path = os.path.join(output_dir, selected_file)
 
     final_decoded_cube.to_csv(output_path, index=False)
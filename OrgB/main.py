@@ -9,10 +9,17 @@ import logging
 
 from OrgB.hash_utils import verify_query_allowed
 from Org1.execute_query import op_execute_query
+from Org1.prover_daemon import is_daemon_running, request_proof
+from Org1.batch_query import execute_query_batch, batch_proof_dirs, DEFAULT_MAX_WORKERS
+from Org1.ezkl_workflow.generate_proof import PROOF_DIR
 from OrgB.hash_utils import compare_hash
 from OrgB.hash_utils import get_query_dimensions
 from OrgB.hash_utils import show_result
 from OrgB.select_operations import select_operations
+from Shared.instrumentation import stage, file_size, set_metrics_dir
+
+# Metrics of OrgB (when enabled with CBI_ZKP_METRICS) are kept apart from Org1's
+set_metrics_dir(os.path.join('OrgB', 'output', 'metrics'))
 
 # Load contract addresses from configuration file
 CONFIG_PATH = os.path.join('Blockchain', 'contract_addresses.json')
@@ -65,21 +72,28 @@ if not data_fact_model_address:
     sys.exit(1)
 
 async def CLI_query(org_n):
+    selected_ts = select_timestamp(org_n)
+    if selected_ts is None:
+        return
+
+    await op_query(org_n, int(selected_ts))
 
+# Ask the user which published data version (TS) to query, return None if there is none or the choice is invalid
+def select_timestamp(org_n):
     if org_n == 2:
         published_hash_path = os.path.join('OrgB', 'Org2', 'published_hash_2.json')
     elif org_n == 3:   
         published_hash_path = os.path.join('OrgB', 'Org3', 'published_hash_3.json')
     else:
         print("\nInvalid organization number for publishing hash.")
-        return
+        return None
 
     with open(published_hash_path, 'r') as f:
         published_hashes = json.load(f)
     
     if not published_hashes:
         print(f"\nNo published hashes found in {published_hash_path}. Please ensure that Org1 has published a hash.")
-        return
+        return None
     
     print("\nAvailable timestamps (TS) for published hashes:")
     ts_list = list(published_hashes.keys())
@@ -91,9 +105,27 @@ async def CLI_query(org_n):
         selected_ts = ts_list[selected_idx - 1]
     except (ValueError, IndexError):
         print("Invalid index selected.")
+        return None
+
+    return selected_ts
+
+async def CLI_query_batch(org_n):
+    selected_ts = select_timestamp(org_n)
+    if selected_ts is None:
         return
 
-    await op_query(org_n, int(selected_ts))
+    # Select the OLAP operations of each query of the batch
+    operations_list = []
+    while True:
+        print(f"\nQuery {len(operations_list) + 1} of the batch:")
+        operations_list.append(select_operations())
+        if input("\nAdd another query to the batch? (y/n): ").strip().lower() != "y":
+            break
+
+    workers_input = input(f"Number of parallel provers (default {DEFAULT_MAX_WORKERS}): ").strip()
+    max_workers = int(workers_input) if workers_input.isdigit() and int(workers_input) > 0 else DEFAULT_MAX_WORKERS
+
+    await op_query_batch(org_n, int(selected_ts), operations_list, max_workers)
 
 
 # This function:
@@ -131,7 +163,11 @@ async def op_query(org_n, timestamp):
 
 
     try:
-        final_tensor, poseidon_hash = await op_execute_query(operations, columns_to_remove_idx, timestamp) # MAIN ORG1.py
+        # Use the prover daemon (python3 -m Org1.prover_daemon) if it is running, it keeps the keys in memory
+        if is_daemon_running():
+            final_tensor, poseidon_hash = await request_proof(operations, columns_to_remove_idx, timestamp) # PROVER_DAEMON.py
+        else:
+            final_tensor, poseidon_hash = await op_execute_query(operations, columns_to_remove_idx, timestamp) # MAIN ORG1.py
     except Exception as e:
         print(f"Failed to execute query: {e}")
         return   
@@ -143,12 +179,58 @@ async def op_query(org_n, timestamp):
     show_result(final_tensor, columns_to_remove_idx, org_n) # MAIN.py
 
 
-# Verify the zk proof with ezkl using the proof, vk and settings files stored in Shared/proof
-def op_verify_proof():
-    proof_folder = 'Shared/proof'
+# Same as op_query for a list of queries (operations dicts from select_operations)
+# The queries are proven in parallel on a process pool and each result is checked and saved as soon as its proof completes
+# Results are saved as Sale_PUB_<n>.csv, proofs are in Shared/proof/query_<n-1> (see Verify Proof)
+async def op_query_batch(org_n, timestamp, operations_list, max_workers=DEFAULT_MAX_WORKERS):
+    queries = []
+    for operations in operations_list:
+        query_dimensions, columns_to_remove_idx = get_query_dimensions(operations)
+        # Verify if the query is allowed by calling the smart contract in the blockchain
+        if not verify_query_allowed(query_dimensions, data_fact_model_address):
+            print(f"Query {operations} contains disallowed dimensions: skipped.")
+            continue
+        queries.append((operations, columns_to_remove_idx))
+
+    if not queries:
+        print("No query to execute.")
+        return
+    print(f"Proving {len(queries)} queries with {max_workers} parallel provers...\n")
+
+    for job_idx, final_tensor, poseidon_hash, proof_dir, error in execute_query_batch(queries, timestamp, max_workers):
+        if error:
+            print(f"Failed to execute query {job_idx + 1}: {error}")
+            continue
+        print(f"\nQuery {job_idx + 1} proven (proof files in {proof_dir})")
+        compare_hash(timestamp, poseidon_hash)
+        show_result(final_tensor, queries[job_idx][1], org_n, result_name=f"Sale_PUB_{job_idx + 1}.csv")
+
+
+# Ask which proof to verify: the last single query (Shared/proof) or a query of the last batch (Shared/proof/query_<n>)
+def select_proof_folder():
+    batch_folders = batch_proof_dirs()
+    if not batch_folders:
+        return PROOF_DIR
+
+    print("\nAvailable proofs:")
+    print(f"[0] Last query ({PROOF_DIR})")
+    for idx, folder in enumerate(batch_folders, start=1):
+        print(f"[{idx}] Query {idx} of the last batch ({folder})")
+    try:
+        selected_idx = int(input("\nEnter the index of the proof you want to verify: ").strip())
+        if not 0 <= selected_idx <= len(batch_folders):
+            raise IndexError
+    except (ValueError, IndexError):
+        print("Invalid index selected.")
+        return None
+    return PROOF_DIR if selected_idx == 0 else batch_folders[selected_idx - 1]
+
+# Verify the zk proof with ezkl using the proof, vk and settings files stored in proof_folder
+# Return True if the proof is valid
+def op_verify_proof(proof_folder=PROOF_DIR):
     if not os.path.exists(proof_folder):
         print("Proof folder does not exist.")
-        return
+        return False
     
     proof_path = os.path.join(proof_folder, 'test.pf')
     vk_path = os.path.join(proof_folder, 'test.vk')
@@ -156,24 +238,27 @@ def op_verify_proof():
 
     if not os.path.exists(proof_path):
         print("Proof file not found.")
-        return
+        return False
 
     if not os.path.exists(vk_path):
         print("Verification key file not found.")
-        return
+        return False
     
     if not os.path.exists(settings_filename):
         print("Settings file not found.")
-        return
+        return False
     
-    print("\nStarting proof verification...")
+    print(f"\nStarting proof verification ({proof_folder})...")
 
     try:
-        res = ezkl.verify(proof_path, settings_filename, vk_path)
+        with stage("verify", proof_bytes=file_size(proof_path)):
+            res = ezkl.verify(proof_path, settings_filename, vk_path)
         if res:
             print("EZKL Proof Verification successful")
+        return bool(res)
     except Exception as e:
         print(f"Proof verification failed: {e}")
+        return False
     
 async def main():
 
@@ -188,8 +273,9 @@ async def main():
         print(f"\n\nORG B (data receiver, Org{org_n}) select an option:")
         print("[1] Perform Query")
         print("[2] Verify Proof")
+        print("[3] Perform Batch Query")
         print("[0] Exit")
-        sub_choice = input("Enter your choice (1, 2, or 0): ")
+        sub_choice = input("Enter your choice (1, 2, 3, or 0): ")
 
         if sub_choice == "1":  # PERFORM QUERY
             try:
@@ -199,10 +285,18 @@ async def main():
 
         elif sub_choice == "2":  # VERIFY PROOF
             try:
-                op_verify_proof()
+                proof_folder = select_proof_folder()
+                if proof_folder:
+                    op_verify_proof(proof_folder)
             except Exception as e:
                 print(f"Failed to verify proof: {e}")
 
+        elif sub_choice == "3":  # PERFORM BATCH QUERY
+            try:
+                await CLI_query_batch(org_n)
+            except Exception as e:
+                print(f"Failed to execute batch query: {e}")
+
         elif sub_choice == "0":
             print("Exiting ORG B menu.")
             break
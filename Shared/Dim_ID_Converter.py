@@ -1,15 +1,75 @@
 # Mapping from Shared/DFM_Sale.json
 
 import pandas as pd
+import numpy as np
 import json
 import os
 
 from Org1.StarSchemeGenerator import product_Gen
+from Org1.column_store import load_table, write_table, append_table, load_meta, update_meta, store_exists, table_rows, SALE_PR_STORE, SALE_PR_C_STORE
 
-with open("Shared/DFM_Sale.json", "r") as f:
+DFM_PATH = os.path.join("Shared", "DFM_Sale.json")
+with open(DFM_PATH, "r") as f:
     dfm_json = json.load(f)
 START_DATE = dfm_json["START_DATE"]
 
+## LOOKUP TABLES
+# Array-backed lookup tables (ID -> name/category, Date_Id -> year/month/day) built once from DFM_Sale.json
+# and applied with NumPy fancy indexing. They are rebuilt only when DFM_Sale.json changes (e.g. update_products).
+# Reverse lookups (name -> ID) use the DFM_Sale.json dictionaries directly.
+LOOKUP_CACHE = {}
+
+# Array indexed by ID with the name of every ID (None where the ID does not exist)
+def id_table(name_to_id):
+    table = np.full(max([int(i) for i in name_to_id.values()], default=0) + 1, None, dtype=object)
+    for name, i in name_to_id.items():
+        table[int(i)] = name
+    return table
+
+# Array indexed by Product_Id with the category name of every product
+def category_table(category_range):
+    table = np.full(max([end for _, end in category_range.values()], default=0) + 1, None, dtype=object)
+    for cat_name, (start, end) in category_range.items():
+        table[start:end + 1] = cat_name
+    return table
+
+# Year, month and day of every Date_Id from 1 (START_DATE) to n_days
+def date_tables(start_date, n_days):
+    dates = pd.date_range(start_date, periods=n_days, freq="D")
+    return {
+        "Year": np.concatenate([[0], dates.year.to_numpy()]),
+        "Month": np.concatenate([[0], dates.month.to_numpy()]),
+        "Day": np.concatenate([[0], dates.day.to_numpy()])
+    }
+
+def get_lookup_tables():
+    mtime = os.path.getmtime(DFM_PATH)
+    if LOOKUP_CACHE.get("mtime") != mtime:
+        with open(DFM_PATH, "r") as f:
+            dfm = json.load(f)
+        n_days = (pd.to_datetime(dfm["END_DATE"]) - pd.to_datetime(dfm["START_DATE"])).days + 1
+        LOOKUP_CACHE.update(
+            mtime=mtime,
+            dfm=dfm,
+            products=id_table(dfm["Product Name"]),
+            materials=id_table(dfm["Material"]),
+            categories=category_table(dfm["Category_range"]),
+            dates=date_tables(dfm["START_DATE"], n_days)
+        )
+    return LOOKUP_CACHE
+
+# Apply a lookup table to an array of IDs, raising ValueError on unknown IDs
+def lookup(table, ids, label):
+    ids = np.asarray(ids, dtype=np.int64)
+    valid = (ids >= 0) & (ids < len(table))
+    if valid.all():
+        values = table[ids]
+        valid = values != None # elementwise on object arrays
+        if valid.all():
+            return values
+    missing = ids[~valid][0]
+    raise ValueError(f"{label} ID '{missing}' not found.")
+
 ## DATE CONVERTER
 
 # Return date (datetime.date) from Date_Id
@@ -31,139 +91,135 @@ def get_id_from_date(date):
         raise ValueError("Couldn't get Date_Id: date is before START_DATE")
     return date_id
 
+# Return (years, months, days) arrays from an array of Date_Ids
+def get_dates_from_ids(date_ids):
+    tables = get_lookup_tables()
+    date_ids = np.asarray(date_ids, dtype=np.int64)
+    if len(date_ids) and date_ids.max() >= len(tables["dates"]["Year"]): # Date_Id after END_DATE
+        tables["dates"] = date_tables(tables["dfm"]["START_DATE"], int(date_ids.max()))
+    if len(date_ids) and date_ids.min() < 1:
+        raise ValueError("Couldn't get date: Date_Id is before START_DATE")
+    dates = tables["dates"]
+    return dates["Year"][date_ids], dates["Month"][date_ids], dates["Day"][date_ids]
+
 
 ## MATERIAL CONVERTER
-materials = dfm_json["Material"]
 
 # Return the list of material names from a list of material IDs
 def get_materials_from_ids(material_ids):
-    # Create a reverse dictionary to map IDs to names
-    id_to_name = {v: k for k, v in materials.items()}
-    result = []
-    for mid in material_ids:
-        if mid not in id_to_name:
-            raise ValueError(f"Material ID '{mid}' not found in materials.")
-        result.append(id_to_name[mid])
-    return result
+    return lookup(get_lookup_tables()["materials"], material_ids, "Material").tolist()
 
 # Return the list of material IDs from a list of material names
 def get_ids_from_materials(material_names):
+    materials = get_lookup_tables()["dfm"]["Material"] # name -> ID
     ids = []
     for name in material_names:
-        found = False
-        for mid, mat_name in materials.items():
-            if mat_name == name:
-                ids.append(int(mid))
-                found = True
-                break
-        if not found:
+        if name not in materials:
             raise ValueError(f"Material name '{name}' not found in materials.")
+        ids.append(int(materials[name]))
     return ids
 
 
 ## PRODUCT CONVERTER
-products = dfm_json["Product Name"]
 # {'Running Shoes': 1, 'Leather Boots': 2, ..., 'Tank Top': 12}
 
 # Return the list of product names from a list of product IDs
 def get_products_from_ids(product_ids):
-    # Create a reverse dictionary to map IDs to names
-    id_to_name = {v: k for k, v in products.items()}
-    result = []
-    for pid in product_ids:
-        if pid not in id_to_name:
-            raise ValueError(f"Product ID '{pid}' not found in products.")
-        result.append(id_to_name[pid])
-    return result
+    return lookup(get_lookup_tables()["products"], product_ids, "Product").tolist()
 
 # Return the list of product IDs from a list of product names
 def get_ids_from_products(product_names):
+    products = get_lookup_tables()["dfm"]["Product Name"] # name -> ID
     ids = []
     for name in product_names:
-        found = False
-        for pid, prod_name in products.items():
-            if prod_name == name:
-                ids.append(int(pid))
-                found = True
-                break
-        if not found:
+        if name not in products:
             raise ValueError(f"Product name '{name}' not found in products.")
+        ids.append(int(products[name]))
     return ids
 
 
 #CATEGORY
-categories = dfm_json["Category_range"]
+# "Category_range": {
+#     "Shoes": [1, 4],
+#     "Pants": [5, 8],
+#     "Shirts": [9, 12]
+# }
 
+# Return the list of category names from a list of product IDs
 def get_categories_from_ids(category_ids):
-    # Create a reverse dictionary to map IDs to names
-    # "Category_range": {
-    #     "Shoes": [1, 4],
-    #     "Pants": [5, 8],
-    #     "Shirts": [9, 12]
-    # }
-
-    # Build a reverse dictionary: id_to_name maps each product ID to its category name
-    id_to_name = {}
-    for cat_name, id_range in categories.items():
-        # id_range is a list like [start, end]
-        for cid in range(id_range[0], id_range[1] + 1):
-            id_to_name[cid] = cat_name
-
-    result = []
-    for cid in category_ids:
-        if cid not in id_to_name:
-            raise ValueError(f"Category ID '{cid}' not found in categories.")
-        result.append(id_to_name[cid])
-    return result
+    return lookup(get_lookup_tables()["categories"], category_ids, "Category").tolist()
 
+# Return the list of category IDs (DFM_Sale.json "Category") from a list of category names
 def get_ids_from_categories(category_names):
+    categories = get_lookup_tables()["dfm"]["Category"] # name -> ID
     ids = []
     for name in category_names:
-        found = False
-        for cid, cat_name in categories.items():
-            if cat_name == name:
-                ids.append(int(cid))
-                found = True
-                break
-        if not found:
+        if name not in categories:
             raise ValueError(f"Category name '{name}' not found in categories.")
+        ids.append(int(categories[name]))
     return ids
 
 
-# Convert a CSV with Dim IDs to a human-readable CSV, saving it in the "test" folder
-def CSV_converter():
-    # Regenerate Products dimension table in case it was updated
-    product_Gen()
-
-    path = os.path.join("Org1", "PR_DB", "Sale_PR.csv")
-    df = pd.read_csv(path)
-
-    csv_filename = os.path.basename(path)
-    print(f"\nConverting file: {csv_filename}")
-
-    product_names = get_products_from_ids(df["Product_Id"])
-    categories = get_categories_from_ids(df["Product_Id"])
-    materials = get_materials_from_ids(df["Material_Id"])
-    dates = [get_date_from_id(date_id) for date_id in df["Date_Id"]]
+# Convert Sale_PR rows (Dim IDs) to human-readable Sale_PR_C rows
+def convert_rows(df):
+    # Vectorized lookups (arrays indexed by ID)
+    tables = get_lookup_tables()
+    product_names = lookup(tables["products"], df["Product_Id"], "Product")
+    categories = lookup(tables["categories"], df["Product_Id"], "Category")
+    materials = lookup(tables["materials"], df["Material_Id"], "Material")
+    years, months, days = get_dates_from_ids(df["Date_Id"])
 
-    years = [d.year for d in dates]
-    months = [d.month for d in dates]
-    days = [d.day for d in dates]
-
-    out_df = pd.DataFrame({
+    return pd.DataFrame({
         "Product Name": product_names,
         "Category": categories,
         "Material": materials,
         "Year": years,
         "Month": months,
         "Day": days,
-        "Total_Emissions": df["Total_Emissions"],
-        "TS": df["TS"]
+        "Total_Emissions": df["Total_Emissions"].to_numpy(),
+        "TS": df["TS"].to_numpy()
     })
 
+# Number of Sale_PR rows already converted into Sale_PR_C, 0 if Sale_PR_C must be converted from scratch
+# (Sale_PR_C meta.json records the Sale_PR store it was converted from and how many rows)
+def converted_rows():
+    source_rows = table_rows(SALE_PR_STORE)
+    if not store_exists(SALE_PR_C_STORE):
+        return 0
+    converted = load_meta(SALE_PR_C_STORE).get("converted_from")
+    if converted is None or converted["store_id"] != load_meta(SALE_PR_STORE).get("store_id") or converted["rows"] > source_rows:
+        return 0
+    return converted["rows"]
+
+# Convert a CSV with Dim IDs to a human-readable CSV, saving it in the "test" folder
+# incremental=True only converts the rows appended to Sale_PR since the last conversion and appends them
+# to Sale_PR_C (CSV export and column store), so an update costs the size of the new batch
+def CSV_converter(incremental=True):
+    # Regenerate Products dimension table in case it was updated
+    product_Gen()
+
+    path = os.path.join("Org1", "PR_DB", "Sale_PR.csv")
+    start_row = converted_rows() if incremental else 0
+    df = load_table(SALE_PR_STORE, start_row=start_row)
+    source_meta = load_meta(SALE_PR_STORE)
+
+    csv_filename = os.path.basename(path)
+    if start_row:
+        print(f"\nConverting file: {csv_filename} ({len(df)} new rows)")
+    else:
+        print(f"\nConverting file: {csv_filename}")
+
+    out_df = convert_rows(df)
+
     # filename + "_C.csv"
     output_path = os.path.join("Org1/PR_DB", f"{os.path.splitext(csv_filename)[0]}_C.csv") # Sale_PR_C.csv
-    out_df.to_csv(output_path, index=False)
+    if start_row:
+        out_df.to_csv(output_path, mode='a', header=False, index=False) # export
+        append_table(out_df, SALE_PR_C_STORE) # read by c_pos_hash and op_execute_query
+    else:
+        out_df.to_csv(output_path, index=False)
+        write_table(out_df, SALE_PR_C_STORE)
+    update_meta(SALE_PR_C_STORE, {"converted_from": {"store_id": source_meta.get("store_id"), "rows": source_meta["rows"]}})
     print(f"Converted CSV saved as '{output_path}'")
 
 def create_mappings_json():
@@ -0,0 +1,135 @@
+# Per-stage instrumentation of the pipeline (gen_settings, get_srs, calibrate, compile, setup, witness, prove, hash, hash compare, verify)
+# Every stage emits an event with its duration, input sizes and memory usage:
+# - "json": one JSON object per line appended to events.jsonl (moved to events.jsonl.1 when it reaches EVENTS_MAX_BYTES)
+# - "prometheus": counters/gauges per stage written in the Prometheus text format to metrics.prom
+#   (e.g. for the node_exporter textfile collector)
+# The format is chosen with the CBI_ZKP_METRICS environment variable ("json", "prometheus", "both" or "off", the default).
+# The files are written in the metrics folder of the organization running the process (set_metrics_dir).
+# Listeners (add_listener) receive every event in-process (used by Org1/benchmark.py).
+#
+# Usage:
+#   with stage("prove", input_bytes=os.path.getsize(witness_path)):
+#       ezkl.prove(...)
+import os
+import json
+import time
+import logging
+import resource
+from contextlib import contextmanager
+from datetime import datetime
+
+METRICS_DIR = os.path.join('Org1', 'output', 'metrics') # OrgB uses OrgB/output/metrics (see set_metrics_dir)
+EVENTS_FILE = 'events.jsonl'
+PROMETHEUS_FILE = 'metrics.prom'
+EVENTS_MAX_BYTES = 64 * 1024 ** 2 # the events of the previous file are kept in events.jsonl.1
+METRICS_FORMAT = os.environ.get("CBI_ZKP_METRICS", "off")
+
+# Log level of ezkl (Rust side), used when RUST_LOG is not set: "trace" is very verbose and slows down proving
+EZKL_LOG_LEVEL = os.environ.get("CBI_ZKP_EZKL_LOG", "warn")
+# Python logging levels of the ezkl loggers (the Rust logs are forwarded to the Python logging module)
+EZKL_PY_LEVELS = {"trace": 5, "debug": logging.DEBUG, "info": logging.INFO, "warn": logging.WARNING, "error": logging.ERROR}
+
+STAGE_STATS = {} # stage -> {"calls", "seconds", "last_seconds", "peak_rss_bytes"}
+LISTENERS = []
+
+# Set the ezkl log level (call before importing ezkl)
+def configure_ezkl_logging(level=EZKL_LOG_LEVEL):
+    os.environ.setdefault("RUST_LOG", level)
+    level = os.environ["RUST_LOG"].lower()
+    if level in EZKL_PY_LEVELS:
+        logging.getLogger("ezkl").setLevel(EZKL_PY_LEVELS[level])
+
+# Folder of the metrics files of this process
+def set_metrics_dir(metrics_dir):
+    global METRICS_DIR
+    METRICS_DIR = metrics_dir
+
+def add_listener(listener):
+    LISTENERS.append(listener)
+
+def remove_listener(listener):
+    LISTENERS.remove(listener)
+
+# Current resident set size (bytes), from /proc when available
+def current_rss_bytes():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+# Peak resident set size of the process so far (bytes, ru_maxrss is in KB on Linux)
+def peak_rss_bytes():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def file_size(path):
+    return os.path.getsize(path) if path and os.path.exists(path) else None
+
+# Measure a stage; info is added to the event (e.g. input sizes)
+# The event is emitted also if the stage raises an exception (with "error")
+@contextmanager
+def stage(name, **info):
+    event = {"stage": name, "time": datetime.now().isoformat(), **info}
+    start = time.perf_counter()
+    try:
+        yield event # the stage can add fields to the event
+    except Exception as e:
+        event["error"] = str(e)
+        raise
+    finally:
+        event["duration_s"] = time.perf_counter() - start
+        event["rss_bytes"] = current_rss_bytes()
+        event["peak_rss_bytes"] = peak_rss_bytes()
+        emit(event)
+
+def emit(event):
+    stats = STAGE_STATS.setdefault(event["stage"], {"calls": 0, "seconds": 0.0, "last_seconds": 0.0, "peak_rss_bytes": 0})
+    stats["calls"] += 1
+    stats["seconds"] += event["duration_s"]
+    stats["last_seconds"] = event["duration_s"]
+    stats["peak_rss_bytes"] = max(stats["peak_rss_bytes"], event["peak_rss_bytes"])
+
+    if METRICS_FORMAT in ("json", "both"):
+        write_event(event)
+    if METRICS_FORMAT in ("prometheus", "both"):
+        write_prometheus()
+    for listener in LISTENERS:
+        listener(event)
+
+def write_event(event):
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    events_path = os.path.join(METRICS_DIR, EVENTS_FILE)
+    if (file_size(events_path) or 0) >= EVENTS_MAX_BYTES:
+        os.replace(events_path, events_path + ".1")
+    with open(events_path, "a") as f:
+        f.write(json.dumps(event) + "\n")
+
+# Write the stage counters of this process in the Prometheus text format
+def write_prometheus():
+    lines = [
+        "# HELP cbi_zkp_stage_calls_total Number of executions of the stage.",
+        "# TYPE cbi_zkp_stage_calls_total counter"
+    ]
+    lines += [f'cbi_zkp_stage_calls_total{{stage="{name}"}} {stats["calls"]}' for name, stats in STAGE_STATS.items()]
+    lines += [
+        "# HELP cbi_zkp_stage_seconds_total Total wall time spent in the stage.",
+        "# TYPE cbi_zkp_stage_seconds_total counter"
+    ]
+    lines += [f'cbi_zkp_stage_seconds_total{{stage="{name}"}} {stats["seconds"]:.6f}' for name, stats in STAGE_STATS.items()]
+    lines += [
+        "# HELP cbi_zkp_stage_last_seconds Wall time of the last execution of the stage.",
+        "# TYPE cbi_zkp_stage_last_seconds gauge"
+    ]
+    lines += [f'cbi_zkp_stage_last_seconds{{stage="{name}"}} {stats["last_seconds"]:.6f}' for name, stats in STAGE_STATS.items()]
+    lines += [
+        "# HELP cbi_zkp_stage_peak_rss_bytes Peak resident memory of the process at the end of the stage.",
+        "# TYPE cbi_zkp_stage_peak_rss_bytes gauge"
+    ]
+    lines += [f'cbi_zkp_stage_peak_rss_bytes{{stage="{name}"}} {stats["peak_rss_bytes"]}' for name, stats in STAGE_STATS.items()]
+
+    path = os.path.join(METRICS_DIR, PROMETHEUS_FILE)
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,105 @@
+# The pipeline uses paths relative to the working directory (Org1/PR_DB, Shared, Blockchain): every test runs in its own
+# workspace (same layout as Org1/benchmark.py create_workspace) and imports the modules after changing to it,
+# since some of them read Shared/DFM_Sale.json or Blockchain/contract_addresses.json when imported.
+# The real Org1/PR_DB is never touched.
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# ezkl reads and writes the SRS files in $EZKL_REPO_PATH/srs: the tests use their own folder, so the SRS generated
+# locally by offline_srs (not the published one, not secure) never ends up next to the real ones in ~/.ezkl
+EZKL_TEST_REPO = tempfile.mkdtemp(prefix="cbi-zkp-test-ezkl-")
+os.environ["EZKL_REPO_PATH"] = EZKL_TEST_REPO
+atexit.register(shutil.rmtree, EZKL_TEST_REPO, ignore_errors=True)
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    shutil.copytree(os.path.join(REPO_ROOT, 'Org1', 'PR_DB', 'DimTab'), tmp_path / 'Org1' / 'PR_DB' / 'DimTab')
+    os.makedirs(tmp_path / 'Shared')
+    for name in ["DFM_Sale.json", "map.json"]:
+        shutil.copyfile(os.path.join(REPO_ROOT, 'Shared', name), tmp_path / 'Shared' / name)
+    os.makedirs(tmp_path / 'Blockchain')
+    shutil.copyfile(os.path.join(REPO_ROOT, 'Blockchain', 'contract_addresses.json'), tmp_path / 'Blockchain' / 'contract_addresses.json')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+# generate_sales(num_rows, num_versions=1, seed=1): fact tables (Sale_PR and Sale_PR_C, CSV and column store)
+# with num_rows rows in num_versions data versions, in the workspace
+@pytest.fixture
+def generate_sales(workspace):
+    return make_sales
+
+# append_sales(num_rows, seed=2): append a new data version to Sale_PR (CSV and store) with TS after the last one,
+# as sale_update does; return the appended rows
+@pytest.fixture
+def append_sales(workspace):
+    return add_sales
+
+# circuit_output(model, data): output of the ezkl circuit of a model (exported to ONNX, calibrated and compiled as
+# generate_proof does) on data, checked with ezkl.mock; same shape as model(data)
+@pytest.fixture
+def circuit_output(workspace):
+    return run_circuit
+
+# generate_proof without the network: get_srs generates the SRS locally (once per logrows) instead of downloading it
+@pytest.fixture
+def offline_srs(monkeypatch):
+    from Org1.ezkl_workflow import generate_proof
+    monkeypatch.setattr(generate_proof, "get_srs", local_srs)
+
+def make_sales(num_rows, num_versions=1, seed=1):
+    from Org1.StarSchemeGenerator import sale_bulk_gen
+    sale_bulk_gen(num_rows, num_versions, seed=seed)
+
+def add_sales(num_rows, seed=2):
+    import numpy as np
+    import pandas as pd
+    from Org1.column_store import append_table, latest_ts, SALE_PR_STORE
+    dim_tab = os.path.join('Org1', 'PR_DB', 'DimTab')
+    products = pd.read_csv(os.path.join(dim_tab, 'Products.csv'))
+    materials = pd.read_csv(os.path.join(dim_tab, 'Material.csv'))
+    dates = pd.read_csv(os.path.join(dim_tab, 'Date.csv'))
+    rng = np.random.default_rng(seed)
+    sales = pd.DataFrame({
+        "Product_Id": rng.choice(products["Product_Id"], num_rows),
+        "Material_Id": rng.choice(materials["Material_Id"], num_rows),
+        "Date_Id": rng.choice(dates["Date_Id"], num_rows),
+        "Total_Emissions": rng.uniform(1, 100, num_rows).round(2),
+        "TS": latest_ts(SALE_PR_STORE) + 1000
+    })
+    sales.to_csv(os.path.join('Org1', 'PR_DB', 'Sale_PR.csv'), mode='a', header=False, index=False)
+    append_table(sales, SALE_PR_STORE)
+    return sales
+
+def run_circuit(model, data):
+    import json
+    import ezkl
+    import torch
+    from Org1.ezkl_workflow.data_files import write_input_data
+    output = model(data)
+    torch.onnx.export(model, (data,), 'circuit.onnx', opset_version=11, input_names=['input'], output_names=['output'], dynamo=False)
+    write_input_data('circuit_input.json', [data], output)
+    run_args = ezkl.PyRunArgs()
+    run_args.input_visibility = "hashed/public"
+    assert ezkl.gen_settings('circuit.onnx', 'circuit_settings.json', py_run_args=run_args)
+    assert ezkl.calibrate_settings('circuit_input.json', 'circuit.onnx', 'circuit_settings.json', "resources")
+    assert ezkl.compile_circuit('circuit.onnx', 'circuit.compiled', 'circuit_settings.json')
+    assert ezkl.gen_witness('circuit_input.json', 'circuit.compiled', 'circuit_witness.json')
+    assert ezkl.mock('circuit_witness.json', 'circuit.compiled')
+    with open('circuit_witness.json') as f:
+        values = json.load(f)["pretty_elements"]["rescaled_outputs"][0]
+    return torch.tensor([float(value) for value in values], dtype=output.dtype).reshape(output.shape)
+
+async def local_srs(settings_filename, logrows):
+    import ezkl
+    from Org1.ezkl_workflow.warm_pool import SRS_DIR
+    srs_path = os.path.join(SRS_DIR, f"kzg{logrows}.srs")
+    if not os.path.exists(srs_path):
+        os.makedirs(SRS_DIR, exist_ok=True)
+        ezkl.gen_srs(srs_path, logrows)
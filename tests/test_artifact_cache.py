@@ -0,0 +1,137 @@
+# Circuit cache (Org1/ezkl_workflow/artifact_cache.py): a different circuit must never get the artifacts of another one,
+# and concurrent provers must always use settings, compiled circuit and keys of the same entry
+import os
+import onnx
+import torch
+
+def export_dicing(path, conditions, rows=8):
+    from Org1.operations.dicing_model import DicingModel
+    torch.onnx.export(DicingModel(conditions), (torch.ones(rows, 7),), path, opset_version=11, input_names=['input'], output_names=['output'],
+                      dynamo=False)
+    return path
+
+def cache_key(path, logrows=None, run_args={"input_visibility": "hashed/public"}):
+    from Org1.ezkl_workflow.artifact_cache import get_cache_key
+    return get_cache_key(path, logrows, run_args)
+
+def test_cache_key_changes_with_the_circuit(tmp_path):
+    model = export_dicing(str(tmp_path / 'a.onnx'), {3: [2022]})
+    key = cache_key(model)
+    assert cache_key(export_dicing(str(tmp_path / 'b.onnx'), {3: [2022]})) == key
+    assert cache_key(export_dicing(str(tmp_path / 'c.onnx'), {3: [2023]})) != key # constants
+    assert cache_key(export_dicing(str(tmp_path / 'd.onnx'), {3: [2022]}, rows=16)) != key # input shape
+    assert cache_key(model, logrows=17) != key
+    assert cache_key(model, run_args={"input_visibility": "public"}) != key
+
+def test_cache_key_ignores_model_metadata(tmp_path):
+    path = export_dicing(str(tmp_path / 'a.onnx'), {3: [2022]})
+    key = cache_key(path)
+    model = onnx.load(path)
+    model.producer_version = "0.0.0"
+    onnx.save(model, path)
+    assert cache_key(path) == key
+
+def write_artifacts(directory, content):
+    from Org1.ezkl_workflow.artifact_cache import ARTIFACTS
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name in ARTIFACTS:
+        paths[name] = os.path.join(directory, name)
+        with open(paths[name], "w") as f:
+            f.write(content)
+    return paths
+
+def test_cache_lookup_and_replace(tmp_path):
+    from Org1.ezkl_workflow import artifact_cache
+    cache_dir = str(tmp_path / 'cache')
+    assert artifact_cache.lookup("key", cache_dir=cache_dir) is None
+    cached = artifact_cache.store("key", write_artifacts(str(tmp_path / 'a'), "first"), [[[0.0, 1.0]], [[0.0, 1.0]]], cache_dir=cache_dir)
+    assert cached == artifact_cache.lookup("key", cache_dir=cache_dir)
+
+    # incomplete entry: not a hit
+    os.remove(cached["test.vk"])
+    assert artifact_cache.lookup("key", cache_dir=cache_dir) is None
+
+    cached = artifact_cache.store("key", write_artifacts(str(tmp_path / 'b'), "second"), [[[0.0, 2.0]], [[0.0, 2.0]]], cache_dir=cache_dir, replace=True)
+    with open(cached["settings.json"]) as f:
+        assert f.read() == "second"
+    assert artifact_cache.load_ranges(cached) == [[[0.0, 2.0]], [[0.0, 2.0]]]
+
+def test_cache_store_replaces_incomplete_entry(tmp_path):
+    from Org1.ezkl_workflow import artifact_cache
+    cache_dir = str(tmp_path / 'cache')
+    cached = artifact_cache.store("key", write_artifacts(str(tmp_path / 'a'), "first"), [], cache_dir=cache_dir)
+    os.remove(cached["test.vk"]) # e.g. interrupted removal
+
+    cached = artifact_cache.store("key", write_artifacts(str(tmp_path / 'b'), "second"), [], cache_dir=cache_dir)
+    assert cached is not None
+    for name in artifact_cache.ARTIFACTS:
+        with open(cached[name]) as f:
+            assert f.read() == "second"
+
+# Another prover stored the same entry first: its proving key is used, so its other artifacts must be used too
+def test_cache_store_after_another_prover(tmp_path):
+    from Org1.ezkl_workflow import artifact_cache
+    cache_dir = str(tmp_path / 'cache')
+    artifact_cache.store("key", write_artifacts(str(tmp_path / 'other'), "theirs"), [], cache_dir=cache_dir)
+
+    paths = write_artifacts(str(tmp_path / 'own'), "ours")
+    cached = artifact_cache.store("key", paths, [], cache_dir=cache_dir)
+    for name in artifact_cache.ARTIFACTS:
+        with open(cached[name]) as f:
+            assert f.read() == "theirs"
+        if name != "test.pk":
+            with open(paths[name]) as f:
+                assert f.read() == "theirs"
+    assert [name for name in os.listdir(cache_dir) if name.startswith(".tmp-")] == []
+
+# A prover that uses an entry (hard link to its proving key) keeps it from being evicted, and keeps its key if it is replaced
+def test_cache_entries_in_use_are_kept(tmp_path):
+    from Org1.ezkl_workflow import artifact_cache
+    cache_dir = str(tmp_path / 'cache')
+    paths = write_artifacts(str(tmp_path / 'a'), "first")
+    cached = artifact_cache.store("a", paths, [], cache_dir=cache_dir)
+    artifact_cache.store("b", write_artifacts(str(tmp_path / 'b'), "second"), [], cache_dir=cache_dir)
+
+    # "a" is the least recently used entry, but its proving key is still linked by the prover
+    artifact_cache.evict(0, cache_dir=cache_dir, keep="b")
+    assert artifact_cache.lookup("a", cache_dir=cache_dir) is not None
+
+    # replaced while in use: the prover keeps its key
+    artifact_cache.store("a", write_artifacts(str(tmp_path / 'c'), "third"), [], cache_dir=cache_dir, replace=True)
+    with open(paths["test.pk"]) as f:
+        assert f.read() == "first"
+    assert not os.path.samefile(paths["test.pk"], cached["test.pk"])
+
+    # another prover checks the new entry out, the first one is done
+    other = write_artifacts(str(tmp_path / 'd'), "")
+    assert artifact_cache.checkout(artifact_cache.lookup("a", cache_dir=cache_dir), other)
+    with open(other["settings.json"]) as f:
+        assert f.read() == "third"
+    artifact_cache.release(paths["test.pk"])
+    artifact_cache.release(str(tmp_path / 'b' / 'test.pk'))
+    artifact_cache.release(str(tmp_path / 'c' / 'test.pk'))
+    artifact_cache.evict(0, cache_dir=cache_dir)
+    assert artifact_cache.lookup("b", cache_dir=cache_dir) is None
+    assert artifact_cache.lookup("a", cache_dir=cache_dir) is not None
+    artifact_cache.release(other["test.pk"])
+    artifact_cache.evict(0, cache_dir=cache_dir)
+    assert artifact_cache.lookup("a", cache_dir=cache_dir) is None
+
+# The cache key does not depend on the data: an entry is reused only for values inside the ranges it was calibrated on
+def test_cache_entry_fits_calibration_ranges(tmp_path):
+    from Org1.ezkl_workflow import artifact_cache
+    from Org1.ezkl_workflow.generate_proof import fits_calibration
+    from Org1.ezkl_workflow.data_files import write_input_data
+    cache_dir = str(tmp_path / 'cache')
+    cached = artifact_cache.store("key", write_artifacts(str(tmp_path / 'a'), "first"), [[[0.0, 4.0], [0.0, 4.0]], [[0.0, 10.0]]], cache_dir=cache_dir)
+    input_path = str(tmp_path / 'input.json')
+    data = torch.tensor([[1.0, 2.0], [3.0, 4.0]])
+
+    write_input_data(input_path, [data], torch.tensor([[2.0, 8.0]]))
+    assert fits_calibration(cached, input_path)
+    # same inputs, larger output (e.g. group-by sums of a newer data version)
+    write_input_data(input_path, [data], torch.tensor([[0.0, 100.0]]))
+    assert not fits_calibration(cached, input_path)
+    write_input_data(input_path, [data * 2], torch.tensor([[0.0, 10.0]]))
+    assert not fits_calibration(cached, input_path)
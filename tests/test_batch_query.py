@@ -0,0 +1,15 @@
+# Batched queries (Org1/batch_query.py): every proof of the batch is shared in its own folder and OrgB can verify it
+import os
+
+def test_batched_proof_is_verified_by_orgb(generate_sales, offline_srs):
+    from Org1.batch_query import run_query_job, batch_proof_dir, batch_proof_dirs
+    from Org1.column_store import latest_ts, SALE_PR_C_STORE
+    from Org1.ezkl_workflow.generate_proof import PROOF_DIR
+    from OrgB.main import op_verify_proof
+    generate_sales(40)
+    # the worker function of the batch, run in the test process so the offline SRS is used
+    job_idx, final_tensor, poseidon_hash, proof_dir = run_query_job(1, {"Dicing": [{3: [2022]}]}, [], latest_ts(SALE_PR_C_STORE))
+    assert proof_dir == batch_proof_dir(1) and batch_proof_dirs() == [proof_dir]
+    assert poseidon_hash and final_tensor.any()
+    assert op_verify_proof(proof_dir)
+    assert not os.path.exists(os.path.join(PROOF_DIR, 'test.pf')) # the single-query proof is not touched
@@ -0,0 +1,9 @@
+# Benchmark harness (Org1/benchmark.py): one grid point, query -> proof -> verify, in a temporary workspace
+def test_benchmark_grid_point(workspace, offline_srs):
+    from Org1.benchmark import generate_data, run_query
+    timestamp = generate_data(str(workspace), 40)
+    result = run_query(str(workspace), "slice", None, timestamp)
+    assert result["verified"] and result["hash_match"]
+    assert all(result["timings_s"].get(name, 0) > 0 for name in ["export", "calibrate", "setup", "witness", "prove", "verify"])
+    assert result["sizes_bytes"]["proof"] and result["sizes_bytes"]["pk"]
+    assert result["settings_logrows"] >= 10
@@ -0,0 +1,64 @@
+# Calibration memo (Org1/ezkl_workflow/calibration_memo.py): calibrated settings are reused only for the same graph,
+# run args and target, and for input and output values inside the memoized ranges
+import json
+import torch
+
+def export_dicing(path, conditions, rows=8):
+    from Org1.operations.dicing_model import DicingModel
+    torch.onnx.export(DicingModel(conditions), (torch.ones(rows, 7),), path, opset_version=11, input_names=['input'], output_names=['output'],
+                      dynamo=False)
+    return path
+
+def test_calibration_memo_checks_input_and_output_ranges(tmp_path, monkeypatch):
+    from Org1.ezkl_workflow import calibration_memo
+    from Org1.ezkl_workflow.data_files import write_input_data
+    monkeypatch.setattr(calibration_memo, "MEMO_DIR", str(tmp_path / 'memo'))
+    monkeypatch.setattr(calibration_memo, "MEMO_INDEX", str(tmp_path / 'memo' / 'index.json'))
+    model = export_dicing(str(tmp_path / 'model.onnx'), {3: [2022]})
+    input_path = str(tmp_path / 'input.json')
+    settings_path = str(tmp_path / 'settings.json')
+    with open(settings_path, "w") as f:
+        json.dump({"run_args": {}}, f)
+    run_args = {"input_visibility": "hashed/public"}
+    data = torch.tensor([[1.0, 2.0], [3.0, 4.0]])
+
+    write_input_data(input_path, [data], torch.tensor([[0.0, 10.0]]))
+    ranges = calibration_memo.store(model, input_path, run_args, "resources", settings_path)
+    assert ranges == [[[1.0, 3.0], [2.0, 4.0]], [[0.0, 10.0]]]
+    assert calibration_memo.lookup(model, input_path, run_args, "resources") is not None
+
+    # input values inside the memoized ranges, output inside its range: the settings come with the memoized ranges
+    write_input_data(input_path, [data * 0.5 + 1], torch.tensor([[2.0, 8.0]]))
+    assert calibration_memo.lookup_entry(model, input_path, run_args, "resources")[1] == ranges
+
+    # same inputs, larger output (e.g. group-by sums): calibrate again
+    write_input_data(input_path, [data], torch.tensor([[0.0, 100.0]]))
+    assert calibration_memo.lookup(model, input_path, run_args, "resources") is None
+    # input value outside the memoized ranges
+    write_input_data(input_path, [data * 2], torch.tensor([[0.0, 10.0]]))
+    assert calibration_memo.lookup(model, input_path, run_args, "resources") is None
+    # other target or run args
+    write_input_data(input_path, [data], torch.tensor([[0.0, 10.0]]))
+    assert calibration_memo.lookup(model, input_path, run_args, "accuracy") is None
+    assert calibration_memo.lookup(model, input_path, {"input_visibility": "public"}, "resources") is None
+
+# op_execute_query passes the ranges of the tensors in memory: the same ranges as reading input.json
+def test_tensor_ranges_match_input_file(tmp_path, monkeypatch):
+    from Org1.ezkl_workflow import calibration_memo
+    from Org1.ezkl_workflow.data_files import write_input_data
+    monkeypatch.setattr(calibration_memo, "MEMO_DIR", str(tmp_path / 'memo'))
+    monkeypatch.setattr(calibration_memo, "MEMO_INDEX", str(tmp_path / 'memo' / 'index.json'))
+    model = export_dicing(str(tmp_path / 'model.onnx'), {3: [2022]})
+    input_path = str(tmp_path / 'input.json')
+    settings_path = str(tmp_path / 'settings.json')
+    with open(settings_path, "w") as f:
+        json.dump({"run_args": {}}, f)
+    inputs, output = [torch.rand(16, 7) * 100, torch.rand(3)], torch.rand(16, 7)
+    write_input_data(input_path, inputs, output)
+    ranges = calibration_memo.array_ranges([t.numpy() for t in inputs], output.numpy())
+    assert ranges == calibration_memo.value_ranges(input_path)
+
+    assert calibration_memo.store(model, input_path, {}, "resources", settings_path, ranges) == ranges
+    assert calibration_memo.lookup_entry(model, input_path, {}, "resources", ranges)[1] == ranges
+    # the given ranges are used instead of the file
+    assert calibration_memo.lookup(model, input_path, {}, "resources", [[[0.0, 1000.0]] * 7, [[0.0, 1.0]], [[0.0, 1.0]]]) is None
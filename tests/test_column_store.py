@@ -0,0 +1,24 @@
+# Column store of the fact tables (Org1/column_store.py) and its CSV export
+import os
+import pandas as pd
+
+def test_store_rebuilt_from_newer_csv(generate_sales):
+    from Org1.column_store import load_table, SALE_PR_C_STORE
+    generate_sales(40)
+    csv_path = os.path.join('Org1', 'PR_DB', 'Sale_PR_C.csv')
+    df = pd.read_csv(csv_path).iloc[:30]
+    df.to_csv(csv_path, index=False) # edited by hand
+    os.utime(csv_path, (os.path.getmtime(csv_path) + 10,) * 2)
+    pd.testing.assert_frame_equal(load_table(SALE_PR_C_STORE), df, check_dtype=False)
+
+def test_append_then_read_matches_the_rows(tmp_path):
+    from Org1.column_store import write_table, append_table, read_table
+    store_dir = str(tmp_path / 'store')
+    first = pd.DataFrame({"Product Name": ["a", "b", "a"], "Price": [1.5, 2.0, 3.25], "TS": [1, 1, 2]})
+    second = pd.DataFrame({"Product Name": ["c", "b"], "Price": [4.0, 5.5], "TS": [3, 3]})
+    write_table(first, store_dir)
+    append_table(second, store_dir)
+    both = pd.concat([first, second], ignore_index=True)
+    pd.testing.assert_frame_equal(read_table(store_dir), both, check_dtype=False)
+    pd.testing.assert_frame_equal(read_table(store_dir, max_ts=2), first, check_dtype=False)
+    pd.testing.assert_frame_equal(read_table(store_dir, columns=["TS"], start_row=3), both[["TS"]].iloc[3:].reset_index(drop=True), check_dtype=False)
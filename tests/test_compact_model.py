@@ -0,0 +1,35 @@
+# Compaction of the selected rows (Org1/operations/compact_model.py)
+import torch
+
+def sparse_rows(rows, selected, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    data = torch.randint(1, 50, (rows, 5), generator=generator).float()
+    keep = torch.zeros(rows, dtype=torch.bool)
+    keep[torch.randperm(rows, generator=generator)[:selected]] = True
+    return data * keep.unsqueeze(1)
+
+def expected_rows(data, max_rows):
+    selected = data[data.abs().sum(dim=1) > 0][:max_rows]
+    return torch.cat([selected, torch.zeros(max_rows - selected.size(0), data.size(1))])
+
+def test_compact_keeps_selected_rows_in_order():
+    from Org1.operations.compact_model import CompactModel
+    data = sparse_rows(64, 10)
+    assert torch.equal(CompactModel(16)(data), expected_rows(data, 16))
+    # more selected rows than max_rows: the last ones are dropped
+    assert torch.equal(CompactModel(4)(data), expected_rows(data, 4))
+    assert torch.equal(CompactModel(8)(torch.zeros(32, 5)), torch.zeros(8, 5))
+
+def test_compact_circuit_output(circuit_output):
+    from Org1.operations.compact_model import CompactModel
+    data = sparse_rows(32, 6)
+    assert torch.equal(circuit_output(CompactModel(8), data), expected_rows(data, 8))
+
+def test_compact_rows():
+    from Org1.operations.compact_model import compact_rows
+    assert compact_rows(0, 1000) == 16
+    assert compact_rows(16, 1000) == 16
+    assert compact_rows(17, 1000) == 32
+    assert compact_rows(300, 1000) == 512
+    assert compact_rows(600, 1000) == 1000
+    assert compact_rows(5, 10) == 10
@@ -0,0 +1,47 @@
+# Incremental conversion Sale_PR -> Sale_PR_C (Shared/Dim_ID_Converter.py CSV_converter) and CSV export of the result
+import os
+import pandas as pd
+
+def converted_table():
+    from Org1.column_store import read_table, SALE_PR_C_STORE
+    return read_table(SALE_PR_C_STORE)
+
+def full_conversion():
+    from Org1.column_store import read_table, SALE_PR_STORE
+    from Shared.Dim_ID_Converter import convert_rows
+    return convert_rows(read_table(SALE_PR_STORE))
+
+def test_incremental_conversion_matches_full(generate_sales, append_sales):
+    from Shared.Dim_ID_Converter import CSV_converter, converted_rows
+    generate_sales(60, 2)
+    append_sales(25)
+    assert converted_rows() == 60
+    CSV_converter()
+    pd.testing.assert_frame_equal(converted_table(), full_conversion())
+    # the CSV export has the same rows as the store
+    pd.testing.assert_frame_equal(pd.read_csv(os.path.join('Org1', 'PR_DB', 'Sale_PR_C.csv')), converted_table(), check_dtype=False)
+
+def test_rewritten_source_is_converted_from_scratch(generate_sales, append_sales):
+    from Org1.column_store import write_table, read_table, SALE_PR_STORE
+    from Shared.Dim_ID_Converter import CSV_converter, converted_rows
+    generate_sales(60, 2)
+    # Sale_PR rewritten with fewer rows, then rows appended back past the converted count
+    write_table(read_table(SALE_PR_STORE).iloc[:20], SALE_PR_STORE)
+    append_sales(50)
+    assert converted_rows() == 0
+    CSV_converter()
+    assert len(converted_table()) == 70
+    pd.testing.assert_frame_equal(converted_table(), full_conversion())
+
+# Only the rows appended since the last conversion are converted, the converted rows are not read again
+def test_only_appended_rows_are_converted(generate_sales, append_sales, monkeypatch):
+    from Shared import Dim_ID_Converter
+    generate_sales(60)
+    appended = append_sales(25)
+    converted = []
+    convert_rows = Dim_ID_Converter.convert_rows
+    monkeypatch.setattr(Dim_ID_Converter, "convert_rows", lambda df: converted.append(len(df)) or convert_rows(df))
+    Dim_ID_Converter.CSV_converter()
+    Dim_ID_Converter.CSV_converter() # nothing new
+    assert converted == [len(appended), 0]
+    pd.testing.assert_frame_equal(converted_table(), full_conversion())
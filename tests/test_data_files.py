@@ -0,0 +1,56 @@
+# Input and witness files of the circuit (Org1/ezkl_workflow/data_files.py): same content as building and parsing the whole JSON
+import os
+import json
+import numpy as np
+import pytest
+import torch
+
+def test_input_file_matches_json(tmp_path, monkeypatch):
+    from Org1.ezkl_workflow import data_files
+    monkeypatch.setattr(data_files, "CHUNK_VALUES", 7) # several chunks per tensor
+    inputs = [torch.rand(10, 3), torch.rand(4, 3)]
+    output = torch.rand(6, 2)
+    path = str(tmp_path / 'input.json')
+    data_files.write_input_data(path, inputs, output)
+    with open(path) as f:
+        data = json.load(f)
+    assert data == {"input_shapes": [[10, 3], [4, 3]], "input_data": [t.reshape(-1).tolist() for t in inputs],
+                    "output_data": [output.reshape(-1).tolist()]}
+    assert os.listdir(tmp_path) == ['input.json']
+
+    arrays, output_values = data_files.read_input_data(path)
+    assert len(arrays) == len(inputs) and all(np.array_equal(a, t.numpy()) for a, t in zip(arrays, inputs))
+    assert np.array_equal(output_values, output.reshape(-1).numpy())
+
+# pretty_elements (before the top-level fields) uses the same key names: the top-level values must be returned
+def test_read_witness_fields(tmp_path, monkeypatch):
+    from Org1.ezkl_workflow import data_files
+    monkeypatch.setattr(data_files, "WITNESS_TAIL_BYTES", 64) # the tail is doubled until the fields are found
+    witness = {
+        "inputs": [[f"{i:064x}" for i in range(200)]],
+        "pretty_elements": {"processed_inputs": ["pretty"], "processed_outputs": ["pretty"]},
+        "outputs": [[f"{i:064x}" for i in range(50)]],
+        "processed_inputs": {"poseidon_hash": ["0x01", "0x02"]},
+        "processed_params": None,
+        "processed_outputs": {"poseidon_hash": ["0x03"]},
+        "max_lookup_inputs": 4,
+        "version": "1"
+    }
+    path = str(tmp_path / 'witness.json')
+    for indent in [None, 2]:
+        with open(path, "w") as f:
+            json.dump(witness, f, indent=indent)
+        fields = ["processed_inputs", "processed_params", "processed_outputs", "max_lookup_inputs"]
+        assert data_files.read_witness_fields(path, fields) == {field: witness[field] for field in fields}
+        with pytest.raises(KeyError):
+            data_files.read_witness_fields(path, ["processed_inputs", "missing"])
+
+def test_read_witness_fields_of_ezkl_witness(circuit_output):
+    from Org1.ezkl_workflow.data_files import read_witness_fields
+    from Org1.operations.dicing_model import DicingModel
+    circuit_output(DicingModel({0: [1, 2]}), torch.tensor([[1.0, 5.0], [3.0, 2.0], [2.0, 1.0]]))
+    with open('circuit_witness.json') as f:
+        witness = json.load(f)
+    fields = ["processed_inputs", "processed_outputs", "version"]
+    assert read_witness_fields('circuit_witness.json', fields) == {field: witness[field] for field in fields}
+    assert witness["processed_inputs"] # hashed/public input
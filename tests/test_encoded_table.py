@@ -0,0 +1,81 @@
+# Encoded fact table (Org1/models/olap_cube.py sync_encoded_table): incremental updates and concurrent rebuilds
+import os
+import multiprocessing
+import torch
+
+def expected_tensor():
+    from Org1.column_store import read_table, SALE_PR_C_STORE
+    from Org1.models.olap_cube import OLAPCube
+    df = read_table(SALE_PR_C_STORE).drop(columns=["TS"])
+    df.columns = df.columns.str.strip()
+    return OLAPCube(df).to_tensor()
+
+def encoded_file_size():
+    from Org1.column_store import SALE_PR_C_STORE
+    from Org1.models.olap_cube import ENCODED_DATA
+    return os.path.getsize(os.path.join(SALE_PR_C_STORE, ENCODED_DATA))
+
+def test_appended_rows_are_encoded(generate_sales, append_sales):
+    from Org1.models.olap_cube import OLAPCube
+    from Shared.Dim_ID_Converter import CSV_converter
+    generate_sales(50)
+    OLAPCube.from_store()
+    append_sales(30)
+    CSV_converter()
+    tensor = OLAPCube.from_store().to_tensor()
+    assert torch.equal(tensor, expected_tensor())
+    assert encoded_file_size() == tensor.numel() * 4
+
+def test_rewritten_store_is_encoded_again(generate_sales):
+    from Org1.column_store import write_table, read_table, SALE_PR_C_STORE
+    from Org1.models.olap_cube import OLAPCube
+    generate_sales(50)
+    OLAPCube.from_store()
+    write_table(read_table(SALE_PR_C_STORE).iloc[10:40], SALE_PR_C_STORE)
+    tensor = OLAPCube.from_store().to_tensor()
+    assert torch.equal(tensor, expected_tensor())
+    assert encoded_file_size() == tensor.numel() * 4
+
+# Worker: wait for the other workers, then read the (stale) encoded table
+def read_encoded_table(start, results):
+    from Org1.models.olap_cube import OLAPCube
+    start.wait()
+    tensor = OLAPCube.from_store().to_tensor()
+    results.put(tensor.numpy().tobytes())
+
+def test_concurrent_sync_of_stale_table(generate_sales):
+    from Org1.column_store import write_table, read_table, SALE_PR_C_STORE
+    from Org1.models.olap_cube import OLAPCube
+    generate_sales(20000)
+    OLAPCube.from_store()
+    # the store is rewritten: every worker finds the encoded table stale at the same time
+    write_table(read_table(SALE_PR_C_STORE).iloc[5000:], SALE_PR_C_STORE)
+
+    context = multiprocessing.get_context("spawn")
+    start, results = context.Event(), context.Queue()
+    workers = [context.Process(target=read_encoded_table, args=(start, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    outputs = [results.get(timeout=300) for _ in workers]
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    expected = expected_tensor()
+    assert encoded_file_size() == expected.numel() * 4
+    assert all(output == expected.numpy().tobytes() for output in outputs)
+    assert torch.equal(OLAPCube.from_store().to_tensor(), expected)
+
+# Data versions are row prefixes of the memory-mapped table; writes to a tensor never reach the file (copy-on-write)
+def test_data_version_view_of_the_mapped_table(generate_sales):
+    from Org1.column_store import read_table, SALE_PR_C_STORE
+    from Org1.models.olap_cube import OLAPCube
+    generate_sales(90, 3)
+    first_ts = int(read_table(SALE_PR_C_STORE)["TS"].min())
+    version = OLAPCube.from_store(max_ts=first_ts).to_tensor()
+    expected = expected_tensor()
+    assert 0 < len(version) < len(expected)
+    assert torch.equal(version, expected[:len(version)])
+    version[:] = -1
+    assert torch.equal(OLAPCube.from_store().to_tensor(), expected)
@@ -0,0 +1,54 @@
+# Query planner and execution (Org1/execute_query.py)
+import os
+import pytest
+import torch
+
+# (operations, columns_to_remove_idx); columns: Product Name 0, Category 1, Material 2, Year 3, Month 4, Day 5
+QUERIES = [
+    ({"Rollup": True}, [3, 4, 5]),
+    ({"Dicing": [{2: [1, 3]}]}, []),
+    ({"Dicing": [{2: [1, 3]}, {3: 2022}], "Rollup": True}, [3, 4, 5]),
+    ({"Dicing": [{4: list(range(1, 12)), 2: [1, 2, 4]}, {2: [2, 4]}], "Rollup": True}, [1, 2, 5]),
+    ({"Dicing": [{0: [1, 5, 9], 1: [1, 2, 3]}], "Rollup": True}, [0, 3]),
+]
+
+# Operations as given by the query: one DicingModel per condition set, then the Rollup
+def baseline_output(tensor, operations, columns_to_remove_idx):
+    from Org1.operations.dicing_model import DicingModel
+    from Org1.operations.rollup_model import RollUpModel
+    for conditions in operations.get("Dicing", []):
+        tensor = DicingModel(conditions)(tensor)
+    return RollUpModel(columns_to_remove_idx)(tensor) if "Rollup" in operations else tensor
+
+@pytest.mark.parametrize("operations, columns_to_remove_idx", QUERIES)
+def test_planned_operations_match_baseline(generate_sales, operations, columns_to_remove_idx):
+    from Org1.execute_query import decode_operations, ComposedOLAPModel
+    from Org1.models.olap_cube import OLAPCube
+    from Org1.operations.membership import column_domains
+    generate_sales(200)
+    tensor = OLAPCube.from_store().to_tensor()
+    expected = baseline_output(tensor, operations, columns_to_remove_idx)
+    for domains in [None, column_domains(tensor)]:
+        planned = ComposedOLAPModel(decode_operations(operations, columns_to_remove_idx, domains))
+        assert torch.equal(planned(tensor), expected)
+    assert expected.any()
+
+# The query result is the output traced during the ONNX export: same as the baseline operations and the exported model
+def test_query_output_is_the_exported_model_output(generate_sales, monkeypatch):
+    import asyncio
+    import onnx
+    from onnx.reference import ReferenceEvaluator
+    from Org1 import execute_query
+    from Org1.column_store import latest_ts, SALE_PR_C_STORE
+    from Org1.models.olap_cube import OLAPCube
+    generate_sales(200)
+    async def no_proof(output_dir, model_onnx_path, input_json_path, **kwargs):
+        return ["0x01"]
+    monkeypatch.setattr(execute_query, "generate_proof", no_proof)
+    operations, columns_to_remove_idx = QUERIES[2]
+    final_tensor, poseidon_hash = asyncio.run(execute_query.op_execute_query(operations, columns_to_remove_idx, latest_ts(SALE_PR_C_STORE)))
+    tensor = OLAPCube.from_store().to_tensor()
+    assert torch.equal(final_tensor, baseline_output(tensor, operations, columns_to_remove_idx))
+    model = onnx.load(os.path.join(execute_query.output_dir, 'model.onnx'))
+    exported = ReferenceEvaluator(model).run(None, {model.graph.input[0].name: tensor.numpy()})[0]
+    assert torch.equal(torch.from_numpy(exported), final_tensor)
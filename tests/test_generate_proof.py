@@ -0,0 +1,103 @@
+# Proof workflow (Org1/ezkl_workflow/generate_proof.py): circuit size (required_logrows, fit_logrows) and proofs verified as OrgB does
+import os
+import json
+import asyncio
+import pytest
+import ezkl
+import torch
+
+def test_required_logrows_counts_blinding_rows():
+    from Org1.ezkl_workflow.generate_proof import required_logrows, BLINDING_ROWS, MIN_LOGROWS
+    settings = {"num_rows": 2 ** 12 - BLINDING_ROWS, "run_args": {"lookup_range": [0, 0]}}
+    assert required_logrows(settings) == 12
+    settings["num_rows"] += 1
+    assert required_logrows(settings) == 13
+    assert required_logrows({"num_rows": 10, "run_args": {}}) == MIN_LOGROWS
+    # range checks and lookup tables need their own rows
+    assert required_logrows({"num_rows": 10, "required_range_checks": [[0, 2 ** 14 - 1]], "run_args": {}}) == 15
+    assert required_logrows({"num_rows": 10, "required_lookups": ["ReLU"], "run_args": {"lookup_range": [-2 ** 15, 2 ** 15]}}) == 17
+
+# The automatic logrows must not be larger than the one picked by the calibration and must fit the circuit
+def test_fit_logrows_circuit_passes_mock(workspace):
+    from Org1.operations.dicing_model import DicingModel
+    from Org1.ezkl_workflow.data_files import write_input_data
+    from Org1.ezkl_workflow.generate_proof import fit_logrows, settings_logrows
+    data = torch.randint(0, 5, (16, 7)).float()
+    model = DicingModel({3: [1, 2]})
+    torch.onnx.export(model, (data,), 'model.onnx', opset_version=11, input_names=['input'], output_names=['output'], dynamo=False)
+    write_input_data('input.json', [data], model(data))
+    run_args = ezkl.PyRunArgs()
+    run_args.input_visibility = "hashed/public"
+    assert ezkl.gen_settings('model.onnx', 'settings.json', py_run_args=run_args)
+    assert ezkl.calibrate_settings('input.json', 'model.onnx', 'settings.json', "resources")
+    calibrated = settings_logrows('settings.json')
+
+    logrows = fit_logrows('settings.json')
+    assert logrows <= calibrated
+    with open('settings.json') as f:
+        assert json.load(f)["run_args"]["logrows"] == logrows
+    assert ezkl.compile_circuit('model.onnx', 'circuit.compiled', 'settings.json')
+    assert ezkl.gen_witness('input.json', 'circuit.compiled', 'witness.json')
+    assert ezkl.mock('witness.json', 'circuit.compiled')
+    with pytest.raises(ValueError):
+        fit_logrows('settings.json', logrows - 1)
+
+def export_query_model(data):
+    from Org1.operations.dicing_model import DicingModel
+    from Org1.ezkl_workflow.data_files import write_input_data
+    model = DicingModel({3: [1, 2]})
+    os.makedirs('output', exist_ok=True)
+    torch.onnx.export(model, (data,), 'output/model.onnx', opset_version=11, input_names=['input'], output_names=['output'], dynamo=False)
+    write_input_data('output/input.json', [data], model(data))
+
+def verify_shared_proof():
+    from Org1.ezkl_workflow.generate_proof import PROOF_DIR
+    return ezkl.verify(os.path.join(PROOF_DIR, 'test.pf'), os.path.join(PROOF_DIR, 'settings.json'), os.path.join(PROOF_DIR, 'test.vk'))
+
+# Whole workflow: calibration, fit_logrows, get_srs (local), compile, setup, witness and prove, then the proof is verified
+# as OrgB does; the second query hits the circuit cache and is proven with the keys of the warm pool.
+# A failed proof must raise: the proof of a previous query must not be left for OrgB to verify
+def test_generate_proof_writes_a_verified_proof(workspace, offline_srs, monkeypatch):
+    from Org1.ezkl_workflow import artifact_cache
+    from Org1.ezkl_workflow.generate_proof import generate_proof, PROOF_DIR
+    from Org1.ezkl_workflow.warm_pool import WarmPool
+    data = torch.randint(0, 5, (16, 7)).float()
+    export_query_model(data)
+    poseidon_hash = asyncio.run(generate_proof('output', 'output/model.onnx', 'output/input.json', None))
+    assert poseidon_hash
+    assert verify_shared_proof()
+
+    os.remove(os.path.join(PROOF_DIR, 'test.pf'))
+    pool = WarmPool(str(workspace / 'warm'))
+    assert asyncio.run(generate_proof('output', 'output/model.onnx', 'output/input.json', None, warm_pool=pool)) == poseidon_hash
+    assert pool.srs_files and pool.proving_keys
+    assert verify_shared_proof()
+    assert not any(artifact_cache.in_use(os.path.join(artifact_cache.CACHE_DIR, entry)) for entry in os.listdir(artifact_cache.CACHE_DIR))
+
+    def failing_prove(*args, **kwargs):
+        raise RuntimeError("prover failed")
+    monkeypatch.setattr(ezkl, "prove", failing_prove)
+    with pytest.raises(RuntimeError):
+        asyncio.run(generate_proof('output', 'output/model.onnx', 'output/input.json', None))
+    assert not os.path.exists(os.path.join(PROOF_DIR, 'test.pf'))
+
+# logrows=None: the circuit is set up and proven with the logrows derived from the calibrated settings,
+# a logrows too small for the circuit is refused before the setup
+def test_generate_proof_sizes_the_circuit(workspace, offline_srs, monkeypatch):
+    from Org1.ezkl_workflow import generate_proof as workflow
+    srs_logrows = []
+    fetch_srs = workflow.get_srs
+    async def recorded_srs(settings_filename, logrows):
+        srs_logrows.append(logrows)
+        await fetch_srs(settings_filename, logrows)
+    monkeypatch.setattr(workflow, "get_srs", recorded_srs)
+    export_query_model(torch.randint(0, 5, (16, 7)).float())
+    asyncio.run(workflow.generate_proof('output', 'output/model.onnx', 'output/input.json', None, use_cache=False))
+    with open(os.path.join(workflow.PROOF_DIR, 'settings.json')) as f:
+        settings = json.load(f)
+    assert srs_logrows == [settings["run_args"]["logrows"]] == [workflow.required_logrows(settings)]
+    assert verify_shared_proof()
+
+    with pytest.raises(ValueError):
+        asyncio.run(workflow.generate_proof('output', 'output/model.onnx', 'output/input.json', srs_logrows[0] - 1, use_cache=False))
+    assert srs_logrows == [settings["run_args"]["logrows"]]
@@ -0,0 +1,67 @@
+# Group-by in the circuit (Org1/operations/group_by_model.py): same groups and sums as OrgB group_rows
+import os
+import json
+import pandas as pd
+import pytest
+import torch
+
+# (Dicing conditions, rolled-up columns); columns: Product Name 0, Category 1, Material 2, Year 3, Month 4, Day 5
+QUERIES = [
+    ([], [3, 4, 5]),
+    ([{2: [1, 3]}, {3: 2022}], [2, 4, 5]),
+    ([{1: 2}], [0, 3, 4, 5]),
+    ([{0: [1, 2, 9]}], [2, 3, 4, 5]), # the product is kept: the category is not part of the key
+]
+
+def rollup_output(tensor, dicing, removed):
+    from Org1.operations.dicing_model import DicingModel
+    from Org1.operations.rollup_model import RollUpModel
+    for conditions in dicing:
+        tensor = DicingModel(conditions)(tensor)
+    return RollUpModel(removed)(tensor)
+
+# Non-empty rows with the names of the kept columns (as OrgB show_result)
+def result_frame(tensor, removed):
+    with open(os.path.join('Shared', 'DFM_Sale.json')) as f:
+        col_indexes = json.load(f)["col_indexes"]
+    tensor = tensor[(tensor != 0).any(dim=1)]
+    df = pd.DataFrame(tensor.numpy(), columns=[name for name, idx in col_indexes.items() if idx not in removed])
+    return df.sort_values(list(df.columns[:-1])).reset_index(drop=True)
+
+@pytest.mark.parametrize("dicing, removed", QUERIES)
+def test_group_by_matches_group_rows(generate_sales, dicing, removed):
+    from Org1.models.olap_cube import OLAPCube
+    from Org1.operations.group_by_model import rollup_group_by
+    from OrgB.hash_utils import group_rows
+    generate_sales(300)
+    tensor = OLAPCube.from_store().to_tensor()
+    rolled_up = rollup_output(tensor, dicing, removed)
+    group_op = rollup_group_by(removed, dicing, rolled_up.size(1))
+    expected = result_frame(rolled_up, removed)
+    expected = group_rows(expected).sort_values(list(expected.columns[:-1])).reset_index(drop=True)
+    assert len(expected) > 1
+    pd.testing.assert_frame_equal(result_frame(group_op(rolled_up), removed), expected, check_dtype=False, rtol=1e-5)
+
+# Padded tensor: the validity column is 1 for the non-empty groups
+def test_group_by_padded_tensor(generate_sales):
+    from Org1.models.olap_cube import OLAPCube
+    from Org1.operations.group_by_model import rollup_group_by
+    generate_sales(100)
+    cube = OLAPCube.from_store()
+    dicing, removed = QUERIES[1]
+    plain = rollup_output(cube.to_tensor(), dicing, removed)
+    padded = rollup_output(cube.to_tensor(padded=True), dicing, removed)
+    plain_groups = rollup_group_by(removed, dicing, plain.size(1))(plain)
+    padded_groups = rollup_group_by(removed, dicing, padded.size(1))(padded)
+    assert torch.equal(padded_groups[:, :-1], plain_groups)
+    assert torch.equal(padded_groups[:, -1], (plain_groups != 0).any(dim=1).float())
+
+def test_group_by_circuit_output(circuit_output):
+    from Org1.operations.group_by_model import GroupByModel
+    # Material (column 0) and Year (column 1) kept, emissions summed
+    groups = [[material, year, 0] for material in [1, 2] for year in [2021, 2022]]
+    data = torch.tensor([[1, 2021, 2.5], [2, 2022, 1.0], [1, 2021, 4.0], [2, 2021, 3.5], [0, 0, 0]])
+    model = GroupByModel(groups, [0, 1], [0, 1], [2])
+    expected = torch.tensor([[1, 2021, 6.5], [0, 0, 0], [2, 2021, 3.5], [2, 2022, 1.0]])
+    assert torch.equal(model(data), expected)
+    assert torch.equal(circuit_output(model, data), expected)
@@ -0,0 +1,46 @@
+# Incremental hash chain of the data versions (Org1/hash_utils.py, COMMITMENT_MODE = "chain")
+# The incremental chain head must always equal the one rebuilt from the current data
+import pytest
+
+def chain_from_scratch(timestamp):
+    from Org1 import hash_utils
+    from Org1.models.olap_cube import OLAPCube
+    cube = OLAPCube.from_store(max_ts=timestamp)
+    batches = hash_utils.split_batches(cube.to_tensor(), cube.ts_values)
+    return hash_utils.chain_digest([hash_utils.tensor_pos_hash(batch)[0] for batch in batches])
+
+def latest_timestamp():
+    from Org1.column_store import latest_ts, SALE_PR_C_STORE
+    return latest_ts(SALE_PR_C_STORE)
+
+def test_hash_chain_follows_appended_versions(generate_sales, append_sales):
+    from Org1.hash_utils import update_hash_chain, load_hash_chain
+    from Shared.Dim_ID_Converter import CSV_converter
+    generate_sales(40, 2)
+    first_ts = latest_timestamp()
+    assert update_hash_chain(first_ts) == chain_from_scratch(first_ts)
+
+    append_sales(15)
+    CSV_converter()
+    ts = latest_timestamp()
+    head = update_hash_chain(ts)
+    assert head == chain_from_scratch(ts)
+    assert load_hash_chain()["rows"] == 55
+    # an older data version keeps its head
+    assert update_hash_chain(first_ts) == chain_from_scratch(first_ts)
+
+# Table rewritten with fewer rows, then updated past the old row count or not: the chain must not keep the old batches
+@pytest.mark.parametrize("appended_rows", [10, 40])
+def test_hash_chain_rebuilt_after_rewrite(generate_sales, append_sales, appended_rows):
+    from Org1.column_store import write_table, read_table, SALE_PR_STORE
+    from Org1.hash_utils import update_hash_chain, load_hash_chain
+    from Shared.Dim_ID_Converter import CSV_converter
+    generate_sales(50, 2)
+    update_hash_chain(latest_timestamp())
+
+    write_table(read_table(SALE_PR_STORE).iloc[:20], SALE_PR_STORE)
+    append_sales(appended_rows)
+    CSV_converter()
+    ts = latest_timestamp()
+    assert update_hash_chain(ts) == chain_from_scratch(ts)
+    assert load_hash_chain()["rows"] == 20 + appended_rows
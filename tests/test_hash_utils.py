@@ -0,0 +1,17 @@
+# Poseidon hash of the data versions (Org1/hash_utils.py): vectorized field element conversion
+import ezkl
+import numpy as np
+
+def test_floats_to_felts_matches_ezkl():
+    from Org1.hash_utils import floats_to_felts, SCALE
+    rng = np.random.default_rng(0)
+    half = 0.5 / 2 ** SCALE # quantization boundaries (x * 2**scale ends in .5)
+    values = np.concatenate([
+        rng.uniform(-1e6, 1e6, 10000),
+        rng.uniform(-10, 10, 10000),
+        (np.arange(-2500, 2500) * 2 + 1) * half, # exact .5 boundaries, negative and positive
+        np.arange(-500, 500, dtype=np.float64), # integer codes of the dimensions
+        [0.0, -0.0, half / 2, -half / 2, np.float32(99.99), 2.0 ** 40, -(2.0 ** 40)]
+    ])
+    assert len(values) > 25000
+    assert floats_to_felts(values) == [ezkl.float_to_felt(float(value), SCALE) for value in values]
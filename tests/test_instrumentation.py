@@ -0,0 +1,46 @@
+# Stage metrics (Shared/instrumentation.py): nothing is written unless enabled, events go to the metrics folder
+# of the organization and the events file does not grow without limit
+import json
+import os
+import pytest
+
+from Shared import instrumentation
+from Shared.instrumentation import stage
+
+def run_stage(name="hash"):
+    with stage(name, rows=4):
+        pass
+
+@pytest.mark.skipif("CBI_ZKP_METRICS" in os.environ, reason="metrics enabled in the environment")
+def test_metrics_are_not_written_by_default(workspace, monkeypatch):
+    monkeypatch.setattr(instrumentation, "METRICS_DIR", os.path.join('Org1', 'output', 'metrics'))
+    events = []
+    monkeypatch.setattr(instrumentation, "LISTENERS", [events.append])
+    run_stage()
+    assert instrumentation.METRICS_FORMAT == "off"
+    assert not os.path.exists(workspace / 'Org1' / 'output' / 'metrics')
+    assert [event["stage"] for event in events] == ["hash"] # listeners (benchmark) still receive the events
+
+@pytest.mark.parametrize("metrics_format", ["json", "both"])
+def test_events_are_written_in_the_metrics_folder(workspace, monkeypatch, metrics_format):
+    monkeypatch.setattr(instrumentation, "METRICS_DIR", os.path.join('Org1', 'output', 'metrics'))
+    monkeypatch.setattr(instrumentation, "METRICS_FORMAT", metrics_format)
+    instrumentation.set_metrics_dir(os.path.join('OrgB', 'output', 'metrics'))
+    run_stage()
+    assert not os.path.exists(workspace / 'Org1' / 'output' / 'metrics')
+    with open(workspace / 'OrgB' / 'output' / 'metrics' / 'events.jsonl') as f:
+        assert [json.loads(line)["stage"] for line in f] == ["hash"]
+    assert os.path.exists(workspace / 'OrgB' / 'output' / 'metrics' / 'metrics.prom') == (metrics_format == "both")
+
+def test_events_file_is_rotated(workspace, monkeypatch):
+    monkeypatch.setattr(instrumentation, "METRICS_DIR", os.path.join('Org1', 'output', 'metrics'))
+    monkeypatch.setattr(instrumentation, "METRICS_FORMAT", "json")
+    run_stage("witness")
+    monkeypatch.setattr(instrumentation, "EVENTS_MAX_BYTES", os.path.getsize('Org1/output/metrics/events.jsonl') * 3 // 2)
+    run_stage("prove")
+    assert not os.path.exists('Org1/output/metrics/events.jsonl.1')
+    run_stage("verify") # the file is over the limit: its events are moved to events.jsonl.1
+    with open('Org1/output/metrics/events.jsonl.1') as f:
+        assert [json.loads(line)["stage"] for line in f] == ["witness", "prove"]
+    with open('Org1/output/metrics/events.jsonl') as f:
+        assert [json.loads(line)["stage"] for line in f] == ["verify"]
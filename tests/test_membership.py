@@ -0,0 +1,59 @@
+# Membership mask of Slice and Dicing (Org1/operations/membership.py): same rows as checking every set as it is
+import torch
+
+DOMAINS = {0: list(range(1, 13)), 1: [1, 2, 3, 4], 2: list(range(2020, 2025))}
+
+def sample_rows(rows=64, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return torch.stack([torch.randint(1, 13, (rows,), generator=generator), torch.randint(1, 5, (rows,), generator=generator),
+                        torch.randint(2020, 2025, (rows,), generator=generator), torch.randint(1, 100, (rows,), generator=generator)], 1).float()
+
+def expected_mask(x, conditions):
+    mask = torch.ones(x.size(0), dtype=torch.bool)
+    for column, values in conditions.items():
+        values = values if isinstance(values, list) else [values]
+        mask = mask & torch.isin(x[:, column], torch.tensor(values, dtype=x.dtype))
+    return mask
+
+def test_membership_mask_with_and_without_domains():
+    from Org1.operations.membership import membership_mask
+    x = sample_rows()
+    for conditions in [{0: [1, 3, 5]}, {0: list(range(1, 12)), 2: 2022}, {1: [2, 3], 2: [2021, 2023, 2024]}, {0: 7, 1: 4}]:
+        assert torch.equal(membership_mask(x, conditions), expected_mask(x, conditions))
+        assert torch.equal(membership_mask(x, conditions, DOMAINS), expected_mask(x, conditions))
+    # sets with all the values of the domain are not checked
+    assert membership_mask(x, {1: [1, 2, 3, 4]}, DOMAINS) is None
+    assert torch.equal(membership_mask(x, {1: [1, 2, 3, 4]}), torch.ones(x.size(0), dtype=torch.bool))
+    # no value of the set in the domain
+    assert not membership_mask(x, {2: [1999]}, DOMAINS).any()
+
+# A value outside the domain (e.g. a Year after END_DATE) must not be kept by a complemented set
+def test_column_domains_skip_values_outside_the_domain(workspace):
+    from Org1.operations.membership import column_domains, membership_mask
+    # Product Name, Category, Material, Year, Month, Day, emissions; then a padding row
+    x = torch.tensor([[1, 1, 2, 2021, 3, 10, 5.5], [9, 3, 1, 2030, 12, 1, 2.0], [5, 2, 4, 2024, 6, 30, 1.0], [0, 0, 0, 0, 0, 0, 0]])
+    domains = column_domains(x)
+    assert sorted(domains) == [0, 1, 2, 4, 5]
+    conditions = {3: [2020, 2021, 2022, 2023], 2: [1, 2, 4]}
+    assert torch.equal(membership_mask(x, conditions, domains), torch.tensor([True, False, False, False]))
+
+def test_dicing_circuit_output(circuit_output):
+    from Org1.operations.dicing_model import DicingModel
+    x = sample_rows()
+    # set checked as it is, complemented set and single value
+    model = DicingModel({0: [1, 3, 5, 7, 9], 1: [1, 2, 4], 2: 2022}, domains=DOMAINS)
+    expected = x * expected_mask(x, model.conditions).unsqueeze(1)
+    assert expected.any()
+    assert torch.equal(model(x), expected)
+    assert torch.equal(circuit_output(model, x), expected)
+
+# One Equal per checked set (broadcast against the whole set), not one per value
+def test_one_comparison_per_checked_set(tmp_path):
+    import onnx
+    from Org1.operations.dicing_model import DicingModel
+    path = str(tmp_path / 'dicing.onnx')
+    torch.onnx.export(DicingModel({0: [1, 3, 5, 7, 9], 1: [1, 2, 4], 2: 2022}, domains=DOMAINS), (sample_rows(),), path,
+                      opset_version=11, input_names=['input'], output_names=['output'], dynamo=False)
+    ops = [node.op_type for node in onnx.load(path).graph.node]
+    assert ops.count("Equal") == 3
+    assert "Or" not in ops
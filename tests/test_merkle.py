@@ -0,0 +1,37 @@
+# Merkle tree over row blocks of the data versions (Org1/hash_utils.py, COMMITMENT_MODE = "merkle")
+# The cached tree must always equal the one rebuilt from the current data
+
+def latest_timestamp():
+    from Org1.column_store import latest_ts, SALE_PR_C_STORE
+    return latest_ts(SALE_PR_C_STORE)
+
+def test_merkle_proof_of_touched_blocks(generate_sales):
+    from Org1 import hash_utils
+    generate_sales(100)
+    ts = latest_timestamp()
+    tensor_data = hash_utils.version_tensor(ts, padded=False)
+    blocks = hash_utils.merkle_blocks(tensor_data)
+    root = hash_utils.get_merkle_tree(ts)[-1][0]
+
+    indexes = [0, len(blocks) - 1]
+    leaves = [hash_utils.tensor_pos_hash(blocks[i])[0] for i in indexes]
+    proof = hash_utils.merkle_proof(ts, indexes, leaves)
+    assert hash_utils.verify_merkle_proof(proof) == root
+
+    # a block with a changed row is not part of the tree
+    tampered = blocks[0].clone()
+    tampered[0, -2] += 1
+    proof["leaf_hashes"][0] = hash_utils.tensor_pos_hash(tampered)[0]
+    assert hash_utils.verify_merkle_proof(proof) != root
+
+def test_merkle_tree_rebuilt_after_rewrite(generate_sales):
+    from Org1 import hash_utils
+    from Org1.column_store import write_table, read_table, SALE_PR_C_STORE
+    generate_sales(100)
+    ts = latest_timestamp()
+    old_root = hash_utils.get_merkle_tree(ts)[-1][0]
+
+    write_table(read_table(SALE_PR_C_STORE).iloc[:70], SALE_PR_C_STORE)
+    root = hash_utils.get_merkle_tree(ts)[-1][0]
+    assert root != old_root
+    assert root == hash_utils.build_merkle_tree(hash_utils.merkle_blocks(hash_utils.version_tensor(ts, padded=False)))[-1][0]
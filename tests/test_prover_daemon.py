@@ -0,0 +1,75 @@
+# Prover daemon (Org1/prover_daemon.py) and its warm pool (Org1/ezkl_workflow/warm_pool.py)
+import os
+import time
+import socket
+import asyncio
+import threading
+import torch
+
+# Job of the test daemon, run in its worker process: a slow proof
+def slow_job(operations, columns_to_remove_idx, timestamp):
+    with open("job_started", "w"):
+        pass
+    time.sleep(3)
+    return torch.full((2, 3), float(timestamp)), ["0x01"]
+
+def run_until_cancelled(loop, task):
+    try:
+        loop.run_until_complete(task)
+    except asyncio.CancelledError:
+        pass
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+# The health check of OrgB (1 s timeout) must be answered while a proof runs, otherwise OrgB proves in-process
+# on the same files of the daemon
+def test_daemon_answers_pings_during_a_proof(workspace):
+    from Org1.prover_daemon import ProverDaemon, is_daemon_running, request_proof
+    port = free_port()
+    daemon = ProverDaemon(port=port, job=slow_job, warm_dir=str(workspace / 'warm'))
+    loop = asyncio.new_event_loop()
+    serve = loop.create_task(daemon.serve())
+    server_thread = threading.Thread(target=run_until_cancelled, args=(loop, serve))
+    server_thread.start()
+    try:
+        deadline = time.time() + 30
+        while not is_daemon_running(port=port):
+            assert time.time() < deadline
+            time.sleep(0.1)
+
+        result = {}
+        client = threading.Thread(target=lambda: result.update(value=asyncio.run(request_proof({"Rollup": True}, [], 7, port=port))))
+        client.start()
+        deadline = time.time() + 60 # the worker imports torch and ezkl first
+        while not os.path.exists("job_started"):
+            assert time.time() < deadline
+            time.sleep(0.1)
+        assert is_daemon_running(port=port)
+        client.join()
+
+        final_tensor, poseidon_hash = result["value"]
+        assert torch.equal(final_tensor, torch.full((2, 3), 7.0))
+        assert poseidon_hash == ["0x01"]
+    finally:
+        loop.call_soon_threadsafe(serve.cancel)
+        server_thread.join()
+        loop.close()
+
+# A cache entry set up again rewrites its proving key at the same path: the pool must not serve the old one
+def test_warm_pool_reloads_rewritten_proving_key(tmp_path):
+    from Org1.ezkl_workflow.warm_pool import WarmPool
+    pool = WarmPool(str(tmp_path / 'warm'))
+    pk_path = str(tmp_path / 'test.pk')
+    with open(pk_path, "w") as f:
+        f.write("first")
+    with open(pool.proving_key(pk_path)) as f:
+        assert f.read() == "first"
+
+    with open(str(tmp_path / 'new.pk'), "w") as f:
+        f.write("second")
+    os.replace(str(tmp_path / 'new.pk'), pk_path)
+    with open(pool.proving_key(pk_path)) as f:
+        assert f.read() == "second"